@@ -0,0 +1,248 @@
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from loguru import logger
+
+from history import stream
+
+CLIENT_ID_SIZE = 6  # get_client_id 在 strategy_prefix 后面拼接的随机位数
+UNITS = 10 ** 8  # 数量换算成整数单位后做 FIFO 匹配，避免浮点累加误差
+
+
+def _to_arrays(rows, size=CLIENT_ID_SIZE):
+    """成交列表(fillHistoryQuery 返回值或文件内容)转换为按时间排序的 numpy 数组
+
+    grid 为 clientId 中的 strategy_prefix(clientId // 10 ** size)，不是网格下的单为 -1。
+    手续费按成交价换算成计价币种(买单的手续费通常以基础币种收取)。
+    """
+    n = len(rows)
+    ts = np.array([r.get('timestamp') for r in rows], dtype='datetime64[ms]')
+    trade_id = np.fromiter((int(r.get('tradeId') or 0) for r in rows), dtype=np.int64, count=n)
+    price = np.fromiter((float(r['price']) for r in rows), dtype=np.float64, count=n)
+    qty = np.fromiter((float(r['quantity']) for r in rows), dtype=np.float64, count=n)
+    fee = np.fromiter((float(r.get('fee') or 0) for r in rows), dtype=np.float64, count=n)
+    buy = np.array([r['side'] == 'Bid' for r in rows], dtype=bool)
+    maker = np.array([r.get('isMaker') in (True, 'True', 'true', '1') for r in rows], dtype=bool)
+    client_id = np.fromiter((int(r.get('clientId') or -1) for r in rows), dtype=np.int64, count=n)
+    symbols, symbol = np.unique(np.array([r['symbol'] for r in rows], dtype=str), return_inverse=True)
+    fee_symbols = np.array([r.get('feeSymbol') or '' for r in rows], dtype=str)
+
+    bases = np.array([s.split('_')[0] for s in symbols], dtype=str)
+    fee = np.where(fee_symbols == bases[symbol], fee * price, fee) if n else fee
+
+    order = np.lexsort((trade_id, ts))  # 接口按最新在前返回
+    fills = {
+        'ts': ts, 'trade_id': trade_id, 'symbol': symbol, 'buy': buy, 'price': price, 'quantity': qty,
+        'fee': fee, 'maker': maker, 'client_id': client_id,
+        'grid': np.where(client_id >= 0, client_id // 10 ** size, -1),
+    }
+    fills = {k: v[order] for k, v in fills.items()}
+    fills['symbols'] = symbols
+    return fills
+
+
+def fetch_fills(client, symbol='', size=CLIENT_ID_SIZE, **kwargs):
+    """通过 HistoryStream 并发分页拉取全部成交历史，kwargs 传给 HistoryStream(limit、concurrency 等)"""
+    return _to_arrays(list(stream(client, 'fills', symbol, **kwargs)), size)
+
+
+def load_fills(path, size=CLIENT_ID_SIZE):
+    """读取本地成交文件: .json 为 fillHistoryQuery 返回的列表，其他按 csv 读取(列名与接口字段一致)"""
+    if path.endswith('.json'):
+        with open(path) as f:
+            return _to_arrays(json.load(f), size)
+    with open(path, newline='') as f:
+        return _to_arrays(list(csv.DictReader(f)), size)
+
+
+def _groups(fills):
+    """每笔成交所属的网格(交易对 + strategy_prefix)编号，返回 (编号, 交易对下标, strategy_prefix)"""
+    key = fills['symbol'].astype(np.int64) << 40 | (fills['grid'] + 1)
+    keys, group = np.unique(key, return_inverse=True)
+    return group, keys >> 40, (keys & ((1 << 40) - 1)) - 1
+
+
+def _cumulative(units, group, ngroups):
+    """按网格分组(已按网格排序)的累计数量: (组内累计, 每组合计)"""
+    cs = np.cumsum(units)
+    starts = np.searchsorted(group, np.arange(ngroups))
+    before = np.concatenate(([0], cs))[starts]
+    totals = np.concatenate((before[1:], [cs[-1] if len(cs) else 0])) - before
+    return cs - before[group], totals
+
+
+def match_cycles(fills, group, ngroups):
+    """按网格做 FIFO 买卖配对
+
+    同一网格内第 k 个买入单位与第 k 个卖出单位配对(先卖后买的空头同样适用)，等价于逐笔 FIFO。
+    实现上把每组的买入、卖出累计数量截断到可配对数量后拼接到同一坐标轴，合并两边的分界点，
+    每一段对应一次(部分)配对，用 searchsorted 找回所属的买单和卖单，整个过程没有 Python 循环。
+
+    Returns:
+        (dict, np.ndarray, np.ndarray): 配对明细(buy/sell 为成交下标), 买单未配对数量, 卖单未配对数量
+    """
+    units = np.rint(fills['quantity'] * UNITS).astype(np.int64)
+    order = np.argsort(group, kind='stable')  # 组内保持时间顺序
+    sides = []
+    for mask in (fills['buy'][order], ~fills['buy'][order]):
+        idx = order[mask]
+        local, totals = _cumulative(units[idx], group[idx], ngroups)
+        sides.append((idx, local, totals))
+    (b_idx, b_local, b_tot), (s_idx, s_local, s_tot) = sides
+    matched = np.minimum(b_tot, s_tot)
+    offset = np.cumsum(matched) - matched
+
+    b_end = offset[group[b_idx]] + np.minimum(b_local, matched[group[b_idx]])
+    s_end = offset[group[s_idx]] + np.minimum(s_local, matched[group[s_idx]])
+    hi = np.union1d(b_end, s_end)
+    hi = hi[hi > 0]
+    lo = np.concatenate(([0], hi[:-1]))
+    buy = b_idx[np.searchsorted(b_end, hi)]
+    sell = s_idx[np.searchsorted(s_end, hi)]
+
+    qty = (hi - lo) / UNITS
+    price = fills['price']
+    cycles = {
+        'grid': group[buy],
+        'buy': buy,
+        'sell': sell,
+        'quantity': qty,
+        'long': buy < sell,  # 先买后卖
+        'open_ts': fills['ts'][np.minimum(buy, sell)],
+        'close_ts': fills['ts'][np.maximum(buy, sell)],
+        'pnl': qty * (price[sell] - price[buy]),
+    }
+
+    # 超出可配对数量的部分为持仓
+    open_units = np.zeros(len(units), dtype=np.int64)
+    for idx, local, _ in sides:
+        open_units[idx] = np.clip(local - matched[group[idx]], 0, units[idx])
+    open_qty = open_units / UNITS
+    return cycles, np.where(fills['buy'], open_qty, 0.0), np.where(fills['buy'], 0.0, open_qty)
+
+
+def level_stats(fills, group):
+    """每个网格每个价格档位的成交次数、数量和成交频率(次/小时，按该网格第一笔到最后一笔成交的时长计算)"""
+    price = fills['price']
+    order = np.lexsort((price, group))
+    g, p = group[order], price[order]
+    new = np.concatenate(([True], (g[1:] != g[:-1]) | (p[1:] != p[:-1]))) if len(g) else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(new)
+    level = np.cumsum(new) - 1
+
+    ts = fills['ts'].astype(np.int64)
+    ngroups = int(group.max()) + 1 if len(group) else 0
+    first = np.full(ngroups, np.iinfo(np.int64).max)
+    last = np.full(ngroups, np.iinfo(np.int64).min)
+    np.minimum.at(first, group, ts)
+    np.maximum.at(last, group, ts)
+    hours = np.maximum((last - first) / 3.6e6, 1 / 60)  # 不足一分钟按一分钟
+
+    buys = np.bincount(level, weights=fills['buy'][order], minlength=len(starts)).astype(np.int64)
+    count = np.diff(np.append(starts, len(g)))
+    return {
+        'grid': g[starts],
+        'price': p[starts],
+        'buys': buys,
+        'sells': count - buys,
+        'quantity': np.bincount(level, weights=fills['quantity'][order], minlength=len(starts)),
+        'fills_per_hour': count / hours[g[starts]],
+    }
+
+
+def analyze(fills, marks=None):
+    """按网格(交易对 + strategy_prefix)统计成交历史
+
+    已实现盈亏 = FIFO 配对盈亏 - 全部手续费(与 backtest 一致)，未实现盈亏为未配对持仓按 mark 价格估值。
+
+    Args:
+        fills (dict): fetch_fills / load_fills 的返回值
+        marks (dict, optional): 交易对 -> 估值价格，默认使用该交易对最后一笔成交价
+
+    Returns:
+        dict: grids 为每个网格的汇总，cycles 为配对明细，levels 为价格档位统计(两者的 grid 为 grids 中的下标)
+    """
+    marks = marks or {}
+    group, group_symbol, group_prefix = _groups(fills)
+    ngroups = len(group_symbol)
+    cycles, open_buy, open_sell = match_cycles(fills, group, ngroups)
+
+    symbols, price, qty = fills['symbols'], fills['price'], fills['quantity']
+    # 已按时间排序，倒序后第一次出现的位置即每个交易对最后一笔成交
+    _, first = np.unique(fills['symbol'][::-1], return_index=True)
+    last = price[len(price) - 1 - first]
+    mark = np.array([marks.get(s, last[i]) for i, s in enumerate(symbols)])[group_symbol]
+
+    bincount = lambda w: np.bincount(group, weights=w, minlength=ngroups)
+    buys = bincount(fills['buy'].astype(np.float64))
+    fees = bincount(fills['fee'])
+    volume = bincount(qty * price)
+    gross = np.bincount(cycles['grid'], weights=cycles['pnl'], minlength=ngroups)
+    position = bincount(open_buy - open_sell)
+    unrealized = bincount(open_buy * -price + open_sell * price) + position * mark
+    counts = np.bincount(group, minlength=ngroups)
+    cycle_counts = np.bincount(cycles['grid'], minlength=ngroups)
+
+    grids = [{
+        'symbol': str(symbols[group_symbol[i]]),
+        'strategy_prefix': str(group_prefix[i]) if group_prefix[i] >= 0 else None,
+        'fills': int(counts[i]),
+        'buys': int(buys[i]),
+        'sells': int(counts[i] - buys[i]),
+        'volume': float(volume[i]),
+        'cycles': int(cycle_counts[i]),
+        'fees': float(fees[i]),
+        'realized_pnl': float(gross[i] - fees[i]),
+        'position': float(position[i]),
+        'mark': float(mark[i]),
+        'unrealized_pnl': float(unrealized[i]),
+    } for i in range(ngroups)]
+    return {'grids': grids, 'cycles': cycles, 'levels': level_stats(fills, group)}
+
+
+def _synthetic(n, grids=4, seed=1):
+    """随机生成 n 笔网格成交(接口格式)，用于测速"""
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(0, 2, n) * 2 - 1
+    level = np.cumsum(steps)
+    price = np.round(130 * 1.001 ** level, 2)
+    grid = rng.integers(1, grids + 1, n)
+    start = np.datetime64('2024-01-01T00:00:00')
+    ts = (start + np.cumsum(rng.integers(1, 60, n)).astype('timedelta64[s]')).astype(str)
+    return [{
+        'clientId': int(grid[i]) * 10 ** CLIENT_ID_SIZE + i % 10 ** CLIENT_ID_SIZE,
+        'fee': '0.00001' if steps[i] < 0 else '0.001', 'feeSymbol': 'SOL' if steps[i] < 0 else 'USDC',
+        'isMaker': True, 'orderId': str(i), 'price': str(price[i]), 'quantity': '0.01',
+        'side': 'Bid' if steps[i] < 0 else 'Ask', 'symbol': 'SOL_USDC', 'timestamp': ts[i], 'tradeId': i,
+    } for i in range(n)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='网格成交分析，不指定 --path 时用随机生成的成交测速')
+    parser.add_argument('--path', help='成交文件(.json 或 .csv)')
+    parser.add_argument('--fills', type=int, default=500000, help='随机生成的成交数')
+    args = parser.parse_args()
+
+    if args.path:
+        start = time.perf_counter()
+        fills = load_fills(args.path)
+    else:
+        rows = _synthetic(args.fills)
+        start = time.perf_counter()
+        fills = _to_arrays(rows)
+    loaded = time.perf_counter()
+    r = analyze(fills)
+    done = time.perf_counter()
+    logger.info(f"{len(fills['price'])} 笔成交, 转换 {loaded - start:.3f} 秒, 分析 {done - loaded:.3f} 秒")
+    for g in r['grids']:
+        logger.info(f"{g['symbol']} 网格 {g['strategy_prefix']}: 成交 {g['fills']} 次(买 {g['buys']} / 卖 {g['sells']}), "
+                    f"配对 {g['cycles']} 次, 手续费 {g['fees']:.4f}, 已实现盈亏 {g['realized_pnl']:.4f}, "
+                    f"持仓 {g['position']:.4f}, 未实现盈亏 {g['unrealized_pnl']:.4f}")
+    levels = r['levels']
+    busiest = np.argsort(levels['fills_per_hour'])[::-1][:5]
+    for i in busiest:
+        g = r['grids'][levels['grid'][i]]
+        logger.info(f"{g['symbol']} 网格 {g['strategy_prefix']} 档位 {levels['price'][i]}: 买 {levels['buys'][i]} / 卖 {levels['sells'][i]}, "
+                    f"{levels['fills_per_hour'][i]:.2f} 次/小时")
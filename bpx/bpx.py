@@ -1,31 +1,40 @@
-import base64
 import json
-import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.hazmat.primitives import serialization
 from loguru import logger
-from urllib.parse import urlencode
 from functools import wraps
-import time
+from concurrent.futures import ThreadPoolExecutor
 
+from bpx.signer import Signer
+from bpx.metrics import Timer
+from bpx import ratelimit
+from bpx.retry import RetryPolicy, CircuitBreaker, CircuitOpen, TransientError, RETRY_EXCEPTIONS, attempt_timeout
+
+
+def retry(func):
+    """按客户端的 retry_policy 重试临时错误(网络异常、5xx、429)，经过熔断器
+
+    调用时可以传 deadline=秒数 覆盖默认的截止时间，例: client.getOpenOrder(symbol, order_id, deadline=2)
+    """
+    @wraps(func)
+    def wrapper(self, *args, deadline=None, **kwargs):
+        return self.retry_policy.call(lambda: func(self, *args, **kwargs), func.__name__, deadline=deadline,
+                                      breaker=self.breaker)
+    return wrapper
+
+
+class BpxError(Exception):
+    """交易所返回的业务错误，批量下单时作为单个订单的结果返回"""
+
+    def __init__(self, message, status_code=None, code=None, clientId=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.code = code
+        self.clientId = clientId
 
-def retry(max_retries=3, delay=1, exceptions=(Exception,)):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except exceptions as e:
-                    retries += 1
-                    logger.warning(f"重试 {func.__name__} ({retries}/{max_retries})，原因：{e}")
-                    time.sleep(delay)
-            # 最后一次尝试，如果还失败就让异常抛出
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
 
 class BpxClient:
     url = 'https://api.backpack.exchange/'
@@ -40,61 +49,202 @@ class BpxClient:
         self.api_key = ''
         self.api_secret = ''
         self.window = 5000
+        self.pool_size = 10  # 连接池大小
+        self.timeout = (3.05, 10)  # (连接超时, 读超时)，单位秒
+        self.session = None
+        self.adapter = None
+        self.batch_supported = True  # 交易所不支持批量下单接口时自动退化为并发逐个下单
+        self.executor = None
+        self.limiter = None  # 按账户共用的限频器，见 bpx.ratelimit
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
+
+    def init(self, api_key, api_secret, pool_size=None, timeout=None, warmup=True, url=None, rate_limit=None,
+             retry_policy=None):
+        """初始化密钥和长连接会话
 
-    def init(self, api_key, api_secret):
+        Args:
+            api_key (str): API Key
+            api_secret (str): API Secret(base64)
+            pool_size (int, optional): 连接池大小，默认10
+            timeout (float | tuple, optional): 每个请求的超时时间，默认(3.05, 10)
+            warmup (bool, optional): 是否预先建立连接(完成TCP/TLS握手)，默认True
+            url (str, optional): REST 根地址，例如本地模拟交易所 'http://127.0.0.1:8080/'，默认正式环境
+            rate_limit (dict | bool, optional): RateLimiter 参数(rate、burst 等)，同一账户只在第一次创建时生效；
+                False 表示不限频
+            retry_policy (RetryPolicy, optional): 重试策略(次数、退避、默认截止时间)，默认 RetryPolicy()
+        """
+        if url:
+            self.url = url
+        if pool_size:
+            self.pool_size = pool_size
+        if timeout:
+            self.timeout = timeout
+        if retry_policy:
+            self.retry_policy = retry_policy
+        self.session = self.create_session(self.pool_size)
         self.api_key = api_key
         self.api_secret = api_secret
-        self.private_key = ed25519.Ed25519PrivateKey.from_private_bytes(
-            base64.b64decode(api_secret)
-        )
-        self.verifying_key = self.private_key.public_key()
-        self.verifying_key_b64 = base64.b64encode(
-            self.verifying_key.public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw
-            )
-        ).decode()
+        self.signer = Signer(api_secret, self.window)  # REST 和 websocket 共用
+        self.private_key = self.signer.private_key
+        self.verifying_key = self.signer.verifying_key
+        self.verifying_key_b64 = self.signer.verifying_key_b64
+        if rate_limit is not False:
+            self.limiter = ratelimit.for_account(self.verifying_key_b64, **(rate_limit or {}))
+        if warmup:
+            self.warmup()
+
+    def create_session(self, pool_size):
+        """创建带连接池的keep-alive会话，所有请求复用同一个会话，避免每次下单都重新握手"""
+        session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def warmup(self, connections=1):
+        """预热连接，提前完成握手。connections > 1 时并发请求，在池中建立多条连接"""
+        def ping():
+            try:
+                self.session.get(url=f'{self.url}api/v1/ping', proxies=self.proxies, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"连接预热失败: {e}")
+
+        threads = [threading.Thread(target=ping) for _ in range(max(1, min(connections, self.pool_size)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def connection_stats(self):
+        """连接复用统计
+
+        Returns:
+            dict: new 为新建连接数(即握手次数)，reused 为复用已有连接的请求数，requests 为请求总数
+        """
+        new = total = 0
+        if self.adapter:
+            managers = [self.adapter.poolmanager, *self.adapter.proxy_manager.values()]
+            for manager in managers:
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    new += pool.num_connections
+                    total += pool.num_requests
+        return {'new': new, 'reused': max(total - new, 0), 'requests': total}
+
+    def _throttle(self, instruction, priority=None):
+        """按指令的优先级(或指定的 priority)取限频令牌，低优先级请求排队过久时抛出 RateLimitShed"""
+        if self.limiter:
+            self.limiter.acquire(ratelimit.priority_of(instruction) if priority is None else priority)
+
+    def _check_rate_limited(self, res):
+        if res.status_code == 429 and self.limiter:
+            try:
+                seconds = float(res.headers.get('Retry-After') or 1)
+            except ValueError:
+                seconds = 1
+            logger.warning(f"触发交易所限频，暂停 {seconds} 秒")
+            self.limiter.backoff(seconds)
+
+    @staticmethod
+    def _raise_transient(res):
+        """5xx 和 429 是临时错误，交给 retry_policy 重试"""
+        if res.status_code == 429 or res.status_code >= 500:
+            raise TransientError(f"HTTP {res.status_code}: {res.text}", status_code=res.status_code)
+
+    def _request(self, method, path, instruction, params=None, priority=None):
+        """发送签名请求，GET 参数放在 query，POST/DELETE 参数放在 json body
+
+        5xx 和 429 抛出 TransientError，其他状态码由调用方处理；priority 覆盖按指令决定的限频通道
+        """
+        self._throttle(instruction, priority)
+        kwargs = {
+            'proxies': self.proxies,
+            'headers': self.sign(instruction, params),
+            'timeout': attempt_timeout(self.timeout),
+        }
+        if method == 'GET':
+            kwargs['params'] = params
+        else:
+            kwargs['data'] = json.dumps(params)
+        with Timer('rest', instruction, path) as t:
+            res = self.session.request(method, f'{self.url}{path}', **kwargs)
+            t.status = res.status_code
+        self._check_rate_limited(res)
+        self._raise_transient(res)
+        return res
 
     # capital
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def balances(self):
-        res = requests.get(url=f'{self.url}api/v1/capital', proxies=self.proxies,
-                           headers=self.sign('balanceQuery', {}))
+        res = self._request('GET', 'api/v1/capital', 'balanceQuery', {})
         if str(res.status_code) == "200":
             return res.json()
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def deposits(self):
-        return requests.get(url=f'{self.url}wapi/v1/capital/deposits', proxies=self.proxies,
-                            headers=self.sign('depositQueryAll', {})).json()
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+        return self._request('GET', 'wapi/v1/capital/deposits', 'depositQueryAll', {}).json()
+    @retry
     def depositAddress(self, chain: str):
         params = {'blockchain': chain}
-        return requests.get(url=f'{self.url}wapi/v1/capital/deposit/address', proxies=self.proxies, params=params,
-                            headers=self.sign('depositAddressQuery', params)).json()
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+        return self._request('GET', 'wapi/v1/capital/deposit/address', 'depositAddressQuery', params).json()
+    @retry
     def withdrawals(self, limit: int, offset: int):
         params = {'limit': limit, 'offset': offset}
-        return requests.get(url=f'{self.url}wapi/v1/capital/withdrawals', proxies=self.proxies, params=params,
-                            headers=self.sign('withdrawalQueryAll', params)).json()
+        return self._request('GET', 'wapi/v1/capital/withdrawals', 'withdrawalQueryAll', params).json()
 
     # history
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def orderHistoryQuery(self, symbol: str, limit: int, offset: int):
-        params = {'symbol': symbol, 'limit': limit, 'offset': offset}
-        return requests.get(url=f'{self.url}wapi/v1/history/orders', proxies=self.proxies, params=params,
-                            headers=self.sign('orderHistoryQueryAll', params)).json()
+        params = {'limit': limit, 'offset': offset}
+        if symbol:
+            params['symbol'] = symbol
+        return self._request('GET', 'wapi/v1/history/orders', 'orderHistoryQueryAll', params).json()
     
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def fillHistoryQuery(self, symbol: str, limit: int, offset: int):
         params = {'limit': limit, 'offset': offset}
         if len(symbol) > 0:
             params['symbol'] = symbol
-        return requests.get(url=f'{self.url}wapi/v1/history/fills', proxies=self.proxies, params=params,
-                            headers=self.sign('fillHistoryQueryAll', params)).json()
+        return self._request('GET', 'wapi/v1/history/fills', 'fillHistoryQueryAll', params).json()
     
 
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
-    def ExeOrder(self, cid, symbol, side, orderType, timeInForce, quantity, price):
+    @staticmethod
+    def _accepted_order(params, o):
+        """订单提交了但是未执行(202)时，按下单参数补全订单信息"""
+        return {
+            'clientId': params['clientId'],
+            'createdAt': None,
+            'executedQuantity': '0',
+            'executedQuoteQuantity': '0',
+            'id': o.get("id"),
+            'orderType': params['orderType'],
+            'postOnly': False,
+            'price': str(params['price']),
+            'quantity': str(params['quantity']),
+            'selfTradePrevention': 'RejectTaker',
+            'side': params['side'],
+            'status': 'New',
+            'symbol': params['symbol'],
+            'timeInForce': params['timeInForce'],
+            'triggerPrice': None
+        }
+
+    @staticmethod
+    def _maybe_landed(error):
+        """下单请求失败时订单是否可能已经生效: 连接超时和 429 说明交易所没有处理，其他网络异常和 5xx 不确定"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return False
+        return getattr(error, 'status_code', None) != 429
+
+    def ExeOrder(self, cid, symbol, side, orderType, timeInForce, quantity, price, deadline=None):
+        """下单，临时错误时重试
+
+        请求可能已经到达交易所(读超时、5xx)时，重发前先按 clientId 核对订单(_find_landed)，
+        挂单、订单历史或成交历史中有记录(包括已经成交/取消的)则直接返回，不会重复下单；都查不到时才重新提交。
+        """
         params = {
             'clientId': cid,
             'symbol': symbol,
@@ -104,57 +254,227 @@ class BpxClient:
             'quantity': quantity,
             'price': price
         }
-        res = requests.post(url=f'{self.url}api/v1/order', proxies=self.proxies, data=json.dumps(params),
-                            headers=self.sign('orderExecute', params))
-        if str(res.status_code) == "200":
+        unverified = False
+
+        def submit():
+            nonlocal unverified
+            if unverified:
+                order = self._find_landed([params]).get(cid)
+                unverified = False
+                if order:
+                    logger.info(f"订单 {cid} 已经生效，不再重复提交")
+                    return order
+            try:
+                res = self._request('POST', 'api/v1/order', 'orderExecute', params)
+            except RETRY_EXCEPTIONS as e:
+                unverified = self._maybe_landed(e)
+                raise
+            if res.status_code == 200:
+                return res.json()
+            elif res.status_code == 202:  # 订单提交了，但是未执行
+                return self._accepted_order(params, res.json())
+            else:
+                raise BpxError(f"订单提交失败: {res.text}", status_code=res.status_code, clientId=cid)
+
+        return self.retry_policy.call(submit, 'ExeOrder', deadline=deadline, breaker=self.breaker)
+
+    def _find_order(self, symbol, cid):
+        """按 clientId 查询挂单，不存在(未生效，或已成交/取消)返回 None"""
+        res = self._request('GET', 'api/v1/order', 'orderQuery', {'symbol': symbol, 'clientId': cid})
+        if res.status_code == 200:
             return res.json()
-        elif str(res.status_code) == "202":  # 订单提交了，但是未执行
-            o = res.json()
-            return {
-                'clientId': cid,
-                'createdAt': None,
-                'executedQuantity': '0',
-                'executedQuoteQuantity': '0',
-                'id': o.get("id"),
-                'orderType': orderType,
-                'postOnly': False,
-                'price': str(price),
-                'quantity': str(quantity),
-                'selfTradePrevention': 'RejectTaker',
-                'side': side,
-                'status': 'New',
-                'symbol': symbol,
-                'timeInForce': timeInForce,
-                'triggerPrice': None
-            }
-        else:
-            raise f"订单提交失败: {res.text}"
+        if res.status_code == 404:
+            return None
+        raise BpxError(f"订单查询失败: {res.text}", status_code=res.status_code, clientId=cid)
+
+    # 核对订单是否已经生效时查找的最近订单历史/成交历史条数
+    LANDED_LOOKBACK = 100
+
+    def _find_landed(self, params_list):
+        """重发前核对哪些订单已经生效，返回 {clientId: 订单信息}
+
+        挂单接口只返回未终结的订单，查不到的再到最近的订单历史和成交历史中查找(每个交易对各请求一次)，
+        已经成交或取消的订单同样算作已经生效。所有来源都查不到的订单不在结果中，可以重新提交；
+        历史查询失败时抛出异常，不会当作查不到。查询走 QUERY 通道，不和历史分页一起排队。
+        """
+        landed = {}
+        for p in params_list:
+            order = self._find_order(p['symbol'], p['clientId'])
+            if order:
+                landed[p['clientId']] = order
+        landed.update(self.findHistoryOrders([p for p in params_list if p['clientId'] not in landed]))
+        return landed
+
+    def findHistoryOrders(self, orders):
+        """按 clientId 在最近的订单历史和成交历史中查找已经终结的订单，返回 {clientId: 订单信息}
+
+        Args:
+            orders (list): 下单参数或订单信息(需要 clientId、symbol、side、orderType、timeInForce、quantity、price)
+        """
+        found = {}
+        for symbol in {o['symbol'] for o in orders}:
+            query = {'symbol': symbol, 'limit': self.LANDED_LOOKBACK, 'offset': 0}
+            history = self._history_page('wapi/v1/history/orders', 'orderHistoryQueryAll', query)
+            fills = self._history_page('wapi/v1/history/fills', 'fillHistoryQueryAll', query)
+            found.update(self._landed_from_history([o for o in orders if o['symbol'] == symbol], history, fills))
+        return found
+
+    def _history_page(self, path, instruction, params):
+        res = self._request('GET', path, instruction, params, priority=ratelimit.QUERY)
+        page = res.json() if res.status_code == 200 else None
+        if not isinstance(page, list):
+            raise BpxError(f"核对订单时查询历史失败: {res.text}", status_code=res.status_code)
+        return page
+
+    @staticmethod
+    def _landed_from_history(params_list, orders, fills):
+        """在订单历史和成交历史中按 clientId 查找已经生效的订单，返回 {clientId: 订单信息}
+
+        订单历史有延迟、只在成交历史中出现时，按下单参数和成交数量补全订单信息: 订单已经不在挂单中，
+        全部成交为 Filled，否则为部分成交后被取消(Cancelled)。
+        """
+        wanted = {str(p['clientId']): p for p in params_list}
+        landed = {}
+        for o in orders:
+            p = wanted.get(str(o.get('clientId')))
+            if p is not None and p['clientId'] not in landed:
+                landed[p['clientId']] = o
+        filled = {}
+        for f in fills:
+            p = wanted.get(str(f.get('clientId')))
+            if p is not None and p['clientId'] not in landed:
+                filled.setdefault(p['clientId'], (p, []))[1].append(f)
+        for cid, (p, rows) in filled.items():
+            executed = sum(float(f['quantity']) for f in rows)
+            order = BpxClient._accepted_order(p, {'id': rows[0].get('orderId')})
+            order['executedQuantity'] = str(executed)
+            order['executedQuoteQuantity'] = str(sum(float(f['quantity']) * float(f['price']) for f in rows))
+            order['status'] = 'Filled' if executed >= float(p['quantity']) - 1e-12 else 'Cancelled'
+            landed[cid] = order
+        return landed
+
+    @retry
+    def getOrderByClientId(self, symbol, cid):
+        return self._find_order(symbol, cid)
+
+    def ExeOrders(self, orders, deadline=None):
+        """批量下单
+
+        一次签名请求提交多个订单(POST /api/v1/orders)；如果交易所不支持批量接口，
+        退化为用线程池并发调用 ExeOrder。临时错误时与 ExeOrder 一样重试，重发前按 clientId
+        核对哪些订单已经生效，只重新提交没有生效的。
+
+        Args:
+            orders (list): 订单列表，每个元素是 ExeOrder 的参数字典
+                (cid, symbol, side, orderType, timeInForce, quantity, price)
+
+        Returns:
+            list: 与 orders 一一对应，成功为订单信息字典，失败为 BpxError
+        """
+        if not orders:
+            return []
+        if self.batch_supported:
+            params_list = [{
+                'clientId': o['cid'],
+                'symbol': o['symbol'],
+                'side': o['side'],
+                'orderType': o['orderType'],
+                'timeInForce': o['timeInForce'],
+                'quantity': o['quantity'],
+                'price': o['price'],
+            } for o in orders]
+            landed = {}  # clientId -> 重试前核对到已经生效的订单
+            pending = params_list
+            unverified = False
+
+            def submit():
+                nonlocal pending, unverified
+                if unverified:
+                    landed.update(self._find_landed(pending))
+                    pending = [p for p in pending if p['clientId'] not in landed]
+                    unverified = False
+                    if not pending:
+                        return None
+                self._throttle('orderExecute')
+                try:
+                    with Timer('rest', 'orderExecute', 'api/v1/orders') as t:
+                        res = self.session.post(url=f'{self.url}api/v1/orders', proxies=self.proxies,
+                                                timeout=attempt_timeout(self.timeout), data=json.dumps(pending),
+                                                headers=self.sign_batch('orderExecute', pending))
+                        t.status = res.status_code
+                    self._check_rate_limited(res)
+                    self._raise_transient(res)
+                except RETRY_EXCEPTIONS as e:
+                    unverified = self._maybe_landed(e)
+                    raise
+                return res
+
+            try:
+                res = self.retry_policy.call(submit, 'ExeOrders', deadline=deadline, breaker=self.breaker)
+            except (*RETRY_EXCEPTIONS, CircuitOpen, BpxError) as e:
+                # 重试后仍然不确定是否生效的订单交由调用方按 clientId 核对
+                return [landed.get(p['clientId']) or BpxError(f"批量下单请求异常: {e}", clientId=p['clientId'])
+                        for p in params_list]
+            if res is None:
+                return [landed[p['clientId']] for p in params_list]
+            if res.status_code in (404, 405) and not landed:
+                logger.warning("交易所不支持批量下单接口，改为并发逐个下单")
+                self.batch_supported = False
+            elif res.status_code in (200, 202):
+                results = dict(zip((p['clientId'] for p in pending),
+                                   (self._batch_item_result(p, item) for p, item in zip(pending, res.json()))))
+                return [landed.get(p['clientId']) or results[p['clientId']] for p in params_list]
+            else:
+                return [landed.get(p['clientId']) or BpxError(f"订单提交失败: {res.text}", status_code=res.status_code,
+                                                             clientId=p['clientId']) for p in params_list]
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        futures = [self.executor.submit(self.ExeOrder, **o) for o in orders]
+        results = []
+        for o, f in zip(orders, futures):
+            try:
+                results.append(f.result())
+            except BpxError as e:
+                results.append(e)
+            except Exception as e:
+                results.append(BpxError(f"订单提交失败: {e}", clientId=o['cid']))
+        return results
+
+    def _batch_item_result(self, params, item):
+        if not isinstance(item, dict) or item.get('code') or not item.get('id'):
+            message = item.get('message') if isinstance(item, dict) else item
+            code = item.get('code') if isinstance(item, dict) else None
+            return BpxError(f"订单提交失败: {message}", code=code, clientId=params['clientId'])
+        if item.get('status'):
+            return item
+        return self._accepted_order(params, item)
 
     # 获取挂单信息
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def getOpenOrder(self, symbol, orderId):
+        """查询挂单，已成交或取消返回 None；查询失败抛出异常，不会被当成已成交"""
         params = {
             'symbol': symbol,
             'orderId': orderId,
         }
-        res = requests.get(url=f'{self.url}api/v1/order', proxies=self.proxies, params=params,
-                            headers=self.sign('orderQuery', params))
+        res = self._request('GET', 'api/v1/order', 'orderQuery', params)
         if str(res.status_code) == "200":
             return res.json()
         elif str(res.status_code) == "404":  # 成交或者取消了就是404
             return None
         else:
-            logger.error(f"订单查询失败: {res.text}，重试")
-            time.sleep(5)
+            raise BpxError(f"订单查询失败: {res.text}", status_code=res.status_code)
 
-        # 取消未完成订单
+    # 取消未完成订单，撤单是幂等的，临时错误直接重试
+    @retry
     def cancelOrder(self, symbol, orderId):
+        """撤单，订单已成交/取消或被拒绝时返回 None，重试后仍然失败时抛出异常"""
         params = {
             'symbol': symbol,
             'orderId': orderId,
         }
-        res = requests.delete(url=f'{self.url}api/v1/order', proxies=self.proxies, data=json.dumps(params),
-                                headers=self.sign('orderCancel', params))
+        res = self._request('DELETE', 'api/v1/order', 'orderCancel', params)
         if str(res.status_code) == "200":
             return res.json()
         elif str(res.status_code) == "202":  # 订单取消了，但是未执行
@@ -162,54 +482,37 @@ class BpxClient:
                 'id': orderId
             }
         else:
-            logger.error(f"订单取消失败: {res.text}，重试")
+            logger.error(f"订单取消失败: {res.text}")
     
     # 获取所有未完成订单
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def getAllOpenOrders(self, symbol=None):
         params = {}
         if symbol:
             params = {'symbol': symbol}
-        return requests.get(url=f'{self.url}api/v1/orders', proxies=self.proxies, params=params,
-                            headers=self.sign('orderQueryAll', params)).json()
+        return self._request('GET', 'api/v1/orders', 'orderQueryAll', params).json()
 
     # 取消所有未完成订单
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def cancelAllOpenOrders(self, symbol):
         params = {'symbol': symbol}
-        return requests.delete(url=f'{self.url}api/v1/orders', proxies=self.proxies, data=json.dumps(params),
-                               headers=self.sign('orderCancelAll', params)).json()
+        return self._request('DELETE', 'api/v1/orders', 'orderCancelAll', params).json()
 
     # 获取历史订单
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def getHistoryOrders(self, symbol, limit=10, offset=0):
         params = {'symbol': symbol, 'limit': limit, 'offset': offset}
-        return requests.get(url=f'{self.url}wapi/v1/history/orders', proxies=self.proxies, params=params,
-                            headers=self.sign('orderHistoryQueryAll', params)).json()
+        return self._request('GET', 'wapi/v1/history/orders', 'orderHistoryQueryAll', params).json()
 
     # 获取历史成交订单
-    @retry(max_retries=3, delay=5, exceptions=(requests.exceptions.RequestException,))
+    @retry
     def getHistoryFilledOrders(self, symbol=None):
-        params = {'symbol': symbol}
-        return requests.get(url=f'{self.url}wapi/v1/history/fills', proxies=self.proxies, params=params,
-                            headers=self.sign('fillHistoryQueryAll', params)).json()
+        params = {'symbol': symbol} if symbol else {}
+        return self._request('GET', 'wapi/v1/history/fills', 'fillHistoryQueryAll', params).json()
+
+    def sign_batch(self, instruction: str, params_list: list):
+        """批量请求签名"""
+        return self.signer.sign_batch(instruction, params_list)
 
     def sign(self, instruction: str, params: dict = None):
-        timestamp = str(int(time.time() * 1000))
-        window = '5000'
-        body = {
-            'instruction': instruction,
-            **dict(sorted((params or {}).items())),
-            'timestamp': timestamp,
-            'window': window,
-        }
-        message = urlencode(body)
-        signature = self.private_key.sign(message.encode())
-        signature_b64 = base64.b64encode(signature).decode()
-        return {
-            'X-API-KEY': self.verifying_key_b64,
-            'X-TIMESTAMP': timestamp,
-            'X-WINDOW': window,
-            'Content-Type': 'application/json',
-            'X-SIGNATURE': signature_b64
-        }
+        return self.signer.sign(instruction, params)
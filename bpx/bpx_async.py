@@ -0,0 +1,293 @@
+import asyncio
+import json
+from functools import wraps
+
+import aiohttp
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from loguru import logger
+
+from bpx.bpx import BpxClient, BpxError
+from bpx.signer import Signer
+from bpx.metrics import Timer
+from bpx.retry import RetryPolicy, CircuitBreaker, TransientError
+
+
+def async_retry(func):
+    """retry 的协程版本，按客户端的 retry_policy 重试，等待时不阻塞事件循环"""
+    @wraps(func)
+    async def wrapper(self, *args, deadline=None, **kwargs):
+        return await self.retry_policy.call_async(lambda: func(self, *args, **kwargs), func.__name__,
+                                                  deadline=deadline, breaker=self.breaker,
+                                                  exceptions=self.RETRY_EXCEPTIONS)
+    return wrapper
+
+
+async def fan_out(*aws):
+    """并发等待多个互不依赖的请求，按传入顺序返回结果，单个请求的异常作为结果返回而不会打断其他请求
+
+    例: balances, order = await fan_out(client.balances(), client.getOpenOrder(symbol, order_id))
+    """
+    return await asyncio.gather(*aws, return_exceptions=True)
+
+
+class AsyncBpxClient:
+    """BpxClient 的 asyncio 版本，接口、签名方式与 BpxClient 一致，基于 aiohttp 连接池"""
+    url = BpxClient.url
+    private_key: ed25519.Ed25519PrivateKey
+
+    # 与同步客户端共用同一套签名逻辑
+    sign = BpxClient.sign
+
+    RETRY_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, TransientError)
+
+    def __init__(self):
+        self.debug = False
+        self.proxy = None  # 例: 'http://127.0.0.1:7890'
+        self.api_key = ''
+        self.api_secret = ''
+        self.window = 5000
+        self.pool_size = 10  # 连接池大小
+        self.timeout = 10  # 每个请求的总超时时间，单位秒
+        self.session = None
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker('rest_async')
+
+    def init(self, api_key, api_secret, pool_size=None, timeout=None, url=None, retry_policy=None):
+        if url:
+            self.url = url
+        if retry_policy:
+            self.retry_policy = retry_policy
+        self.api_key = api_key
+        self.api_secret = api_secret
+        if pool_size:
+            self.pool_size = pool_size
+        if timeout:
+            self.timeout = timeout
+        self.signer = Signer(api_secret, self.window)
+        self.private_key = self.signer.private_key
+        self.verifying_key = self.signer.verifying_key
+        self.verifying_key_b64 = self.signer.verifying_key_b64
+
+    async def start(self, warmup=True):
+        """创建会话(必须在事件循环中调用)，warmup 时提前建立连接"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if warmup:
+            try:
+                async with self.session.get(f'{self.url}api/v1/ping', proxy=self.proxy) as res:
+                    await res.read()
+            except self.RETRY_EXCEPTIONS as e:
+                logger.warning(f"连接预热失败: {e}")
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, method, path, instruction, params=None):
+        """发送签名请求，返回 (状态码, 响应文本)，5xx 和 429 抛出 TransientError"""
+        if self.session is None or self.session.closed:
+            await self.start(warmup=False)
+        kwargs = {
+            'proxy': self.proxy,
+            'headers': self.sign(instruction, params),
+        }
+        if method == 'GET':
+            kwargs['params'] = {k: str(v) for k, v in (params or {}).items() if v is not None}
+        else:
+            kwargs['data'] = json.dumps(params)
+        with Timer('rest_async', instruction, path) as t:
+            async with self.session.request(method, f'{self.url}{path}', **kwargs) as res:
+                t.status = res.status
+                text = await res.text()
+        if res.status == 429 or res.status >= 500:
+            raise TransientError(f"HTTP {res.status}: {text}", status_code=res.status)
+        return res.status, text
+
+    # capital
+    @async_retry
+    async def balances(self):
+        status, text = await self._request('GET', 'api/v1/capital', 'balanceQuery', {})
+        if status == 200:
+            return json.loads(text)
+
+    @async_retry
+    async def deposits(self):
+        status, text = await self._request('GET', 'wapi/v1/capital/deposits', 'depositQueryAll', {})
+        return json.loads(text)
+
+    @async_retry
+    async def depositAddress(self, chain: str):
+        params = {'blockchain': chain}
+        status, text = await self._request('GET', 'wapi/v1/capital/deposit/address', 'depositAddressQuery', params)
+        return json.loads(text)
+
+    @async_retry
+    async def withdrawals(self, limit: int, offset: int):
+        params = {'limit': limit, 'offset': offset}
+        status, text = await self._request('GET', 'wapi/v1/capital/withdrawals', 'withdrawalQueryAll', params)
+        return json.loads(text)
+
+    # history
+    @async_retry
+    async def orderHistoryQuery(self, symbol: str, limit: int, offset: int):
+        params = {'limit': limit, 'offset': offset}
+        if symbol:
+            params['symbol'] = symbol
+        status, text = await self._request('GET', 'wapi/v1/history/orders', 'orderHistoryQueryAll', params)
+        return json.loads(text)
+
+    @async_retry
+    async def fillHistoryQuery(self, symbol: str, limit: int, offset: int):
+        params = {'limit': limit, 'offset': offset}
+        if len(symbol) > 0:
+            params['symbol'] = symbol
+        status, text = await self._request('GET', 'wapi/v1/history/fills', 'fillHistoryQueryAll', params)
+        return json.loads(text)
+
+    async def ExeOrder(self, cid, symbol, side, orderType, timeInForce, quantity, price, deadline=None):
+        """下单，重发前按 clientId 核对订单是否已经生效(挂单、订单历史、成交历史)，见 BpxClient.ExeOrder"""
+        params = {
+            'clientId': cid,
+            'symbol': symbol,
+            'side': side,
+            'orderType': orderType,
+            'timeInForce': timeInForce,
+            'quantity': quantity,
+            'price': price
+        }
+        unverified = False
+
+        async def submit():
+            nonlocal unverified
+            if unverified:
+                order = (await self._find_landed([params])).get(cid)
+                unverified = False
+                if order:
+                    logger.info(f"订单 {cid} 已经生效，不再重复提交")
+                    return order
+            try:
+                status, text = await self._request('POST', 'api/v1/order', 'orderExecute', params)
+            except self.RETRY_EXCEPTIONS as e:
+                unverified = getattr(e, 'status_code', None) != 429  # 429 说明交易所没有处理
+                raise
+            if status == 200:
+                return json.loads(text)
+            elif status == 202:  # 订单提交了，但是未执行
+                return BpxClient._accepted_order(params, json.loads(text))
+            else:
+                raise BpxError(f"订单提交失败: {text}", status_code=status, clientId=cid)
+
+        return await self.retry_policy.call_async(submit, 'ExeOrder', deadline=deadline, breaker=self.breaker,
+                                                  exceptions=self.RETRY_EXCEPTIONS)
+
+    async def _find_order(self, symbol, cid):
+        """按 clientId 查询挂单，不存在返回 None"""
+        status, text = await self._request('GET', 'api/v1/order', 'orderQuery', {'symbol': symbol, 'clientId': cid})
+        if status == 200:
+            return json.loads(text)
+        if status == 404:
+            return None
+        raise BpxError(f"订单查询失败: {text}", status_code=status, clientId=cid)
+
+    async def _find_landed(self, params_list):
+        """重发前核对哪些订单已经生效，返回 {clientId: 订单信息}，见 BpxClient._find_landed"""
+        landed = {}
+        for p in params_list:
+            order = await self._find_order(p['symbol'], p['clientId'])
+            if order:
+                landed[p['clientId']] = order
+        landed.update(await self.findHistoryOrders([p for p in params_list if p['clientId'] not in landed]))
+        return landed
+
+    async def findHistoryOrders(self, orders):
+        """按 clientId 在最近的订单历史和成交历史中查找已经终结的订单，见 BpxClient.findHistoryOrders"""
+        found = {}
+        for symbol in {o['symbol'] for o in orders}:
+            query = {'symbol': symbol, 'limit': BpxClient.LANDED_LOOKBACK, 'offset': 0}
+            history = await self._history_page('wapi/v1/history/orders', 'orderHistoryQueryAll', query)
+            fills = await self._history_page('wapi/v1/history/fills', 'fillHistoryQueryAll', query)
+            found.update(BpxClient._landed_from_history([o for o in orders if o['symbol'] == symbol],
+                                                        history, fills))
+        return found
+
+    async def _history_page(self, path, instruction, params):
+        status, text = await self._request('GET', path, instruction, params)
+        page = json.loads(text) if status == 200 else None
+        if not isinstance(page, list):
+            raise BpxError(f"核对订单时查询历史失败: {text}", status_code=status)
+        return page
+
+    @async_retry
+    async def getOrderByClientId(self, symbol, cid):
+        return await self._find_order(symbol, cid)
+
+    # 获取挂单信息
+    @async_retry
+    async def getOpenOrder(self, symbol, orderId):
+        params = {
+            'symbol': symbol,
+            'orderId': orderId,
+        }
+        status, text = await self._request('GET', 'api/v1/order', 'orderQuery', params)
+        if status == 200:
+            return json.loads(text)
+        elif status == 404:  # 成交或者取消了就是404
+            return None
+        else:
+            raise BpxError(f"订单查询失败: {text}", status_code=status)
+
+    # 取消未完成订单
+    @async_retry
+    async def cancelOrder(self, symbol, orderId):
+        params = {
+            'symbol': symbol,
+            'orderId': orderId,
+        }
+        status, text = await self._request('DELETE', 'api/v1/order', 'orderCancel', params)
+        if status == 200:
+            return json.loads(text)
+        elif status == 202:  # 订单取消了，但是未执行
+            return {
+                'id': orderId
+            }
+        else:
+            logger.error(f"订单取消失败: {text}")
+
+    # 获取所有未完成订单
+    @async_retry
+    async def getAllOpenOrders(self, symbol=None):
+        params = {}
+        if symbol:
+            params = {'symbol': symbol}
+        status, text = await self._request('GET', 'api/v1/orders', 'orderQueryAll', params)
+        return json.loads(text)
+
+    # 取消所有未完成订单
+    @async_retry
+    async def cancelAllOpenOrders(self, symbol):
+        params = {'symbol': symbol}
+        status, text = await self._request('DELETE', 'api/v1/orders', 'orderCancelAll', params)
+        return json.loads(text)
+
+    # 获取历史订单
+    @async_retry
+    async def getHistoryOrders(self, symbol, limit=10, offset=0):
+        params = {'symbol': symbol, 'limit': limit, 'offset': offset}
+        status, text = await self._request('GET', 'wapi/v1/history/orders', 'orderHistoryQueryAll', params)
+        return json.loads(text)
+
+    # 获取历史成交订单
+    @async_retry
+    async def getHistoryFilledOrders(self, symbol=None):
+        params = {'symbol': symbol} if symbol else {}
+        status, text = await self._request('GET', 'wapi/v1/history/fills', 'fillHistoryQueryAll', params)
+        return json.loads(text)
@@ -1,65 +1,91 @@
 import requests
-import time
+from requests.adapters import HTTPAdapter
 from loguru import logger
 
+from bpx.metrics import Timer
+from bpx.retry import RetryPolicy, TransientError, attempt_timeout
+
 BP_BASE_URL = ' https://api.backpack.exchange/'
+TIMEOUT = (3.05, 10)  # (连接超时, 读超时)，单位秒
+RETRY_POLICY = RetryPolicy(max_attempts=6, deadline=10.0)
+
+# 公共接口共用一个 keep-alive 会话，不再每次请求重新握手
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+
+def set_base_url(url: str):
+    """切换公共接口的根地址，例如本地模拟交易所 'http://127.0.0.1:8080/'"""
+    global BP_BASE_URL
+    BP_BASE_URL = url if url.endswith('/') else url + '/'
+
+
+def _get(path: str, params: dict = None):
+    """公共接口 GET 请求，记录延迟和状态码，5xx 和 429 抛出 TransientError"""
+    with Timer('public', None, path) as t:
+        res = _session.get(url=f'{BP_BASE_URL.strip()}{path}', params=params, timeout=attempt_timeout(TIMEOUT))
+        t.status = res.status_code
+    if res.status_code == 429 or res.status_code >= 500:
+        raise TransientError(f"HTTP {res.status_code}: {res.text}", status_code=res.status_code)
+    return res
 
 
 # Markets
 
 def Assets():
-    return requests.get(url=f'{BP_BASE_URL}api/v1/assets').json()
+    return _get('api/v1/assets').json()
 
 
 def Markets():
-    return requests.get(url=f'{BP_BASE_URL}api/v1/markets').json()
+    return _get('api/v1/markets').json()
 
 
 def Ticker(symbol: str):
-    return requests.get(url=f'{BP_BASE_URL}api/v1/ticker?symbol={symbol}').json()
+    return _get('api/v1/ticker', {'symbol': symbol}).json()
 
 
-def Depth(symbol: str):
-    while True:
-        res = requests.get(url=f'{BP_BASE_URL}api/v1/depth?symbol={symbol}')
-        if str(res.status_code) == "200":
-            return res.json()
-        else:
-            logger.error(f"获取深度数据失败: {res.text}, 重试")
-            time.sleep(2)
+def Depth(symbol: str, deadline=None):
+    """深度快照，失败时按 RETRY_POLICY 重试，超过截止时间(默认10秒)仍然失败则抛出异常"""
+    def fetch():
+        res = _get('api/v1/depth', {'symbol': symbol})
+        if res.status_code != 200:
+            raise TransientError(f"获取深度数据失败: {res.text}", status_code=res.status_code)
+        return res.json()
+    return RETRY_POLICY.call(fetch, 'Depth', deadline=deadline)
 
 
 def KLines(symbol: str, interval: str, startTime: int = 0, endTime: int = 0):
-    url = f'{BP_BASE_URL}api/v1/klines?symbol={symbol}&interval={interval}'
+    params = {'symbol': symbol, 'interval': interval}
 
     if startTime > 0:
-        url = f'{url}&startTime={startTime}'
+        params['startTime'] = startTime
     if endTime > 0:
-        url = f'{url}&endTime={endTime}'
+        params['endTime'] = endTime
 
-    return requests.get(url).json()
+    return _get('api/v1/klines', params).json()
 
 
 # System
 def Status():
-    return requests.get(url=f'{BP_BASE_URL}api/v1/status').json()
+    return _get('api/v1/status').json()
 
 
 def Ping():
-    return requests.get(url=f'{BP_BASE_URL}api/v1/ping').text
+    return _get('api/v1/ping').text
 
 
 def Time():
-    return requests.get(url=f'{BP_BASE_URL}api/v1/time').text
+    return _get('api/v1/time').text
 
 
 # Trades
 def recentTrades(symbol: str, limit: int = 100):
-    return requests.get(url=f'{BP_BASE_URL}api/v1/trades?symbol={symbol}&limit={limit}').json()
+    return _get('api/v1/trades', {'symbol': symbol, 'limit': limit}).json()
 
 
 def historyTrades(symbol: str, limit: int = 100, offset: int = 0):
-    return requests.get(url=f'{BP_BASE_URL}api/v1/trades/history?symbol={symbol}&limit={limit}&offset={offset}').json()
+    return _get('api/v1/trades/history', {'symbol': symbol, 'limit': limit, 'offset': offset}).json()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+import asyncio
+import aiohttp
+from loguru import logger
+
+from bpx import bpx_pub
+from bpx.metrics import Timer
+from bpx.retry import TransientError
+
+RETRY_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, TransientError)
+
+_session = None
+
+
+async def get_session(pool_size: int = 10, timeout: float = 10):
+    """公共接口共用一个带连接池的会话，首次调用时创建"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+    return _session
+
+
+async def close():
+    global _session
+    if _session and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def base_url():
+    """与 bpx_pub 共用根地址，bpx_pub.set_base_url 同样对异步接口生效"""
+    return bpx_pub.BP_BASE_URL.strip()
+
+
+async def _get(path: str, params: dict = None, as_json: bool = True):
+    session = await get_session()
+    with Timer('public_async', None, path) as t:
+        async with session.get(url=f'{base_url()}{path}', params=params) as res:
+            t.status = res.status
+            if as_json:
+                return await res.json(content_type=None)
+            return await res.text()
+
+
+# Markets
+
+async def Assets():
+    return await _get('api/v1/assets')
+
+
+async def Markets():
+    return await _get('api/v1/markets')
+
+
+async def Ticker(symbol: str):
+    return await _get('api/v1/ticker', {'symbol': symbol})
+
+
+async def Depth(symbol: str, deadline=None):
+    """深度快照，重试策略与 bpx_pub.Depth 相同"""
+    async def fetch():
+        session = await get_session()
+        with Timer('public_async', None, 'api/v1/depth') as t:
+            async with session.get(url=f'{base_url()}api/v1/depth', params={'symbol': symbol}) as res:
+                t.status = res.status
+                if res.status != 200:
+                    raise TransientError(f"获取深度数据失败: {await res.text()}", status_code=res.status)
+                return await res.json(content_type=None)
+    return await bpx_pub.RETRY_POLICY.call_async(fetch, 'Depth', deadline=deadline, exceptions=RETRY_EXCEPTIONS)
+
+
+async def KLines(symbol: str, interval: str, startTime: int = 0, endTime: int = 0):
+    params = {'symbol': symbol, 'interval': interval}
+    if startTime > 0:
+        params['startTime'] = startTime
+    if endTime > 0:
+        params['endTime'] = endTime
+    return await _get('api/v1/klines', params)
+
+
+# System
+async def Status():
+    return await _get('api/v1/status')
+
+
+async def Ping():
+    return await _get('api/v1/ping', as_json=False)
+
+
+async def Time():
+    return await _get('api/v1/time', as_json=False)
+
+
+# Trades
+async def recentTrades(symbol: str, limit: int = 100):
+    return await _get('api/v1/trades', {'symbol': symbol, 'limit': limit})
+
+
+async def historyTrades(symbol: str, limit: int = 100, offset: int = 0):
+    return await _get('api/v1/trades/history', {'symbol': symbol, 'limit': limit, 'offset': offset})
+
+
+if __name__ == '__main__':
+    async def main():
+        # 并发获取状态、盘口和行情
+        status, depth, ticker = await asyncio.gather(Status(), Depth('SOL_USDC'), Ticker('SOL_USDC'))
+        logger.info(status)
+        logger.info(ticker)
+        await close()
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import json
+import time
+import threading
+from websocket import create_connection, WebSocketException
+from loguru import logger
+
+from bpx import events
+
+
+class BpxStream(threading.Thread):
+    """Backpack websocket 订阅线程
+
+    连接后订阅 streams，私有频道(account.*)使用 signer 签名；每收到一条推送调用
+    on_event(stream, data)。连接断开后按退避时间自动重连并重新订阅，重连成功后调用 on_reconnect()，
+    调用方可以在其中用 REST 对账。
+    """
+    stream_url = "wss://ws.backpack.exchange/"
+
+    def __init__(self, signer, streams, on_event, on_reconnect=None, stream_url=None,
+                 backoff=1, max_backoff=30):
+        threading.Thread.__init__(self, daemon=True)
+        self.signer = signer
+        self.streams = list(streams)
+        self.on_event = on_event
+        self.on_reconnect = on_reconnect
+        if stream_url:
+            self.stream_url = stream_url
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ws = None
+        self.running = True
+        self.connected = threading.Event()
+
+    def subscribe(self, streams):
+        message = {"method": "SUBSCRIBE", "params": streams}
+        if any(s.startswith('account.') for s in streams):
+            message["signature"] = self.signer.ws_signature('subscribe')
+        self.ws.send(json.dumps(message))
+        logger.info(f"WebSocket subscribed to {streams}")
+
+    def connect(self):
+        logger.debug(f"Creating connection with WebSocket Server: {self.stream_url}")
+        self.ws = create_connection(self.stream_url)
+        self.subscribe(self.streams)
+        self.connected.set()
+
+    def run(self):
+        delay = self.backoff
+        first = True
+        while self.running:
+            try:
+                self.connect()
+                if not first and self.on_reconnect:
+                    self.on_reconnect()
+                first = False
+                delay = self.backoff
+                self.read_data()
+            except (WebSocketException, OSError) as e:
+                logger.error(f"Websocket exception: {e}")
+            finally:
+                self.connected.clear()
+            if self.running:
+                logger.warning(f"WebSocket 连接断开，{delay} 秒后重连")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def read_data(self):
+        while self.running:
+            message = self.ws.recv()  # 自动回复 ping
+            if not message:
+                continue
+            try:
+                stream, data = events.decode(message)
+            except events.JSONDecodeError:
+                logger.error(f"Failed to decode message as JSON, message: {message}")
+                continue
+            if data is None:
+                logger.debug(f"Message: {message}")
+                continue
+            try:
+                self.on_event(stream, data)
+            except Exception as e:
+                logger.error(f"Error from callback {self.on_event}: {e}")
+
+    def stop(self):
+        self.running = False
+        if self.ws and self.ws.connected:
+            self.ws.send_close()
@@ -0,0 +1,111 @@
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from loguru import logger
+
+from bpx import bpx_pub
+
+# 接口 -> (有效期, 过期后还可以返回旧值的时间)，单位秒
+# 超过有效期但在宽限时间内时直接返回旧值，同时在后台刷新；超过宽限时间后同步请求
+TTLS = {
+    'Status': (5, 60),
+    'Markets': (300, 3600),
+    'Assets': (300, 3600),
+    'Ticker': (1, 5),
+}
+
+
+class MarketDataCache:
+    """公共行情接口的缓存
+
+    - 按接口设置有效期(TTLS)，有效期内直接返回缓存
+    - 过期后的宽限时间内先返回旧值，由后台线程刷新(stale-while-revalidate)，调用方不等待网络
+    - 同一个 key(接口 + 参数)同一时间只有一个请求在路上，其余调用等待同一个结果(请求合并)，
+      多个网格同时查询同一交易对的状态或市场信息只会请求一次
+    - 后台刷新失败时保留旧值，宽限时间过后再同步请求并抛出异常
+    """
+
+    def __init__(self, ttls=None, workers=2):
+        self.ttls = {**TTLS, **(ttls or {})}
+        self.workers = workers
+        self.entries = {}  # key -> (值, 获取时间)
+        self.inflight = {}  # key -> Future
+        self.lock = threading.Lock()
+        self.executor = None
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'errors': 0}
+
+    def get(self, name, *args):
+        """按缓存策略调用 bpx_pub.<name>(*args)"""
+        ttl, grace = self.ttls[name]
+        key = (bpx_pub.BP_BASE_URL, name, args)  # 切换根地址(例如模拟交易所)后不会读到旧环境的缓存
+        now = time.monotonic()
+        leader = False
+        with self.lock:
+            entry = self.entries.get(key)
+            age = now - entry[1] if entry else None
+            if entry and age < ttl:
+                self.stats['hits'] += 1
+                return entry[0]
+            if entry and age < ttl + grace:
+                self.stats['stale_hits'] += 1
+                if key not in self.inflight:
+                    self.stats['refreshes'] += 1
+                    self.inflight[key] = future = Future()
+                    if self.executor is None:
+                        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='market-cache')
+                    self.executor.submit(self._fetch, key, name, args, future)
+                return entry[0]
+            future = self.inflight.get(key)
+            if future is None:
+                self.stats['misses'] += 1
+                self.inflight[key] = future = Future()
+                leader = True
+            else:
+                self.stats['coalesced'] += 1
+        if leader:
+            # 没有可用的缓存，在当前线程请求，其余线程等待同一个 future
+            self._fetch(key, name, args, future)
+        return future.result()
+
+    def _fetch(self, key, name, args, future):
+        try:
+            value = getattr(bpx_pub, name)(*args)
+        except Exception as e:
+            with self.lock:
+                self.stats['errors'] += 1
+                self.inflight.pop(key, None)
+            logger.warning(f"行情缓存刷新 {name}{args} 失败: {e}")
+            future.set_exception(e)
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.inflight.pop(key, None)
+        future.set_result(value)
+
+    def invalidate(self, name=None):
+        """清除缓存，name 为空时清除全部"""
+        with self.lock:
+            for key in [k for k in self.entries if name is None or k[1] == name]:
+                del self.entries[key]
+
+    # 与 bpx_pub 同名的接口
+    def Status(self):
+        return self.get('Status')
+
+    def Markets(self):
+        return self.get('Markets')
+
+    def Assets(self):
+        return self.get('Assets')
+
+    def Ticker(self, symbol: str):
+        return self.get('Ticker', symbol)
+
+    def Market(self, symbol: str):
+        """单个交易对的市场信息(Markets 中 symbol 对应的项)，不存在返回 None"""
+        return next((m for m in self.Markets() or [] if m.get('symbol') == symbol), None)
+
+
+# 进程内共用，所有网格的查询合并到同一个缓存
+MARKET_DATA = MarketDataCache()
@@ -0,0 +1,186 @@
+import time
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟分桶上界(秒)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 流水线队列的排队延迟一般在毫秒以下，分桶更细
+LAG_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    """REST 调用指标
+
+    - bpx_request_duration_seconds: 每个接口的延迟直方图(含超时、连接失败的请求)
+    - bpx_responses_total: 每个接口按 HTTP 状态码计数(200/202/404/429...)
+    - bpx_errors_total: 每个接口按错误类别计数，异常为异常类名，HTTP 错误为 http_4xx / http_5xx
+    - bpx_retries_total: 重试策略(bpx.retry)按函数名统计的重试次数
+
+    - bpx_queue_depth / bpx_queue_processed_total / bpx_queue_lag_seconds: 已注册的流水线阶段(pipeline.Stage)
+      的队列深度、处理条数和排队延迟
+
+    标签: client 为 rest / rest_async / public / public_async，endpoint 为签名指令(公共接口为空)，path 为接口路径。
+    记录只是在锁内更新几个计数，开销在微秒以下；enabled 为 False 时直接跳过。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.latency = {}  # (client, endpoint, path) -> Histogram
+        self.responses = {}  # (client, endpoint, path, status) -> 次数
+        self.errors = {}  # (client, endpoint, path, error) -> 次数
+        self.retries = {}  # 函数名 -> 次数
+        self.stages = {}  # 阶段名 -> pipeline.Stage
+
+    def observe(self, client, endpoint, path, status, seconds):
+        """记录一次请求，status 为 HTTP 状态码，请求异常时为异常对象"""
+        if not self.enabled:
+            return
+        key = (client, endpoint or '', path)
+        with self.lock:
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = Histogram()
+            hist.observe(seconds)
+            if isinstance(status, BaseException):
+                error = type(status).__name__
+            else:
+                self.responses[key + (status,)] = self.responses.get(key + (status,), 0) + 1
+                error = f'http_{status // 100}xx' if status >= 400 else None
+            if error:
+                self.errors[key + (error,)] = self.errors.get(key + (error,), 0) + 1
+
+    def retry(self, function):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.retries[function] = self.retries.get(function, 0) + 1
+
+    def register_stage(self, stage):
+        with self.lock:
+            self.stages[stage.name] = stage
+
+    def unregister_stage(self, stage):
+        with self.lock:
+            if self.stages.get(stage.name) is stage:
+                del self.stages[stage.name]
+
+    def reset(self):
+        with self.lock:
+            self.latency.clear()
+            self.responses.clear()
+            self.errors.clear()
+            self.retries.clear()
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self.lock:
+            latency = [(k, list(h.counts), h.sum, h.count) for k, h in self.latency.items()]
+            responses = list(self.responses.items())
+            errors = list(self.errors.items())
+            retries = list(self.retries.items())
+            stages = list(self.stages.values())
+        lines = [
+            '# HELP bpx_request_duration_seconds REST request latency',
+            '# TYPE bpx_request_duration_seconds histogram',
+        ]
+        for (client, endpoint, path), counts, total, count in sorted(latency):
+            labels = f'client="{client}",endpoint="{endpoint}",path="{path}"'
+            lines += _histogram('bpx_request_duration_seconds', labels, BUCKETS, counts, total, count)
+        lines += ['# HELP bpx_responses_total REST responses by HTTP status', '# TYPE bpx_responses_total counter']
+        for (client, endpoint, path, status), n in sorted(responses):
+            lines.append(f'bpx_responses_total{{client="{client}",endpoint="{endpoint}",path="{path}",status="{status}"}} {n}')
+        lines += ['# HELP bpx_errors_total REST errors by class', '# TYPE bpx_errors_total counter']
+        for (client, endpoint, path, error), n in sorted(errors):
+            lines.append(f'bpx_errors_total{{client="{client}",endpoint="{endpoint}",path="{path}",error="{error}"}} {n}')
+        lines += ['# HELP bpx_retries_total Retries by function', '# TYPE bpx_retries_total counter']
+        for function, n in sorted(retries):
+            lines.append(f'bpx_retries_total{{function="{function}"}} {n}')
+        stages.sort(key=lambda st: st.name)
+        lines += ['# HELP bpx_queue_depth Pipeline queue depth', '# TYPE bpx_queue_depth gauge']
+        lines += [f'bpx_queue_depth{{stage="{st.name}"}} {st.depth()}' for st in stages]
+        lines += ['# HELP bpx_queue_processed_total Pipeline messages processed', '# TYPE bpx_queue_processed_total counter']
+        lines += [f'bpx_queue_processed_total{{stage="{st.name}"}} {st.stats["processed"]}' for st in stages]
+        lines += ['# HELP bpx_queue_lag_seconds Pipeline queueing delay', '# TYPE bpx_queue_lag_seconds histogram']
+        for st in stages:
+            lag = st.lag
+            lines += _histogram('bpx_queue_lag_seconds', f'stage="{st.name}"', lag.buckets, list(lag.counts), lag.sum,
+                                lag.count)
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram(name, labels, buckets, counts, total, count):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(buckets, counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+    return lines
+
+
+METRICS = Metrics()  # 进程内所有客户端共用
+
+
+class Timer:
+    """记录一次请求的耗时: with Timer(client, endpoint, path) as t: ...; t.status = res.status_code"""
+    __slots__ = ('client', 'endpoint', 'path', 'start', 'status')
+
+    def __init__(self, client, endpoint, path):
+        self.client = client
+        self.endpoint = endpoint
+        self.path = path
+        self.status = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = exc if exc is not None else self.status
+        if status is not None:
+            METRICS.observe(self.client, self.endpoint, self.path, status, time.perf_counter() - self.start)
+        return False
+
+
+def serve(port=9108, host='127.0.0.1', registry=None):
+    """在后台线程启动指标接口 http://host:port/metrics ，返回 HTTPServer(调用 shutdown() 停止)"""
+    registry = registry or METRICS
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,139 @@
+import time
+import heapq
+import threading
+from itertools import count
+
+# 优先级通道，数值越小越优先
+CANCEL, PLACE, QUERY, HISTORY = 0, 1, 2, 3
+LANES = ('cancel', 'place', 'query', 'history')
+
+# 签名指令 -> 优先级，未列出的按 QUERY 处理
+PRIORITIES = {
+    'orderCancel': CANCEL,
+    'orderCancelAll': CANCEL,
+    'orderExecute': PLACE,
+    'orderQuery': QUERY,
+    'orderQueryAll': QUERY,
+    'balanceQuery': QUERY,
+    'depositAddressQuery': QUERY,
+    'orderHistoryQueryAll': HISTORY,
+    'fillHistoryQueryAll': HISTORY,
+    'depositQueryAll': HISTORY,
+    'withdrawalQueryAll': HISTORY,
+}
+
+
+def priority_of(instruction):
+    return PRIORITIES.get(instruction, QUERY)
+
+
+class RateLimitShed(Exception):
+    """低优先级请求在限频下等待超时或排队过长，被放弃(没有发送)"""
+
+    def __init__(self, lane, waited):
+        super().__init__(f"限频丢弃 {lane} 请求，已等待 {waited:.3f} 秒")
+        self.lane = lane
+        self.waited = waited
+
+
+class RateLimiter:
+    """令牌桶限频，按优先级通道排队
+
+    - 每秒补充 rate 个令牌，最多积累 burst 个，每个请求消耗一个
+    - 等待中的请求按 (优先级, 到达顺序) 出队，撤单 > 下单 > 查询 > 历史
+    - 查询和历史只能使用 reserve 之外的令牌，给撤单和下单预留余量，下单不会排在对账请求后面
+    - 查询和历史最多等待 max_wait 秒、每个通道最多 max_queue 个排队，超过时抛出 RateLimitShed
+    - 收到 429 时调用 backoff 暂停发放令牌
+    """
+
+    def __init__(self, rate=20.0, burst=40, reserve=(0, 0, 0.25, 0.5), max_wait=(None, None, 5.0, 2.0),
+                 max_queue=(None, None, 50, 10)):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.reserve = [r * self.burst for r in reserve]  # 各通道需要保留的令牌数
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.cond = threading.Condition()
+        self.waiters = []  # 堆: (优先级, 序号)
+        self.seq = count()
+        self.stats = {'granted': [0] * 4, 'shed': [0] * 4, 'wait_seconds': [0.0] * 4, 'backoff': 0}
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority, timeout=None):
+        """取一个令牌，必要时等待
+
+        Args:
+            priority (int): CANCEL / PLACE / QUERY / HISTORY
+            timeout (float, optional): 最长等待秒数，默认按通道的 max_wait，None 表示一直等待
+
+        Returns:
+            float: 等待的秒数
+        """
+        max_wait = self.max_wait[priority] if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if max_wait is None else start + max_wait
+        with self.cond:
+            limit = self.max_queue[priority]
+            if limit is not None and sum(1 for w in self.waiters if w[0] == priority) >= limit:
+                self.stats['shed'][priority] += 1
+                raise RateLimitShed(LANES[priority], 0.0)
+            entry = (priority, next(self.seq))
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    need = 1 + self.reserve[priority]
+                    if self.waiters[0] == entry and now >= self.blocked_until and self.tokens >= need:
+                        heapq.heappop(self.waiters)
+                        self.tokens -= 1
+                        waited = now - start
+                        self.stats['granted'][priority] += 1
+                        self.stats['wait_seconds'][priority] += waited
+                        self.cond.notify_all()
+                        return waited
+                    if deadline is not None and now >= deadline:
+                        self.stats['shed'][priority] += 1
+                        raise RateLimitShed(LANES[priority], now - start)
+                    # 等到下一个令牌(或暂停结束)，排在前面的请求出队时会被提前唤醒
+                    wake = max(self.blocked_until - now, (need - self.tokens) / self.rate, 0.001)
+                    if deadline is not None:
+                        wake = min(wake, deadline - now)
+                    self.cond.wait(wake)
+            finally:
+                if entry in self.waiters:
+                    self.waiters.remove(entry)
+                    heapq.heapify(self.waiters)
+                    self.cond.notify_all()
+
+    def backoff(self, seconds):
+        """交易所返回 429 时暂停发放令牌并清空余量"""
+        with self.cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+            self.stats['backoff'] += 1
+
+    def queued(self):
+        """各通道排队中的请求数"""
+        with self.cond:
+            return {LANES[p]: sum(1 for w in self.waiters if w[0] == p) for p in range(4)}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def for_account(api_key, **kwargs):
+    """同一个账户(API Key)的所有客户端共用一个限频器，kwargs 只在第一次创建时生效"""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = _limiters[api_key] = RateLimiter(**kwargs)
+        return limiter
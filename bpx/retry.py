@@ -0,0 +1,202 @@
+import time
+import random
+import asyncio
+import threading
+
+import requests
+from loguru import logger
+
+from bpx.metrics import METRICS
+from bpx.ratelimit import RateLimitShed
+
+
+class TransientError(Exception):
+    """可以重试的临时错误: 交易所返回 5xx 或 429"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class CircuitOpen(Exception):
+    """熔断中，请求没有发送"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} 熔断中，{retry_in:.1f} 秒后恢复探测")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# 网络异常和临时错误重试，其他异常(BpxError 等业务错误)直接抛出
+RETRY_EXCEPTIONS = (requests.exceptions.RequestException, TransientError)
+
+_local = threading.local()
+
+
+def attempt_timeout(timeout):
+    """按当前调用剩余的截止时间收紧单次请求的超时，timeout 为数字或 (连接超时, 读超时)"""
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return timeout
+    left = max(deadline - time.monotonic(), 0.05)
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续 failure_threshold 次临时错误后打开，reset_timeout 秒内所有请求直接抛出 CircuitOpen，
+    不再等待超时；之后放行一个探测请求(半开)，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name='rest', failure_threshold=5, reset_timeout=10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+                self.probing = False
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            self.stats['rejected'] += 1
+            raise CircuitOpen(self.name, max(retry_in, 0.0))
+
+    def success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logger.info(f"{self.name} 探测成功，熔断恢复")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """请求没有发送(被限频丢弃等)，不计结果，让出探测名额"""
+        with self.lock:
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    logger.error(f"{self.name} 连续失败 {self.failures} 次，熔断 {self.reset_timeout} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+                self.stats['opened'] += 1
+
+
+class RetryPolicy:
+    """重试策略: 指数退避 + 随机抖动，总耗时不超过截止时间
+
+    第 n 次重试前等待 uniform(0, min(max_delay, base_delay * multiplier ** n)) 秒(full jitter)，
+    多个客户端同时遇到故障时不会同时重试；剩余时间不够再等一次时立即放弃，抛出最后一次的异常。
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.05, max_delay=2.0, multiplier=2.0, deadline=8.0,
+                 exceptions=RETRY_EXCEPTIONS):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline  # 默认截止时间(秒)，包括所有重试和等待
+        self.exceptions = exceptions
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** attempt))
+
+    def _failed(self, e, name, attempt, deadline, breaker):
+        """记录一次临时错误，返回重试前的等待秒数，不再重试时返回 None"""
+        if breaker:
+            # 429 是本账户超频，不代表交易所故障，由限频器退避
+            breaker.release() if getattr(e, 'status_code', None) == 429 else breaker.failure()
+        delay = self.backoff(attempt - 1)
+        if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+            logger.error(f"{name} 失败 {attempt} 次，放弃: {e}")
+            return None
+        METRICS.retry(name)
+        logger.warning(f"重试 {name} ({attempt}/{self.max_attempts - 1})，{delay:.3f} 秒后，原因: {e}")
+        return delay
+
+    @staticmethod
+    def _settled(e, breaker):
+        """非临时错误: 请求没有发送时不计结果，业务错误说明交易所可以正常响应"""
+        if breaker:
+            breaker.release() if isinstance(e, (CircuitOpen, RateLimitShed)) else breaker.success()
+
+    def call(self, func, name, deadline=None, breaker=None):
+        """执行 func()，临时错误时按策略重试
+
+        Args:
+            func (callable): 无参数函数
+            name (str): 用于日志和重试计数
+            deadline (float, optional): 本次调用的截止时间(秒)，默认 self.deadline
+            breaker (CircuitBreaker, optional): 熔断器，打开时直接抛出 CircuitOpen
+        """
+        deadline = time.monotonic() + (self.deadline if deadline is None else deadline)
+        outer = getattr(_local, 'deadline', None)
+        _local.deadline = deadline if outer is None else min(outer, deadline)  # 嵌套调用不超过外层的截止时间
+        try:
+            attempt = 0
+            while True:
+                if breaker:
+                    breaker.allow()
+                try:
+                    result = func()
+                except self.exceptions as e:
+                    attempt += 1
+                    delay = self._failed(e, name, attempt, _local.deadline, breaker)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    continue
+                except Exception as e:
+                    self._settled(e, breaker)
+                    raise
+                if breaker:
+                    breaker.success()
+                return result
+        finally:
+            _local.deadline = outer
+
+    async def call_async(self, func, name, deadline=None, breaker=None, exceptions=None):
+        """call 的协程版本，func 为无参数的协程函数，等待时不阻塞事件循环"""
+        exceptions = exceptions or self.exceptions
+        deadline = time.monotonic() + (self.deadline if deadline is None else deadline)
+        attempt = 0
+        while True:
+            if breaker:
+                breaker.allow()
+            try:
+                result = await func()
+            except exceptions as e:
+                attempt += 1
+                delay = self._failed(e, name, attempt, deadline, breaker)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                self._settled(e, breaker)
+                raise
+            if breaker:
+                breaker.success()
+            return result
@@ -0,0 +1,165 @@
+import time
+import base64
+from urllib.parse import quote_plus, urlencode
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.hazmat.primitives import serialization
+
+# 字符串 -> quote_plus 转义结果。参数名和 symbol、side 等取值反复出现，命中缓存时不分配内存
+_ENCODED = {}
+_MAX_ENCODED = 4096
+
+
+def _encode(value):
+    if value.__class__ is str:
+        encoded = _ENCODED.get(value)
+        if encoded is None:
+            encoded = quote_plus(value)
+            if len(_ENCODED) < _MAX_ENCODED:
+                _ENCODED[value] = encoded
+        return encoded
+    if isinstance(value, (int, float)):
+        return str(value)
+    return quote_plus(str(value))
+
+
+class Signer:
+    """REST 和 websocket 共用的 ed25519 签名器
+
+    - 私钥只在创建时加载一次
+    - 请求头使用预先构造好的模板，每次签名只复制一次并填入时间戳和签名
+    - 签名原文由缓存的 '&key=' 片段和转义结果一次 join 得到，不经过正则和中间字符串，
+      结果与 urlencode({'instruction':..., **sorted(params), 'timestamp':..., 'window':...}) 一致
+    - sign_batch 一次签名多个子指令(批量下单)
+    """
+
+    def __init__(self, api_secret, window=5000):
+        self.private_key = ed25519.Ed25519PrivateKey.from_private_bytes(base64.b64decode(api_secret))
+        self.verifying_key = self.private_key.public_key()
+        self.verifying_key_b64 = base64.b64encode(
+            self.verifying_key.public_bytes(
+                encoding=serialization.Encoding.Raw,
+                format=serialization.PublicFormat.Raw
+            )
+        ).decode()
+        self.window = str(window)
+        self._suffix = f'&window={self.window}'
+        self._prefixes = {}  # instruction -> 'instruction=xxx'
+        self._keys = {}  # 参数名 -> '&key='
+        self.header_template = {
+            'X-API-KEY': self.verifying_key_b64,
+            'X-TIMESTAMP': '',
+            'X-WINDOW': self.window,
+            'Content-Type': 'application/json',
+            'X-SIGNATURE': '',
+        }
+
+    def _prefix(self, instruction):
+        p = self._prefixes.get(instruction)
+        if p is None:
+            p = self._prefixes[instruction] = f'instruction={_encode(instruction)}'
+        return p
+
+    def _key(self, key):
+        k = self._keys.get(key)
+        if k is None:
+            k = self._keys[key] = f'&{_encode(key)}='
+        return k
+
+    def _parts(self, out, instruction, params):
+        """把一个指令的 instruction 和排序后的参数依次追加到 out"""
+        out.append(self._prefix(instruction))
+        if params:
+            for k in sorted(params):
+                out.append(self._key(k))
+                out.append(_encode(params[k]))
+
+    def _sign(self, out, timestamp):
+        out.append('&timestamp=')
+        out.append(timestamp)
+        out.append(self._suffix)
+        signature = base64.b64encode(self.private_key.sign(''.join(out).encode())).decode()
+        headers = self.header_template.copy()
+        headers['X-TIMESTAMP'] = timestamp
+        headers['X-SIGNATURE'] = signature
+        return headers
+
+    def sign(self, instruction: str, params: dict = None):
+        """签名单个指令，返回请求头"""
+        out = []
+        self._parts(out, instruction, params)
+        return self._sign(out, str(int(time.time() * 1000)))
+
+    def sign_batch(self, instruction: str, params_list: list):
+        """批量签名：每个子指令各自拼接 instruction 和排序后的参数，再统一追加 timestamp、window"""
+        out = []
+        for i, params in enumerate(params_list):
+            if i:
+                out.append('&')
+            self._parts(out, instruction, params)
+        return self._sign(out, str(int(time.time() * 1000)))
+
+    def ws_signature(self, instruction='subscribe'):
+        """websocket 订阅私有频道用的签名: [verifying_key, signature, timestamp, window]"""
+        headers = self.sign(instruction)
+        return [self.verifying_key_b64, headers['X-SIGNATURE'], headers['X-TIMESTAMP'], self.window]
+
+
+def _legacy_sign(private_key, verifying_key_b64, instruction, params=None):
+    """BpxClient.sign 原有的实现，仅用于基准对比"""
+    timestamp = str(int(time.time() * 1000))
+    window = '5000'
+    body = {
+        'instruction': instruction,
+        **dict(sorted((params or {}).items())),
+        'timestamp': timestamp,
+        'window': window,
+    }
+    message = urlencode(body)
+    signature = private_key.sign(message.encode())
+    signature_b64 = base64.b64encode(signature).decode()
+    return {
+        'X-API-KEY': verifying_key_b64,
+        'X-TIMESTAMP': timestamp,
+        'X-WINDOW': window,
+        'Content-Type': 'application/json',
+        'X-SIGNATURE': signature_b64
+    }
+
+
+def benchmark(n=20000):
+    """对比原实现与 Signer 的每秒签名数和每次调用的临时内存分配"""
+    import tracemalloc
+
+    secret = base64.b64encode(bytes(range(32))).decode()
+    signer = Signer(secret)
+    params = {'clientId': 1234567, 'symbol': 'SOL_USDC', 'side': 'Bid', 'orderType': 'Limit',
+              'timeInForce': 'GTC', 'quantity': 0.01, 'price': 130.25}
+    cases = {
+        'legacy': lambda: _legacy_sign(signer.private_key, signer.verifying_key_b64, 'orderExecute', params),
+        'signer': lambda: signer.sign('orderExecute', params),
+        'signer_batch_x2': lambda: signer.sign_batch('orderExecute', [params, params]),
+    }
+    results = {}
+    for name, fn in cases.items():
+        fn()
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        rate = n / (time.perf_counter() - start)
+
+        tracemalloc.start()
+        samples = 1000
+        blocks = 0
+        for _ in range(samples):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            blocks += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        results[name] = {'signatures_per_sec': rate, 'peak_bytes_per_call': blocks / samples}
+    return results
+
+
+if __name__ == '__main__':
+    for name, r in benchmark().items():
+        print(f"{name:>16}: {r['signatures_per_sec']:>10.0f} 次/秒, 每次调用临时分配 {r['peak_bytes_per_call']:.0f} 字节")
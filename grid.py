@@ -1,6 +1,12 @@
 from bpx.bpx import *
 from bpx.bpx_pub import *
+from bpx.cache import MARKET_DATA
+from bpx.bpx_ws import BpxStream
+from ledger import BalanceLedger
+from orders import OrderStore, TERMINAL_STATUSES, FILLED, CANCELLED, EXPIRED
+from reconciler import Reconciler
 from datetime import datetime
+import queue
 import random
 import string
 from loguru import logger
@@ -25,8 +31,16 @@ class SpotGrid:
 
         self.buy_order = None
         self.sell_order = None
+        self.stale_orders = {}  # 撤单失败、可能仍在交易所的挂单 id -> 订单，下次调整报价或对账时再撤销
+        self.use_stream = False  # 是否使用订单推送，见 start_grid
+        self.order_store = OrderStore()  # 本地订单簿(按 id/clientId 索引)，由下单结果、订单推送和历史订单更新
+        self.events = None
+        self.stream = None
         self.bpx = BpxClient()
         self.bpx.init(api_key, secret)
+        self.ledger = BalanceLedger(self.bpx)  # 本地余额账本，成交后直接记账，后台定期对账
+        self.ledger.start_auto_sync()
+        self.reconciler = Reconciler(self.cancel_order, self.place_orders, self.price_precision, self.quantity_precision)
 
     def get_client_id(self, size=6, chars=string.digits):
         """生成客户端订单号
@@ -42,16 +56,8 @@ class SpotGrid:
         return int(f"{self.strategy_prefix}{id}")
 
     def get_balance(self):
-        """获取交易对的余额"""
-
-        b = self.bpx.balances()
-        if b:
-            s = self.symbol.split("_")
-            b1 = float(b.get(s[0], {}).get("available", 0.0))
-            b2 = float(b.get(s[1], {}).get("available", 0.0))
-            return b1, b2
-        else:
-            return None, None
+        """获取交易对的余额(本地账本)"""
+        return self.ledger.get_pair(self.symbol)
         
     def get_bid_ask_price(self):
         """获取买卖价格"""
@@ -65,11 +71,12 @@ class SpotGrid:
         return float(f'{number:.{precision}f}')
     
     def getOrderInfo(self, orderId):
-        orders = self.bpx.getHistoryOrders(self.symbol)  # 获取历史订单
-        for o in orders:
-            if o.get("id") == orderId:
-                return o
-        return None
+        """查询订单信息，优先读本地订单簿，本地没有终结状态时才分页回补历史订单"""
+        o = self.order_store.get(orderId)
+        if o and o.get('status') in TERMINAL_STATUSES:
+            return o
+        self.order_store.backfill(self.bpx, self.symbol, stop_at=orderId)  # 获取历史订单
+        return self.order_store.get(orderId)
     
     def create_order(self, symbol, side, orderType, timeInForce, quantity, price):
         """创建订单
@@ -85,29 +92,110 @@ class SpotGrid:
         Returns:
             _type_: 返回订单信息
         """
-        b1, b2 = self.get_balance()
-        
+        if not self.check_order(symbol, side, quantity, price):
+            return None
+        order = self.bpx.ExeOrder(cid=self.get_client_id(), symbol=symbol, side=side, orderType=orderType, 
+                              timeInForce=timeInForce, quantity=quantity, price=price)
+        if order:
+            self.ledger.reserve(order)
+            self.order_store.track(order)
+        return order
+
+    def apply_fill(self, order):
+        """REST 查询到订单成交: 按成交数量和成交均价在本地账本中记账(扣减冻结、增加对手币种)，不再请求余额
+
+        手续费不在订单信息里，由后台定期对账修正
+        """
+        qty = float(order.get('executedQuantity') or order.get('quantity') or 0)
+        quote = float(order.get('executedQuoteQuantity') or 0)
+        price = quote / qty if qty and quote else float(order.get('price'))
+        self.ledger.fill(order.get('id'), order.get('symbol') or self.symbol, order.get('side'), qty, price)
+
+    def check_order(self, symbol, side, quantity, price):
+        """下单前检查价格区间和余额"""
         if price < self.min_price or price > self.max_price:
             logger.info(f"当前价格{price}不在网格下单范围内({self.min_price} ~ {self.max_price})，不下单")
-            return None
+            return False
         
-        if side == 'Ask' and b1 < quantity:
+        if side == 'Ask' and not self.ledger.has_funds(symbol, side, quantity, price):
             logger.error("卖单余额不足...")
-            return None
+            return False
         
-        if side == "Bid" and b2 < quantity * price:
+        if side == "Bid" and not self.ledger.has_funds(symbol, side, quantity, price):
             logger.error("买单余额不足...")
-            return None
-        return self.bpx.ExeOrder(cid=self.get_client_id(), symbol=symbol, side=side, orderType=orderType, 
-                              timeInForce=timeInForce, quantity=quantity, price=price)
+            return False
+        return True
+
+    def create_orders(self, orders):
+        """批量创建订单，一次签名请求(或并发)提交
+
+        Args:
+            orders (list): 订单参数列表，每个元素为 create_order 的参数字典
+
+        Returns:
+            list: 与 orders 对应的订单信息，未通过检查或提交失败的为 None
+        """
+        valid = [i for i, o in enumerate(orders) if self.check_order(o['symbol'], o['side'], o['quantity'], o['price'])]
+        results = [None] * len(orders)
+        submitted = self.bpx.ExeOrders([{**orders[i], 'cid': self.get_client_id()} for i in valid])
+        for i, r in zip(valid, submitted):
+            if isinstance(r, BpxError):
+                logger.error(f"订单提交失败: {r}")
+                continue
+            self.ledger.reserve(r)
+            self.order_store.track(r)
+            results[i] = r
+        return results
     
-    def start_grid(self):
-        """启动网格"""
+    def cancel_order(self, order):
+        """撤销一个挂单，成功后在本地账本中解冻"""
+        try:
+            r = self.bpx.cancelOrder(self.symbol, order.get("id"))
+        except (*RETRY_EXCEPTIONS, CircuitOpen) as e:
+            logger.error(f"撤单失败: {order.get('id')}, {e}")
+            return False
+        logger.info(f"取消{'买' if order.get('side') == 'Bid' else '卖'}单: {order.get('id')}, 结果: {r}")
+        if r:
+            self.ledger.release(order.get("id"))
+        return bool(r)
+
+    def place_orders(self, orders):
+        """差量调整时的下单，轮询模式下先等待撤单和成交后的余额变化生效"""
+        if not self.use_stream:
+            time.sleep(1)
+        return self.create_orders(orders)
+
+    def start_order_stream(self):
+        """订阅 account.orderUpdate 推送
+
+        推送线程只更新余额账本和订单状态机，订单终结(成交/取消/过期)时放入队列，由网格主线程处理
+        """
+        self.events = queue.Queue()
+        self.stream = BpxStream(self.bpx.signer, [f"account.orderUpdate.{self.symbol}"], self.on_order_update,
+                                on_reconnect=lambda: self.events.put(None))
+        self.stream.start()
+
+    def on_order_update(self, stream, data):
+        self.ledger.on_order_update(data)
+        order = self.order_store.apply_event(data)
+        if order and order.get('status') in TERMINAL_STATUSES:
+            self.events.put(order)
+
+    def start_grid(self, stream=False, reconcile_interval=30):
+        """启动网格
+
+        Args:
+            stream (bool, optional): 为 True 时订阅订单推送，成交后立即补单，REST 只用于定期对账. 默认 False，每5秒轮询.
+            reconcile_interval (int, optional): 推送模式下 REST 对账间隔(秒). 默认 30.
+        """
         quantity = self.round_to(float(self.quantity), self.quantity_precision)
         logger.info(f"订单下单量调整为{quantity}")
+        self.use_stream = stream
+        if stream:
+            self.start_order_stream()
         while True:
             try:
-                s = Status()  # 获取系统状态
+                s = MARKET_DATA.Status()  # 获取系统状态(缓存，多个网格共用一次请求)
                 # 如果返回不是Ok，说明系统维护中，等待10秒后再次请求
                 if s and s.get('status') != "Ok":
                     logger.info("系统维护中...")
@@ -144,107 +232,178 @@ class SpotGrid:
                         else:
                             logger.error("创建新卖单失败...")
                             continue
-                # 查看买单信息
-                check_buy_order = self.bpx.getOpenOrder(self.symbol, self.buy_order.get("id"))
-                if not check_buy_order:
-                    logger.error("买单已成交或者取消, 在历史订单中查找")
-                    check_buy_order = self.getOrderInfo(self.buy_order.get("id"))
-                
-                if check_buy_order:
-                    if check_buy_order.get('status') == 'Cancelled':  # 如果买单被取消了,将self.buy_order置为None,等待下一轮下单
-                        self.buy_order = None
-                        logger.info(f"买单 {buy_order.get('id')} 已取消，状态: {check_buy_order.get('status')}")
-                    elif check_buy_order.get('status') == 'Filled':  # 如果买单已成交,下卖单
-                        logger.info(f"买单成交时间: {datetime.now()}, 价格: {check_buy_order.get('price')}, 数量: {check_buy_order.get('quantity')}")
-                        self.buy_order = None
-                        
-                        # 取消原有的卖单
-                        r = self.bpx.cancelOrder(self.symbol, self.sell_order.get("id"))
-                        logger.info(f"取消卖单: {self.sell_order.get('id')}, 结果: {r}")
-                        self.sell_order
-                        time.sleep(1)
-                        
-                        # 重新下买单和卖单
-                        bid_price, ask_price = self.get_bid_ask_price()
-                        sell_price = self.round_to(float(check_buy_order.get("price")) * (1 + float(self.gap_percent)), self.price_precision)
-
-                        if 0 < sell_price < ask_price:
-                            sell_price = self.round_to(ask_price, self.price_precision)
-
-                        new_sell_order = self.create_order(symbol=self.symbol, side="Ask", orderType="Limit", 
-                                                                            timeInForce="GTC", quantity=quantity, price=sell_price)  # 下卖单
-                        if new_sell_order:
-                            self.sell_order = new_sell_order
-                            logger.info(f"创建新卖单: {self.sell_order}")
-                        
-                        buy_price = self.round_to(float(check_buy_order.get("price")) * (1 - float(self.gap_percent)),
-                                        self.price_precision)
-                        if buy_price > bid_price > 0:
-                            buy_price = self.round_to(bid_price, self.price_precision)
-
-                        new_buy_order = self.create_order(symbol=self.symbol, side="Bid", orderType="Limit", 
-                                                        timeInForce="GTC", quantity=quantity, price=buy_price)  # 下买单
-                        if new_buy_order:
-                            self.buy_order = new_buy_order
-                            logger.info(f"创建新买单: {self.buy_order}")
-                else:
-                    logger.error("买单查询失败")
-                    # 抛出错误，等待5秒
-                    
-                            
-                # 查看卖单信息
-                check_sell_order = self.bpx.getOpenOrder(self.symbol, self.sell_order.get("id"))
-                if not check_sell_order:
-                    logger.error("卖单已成交或者取消, 在历史订单中查找")
-                    check_sell_order = self.getOrderInfo(self.sell_order.get("id"))
-                if check_sell_order:
-                    if check_sell_order.get('status') == 'Cancelled':
-                        self.sell_order = None
-                        logger.info(f"卖单 {sell_order.get('id')} 已取消，状态: {check_sell_order.get('status')}")
-                    elif check_sell_order.get('status') == "Filled":
-                        logger.info(f"卖单成交时间: {datetime.now()}, 价格: {check_sell_order.get('price')}, 数量: {check_sell_order.get('quantity')}")
-                        self.sell_order = None
-
-                        # 取消买单
-                        r = self.bpx.cancelOrder(self.symbol, self.buy_order.get("id"))
-                        logger.info(f"开始取消买单，取消结果 {r}")
-                        self.buy_order = None
-                        time.sleep(1)
-
-                        bid_price, ask_price = self.get_bid_ask_price()
-
-                        # 卖单成交，先下买单.
-                        buy_price = self.round_to(float(check_sell_order.get("price")) * (1 - float(self.gap_percent)), self.price_precision)
-                        if buy_price > bid_price > 0:
-                            buy_price = self.round_to(bid_price, self.price_precision)
-
-                        new_buy_order = self.create_order(symbol=self.symbol, side="Bid", orderType="Limit", 
-                                                        timeInForce="GTC", quantity=quantity, price=buy_price)  # 下买单
-                        
-                        if new_buy_order:
-                            self.buy_order = new_buy_order
-                            logger.info(f"创建新买单: {self.buy_order}")
-
-                        sell_price = self.round_to(float(check_sell_order.get("price")) * (1 + float(self.gap_percent)), self.price_precision)
-
-                        if 0 < sell_price < ask_price:
-                            sell_price = self.round_to(ask_price, self.price_precision)
-
-                        new_sell_order = self.create_order(symbol=self.symbol, side="Ask", orderType="Limit", 
-                                                                            timeInForce="GTC", quantity=quantity, price=sell_price)  # 下卖单
-                        if new_sell_order:
-                            self.sell_order = new_sell_order
-                            logger.info(f"创建新卖单: {self.sell_order}")
-                else:
-                    logger.error("卖单查询失败")
-                    # 抛出错误，等待5秒
-                    
-                time.sleep(5)
+                if stream:
+                    # 处理订单推送，直到需要 REST 对账
+                    self.process_order_events(quantity, reconcile_interval)
+                self.reconcile_orders(quantity)
+                if not stream:
+                    time.sleep(5)
             
 
             except Exception as ex:
                 logger.error(f"异常了 {ex}")
                 time.sleep(5)
+
+    def process_order_events(self, quantity, timeout):
+        """等待订单推送并立即处理，超时、推送重连或有一边没有挂单时返回"""
+        deadline = time.time() + timeout
+        while self.buy_order and self.sell_order:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                order = self.events.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if order is None:
+                logger.warning("订单推送已重连，使用 REST 对账")
+                return
+            self.handle_order_update(order, quantity)
+
+    def handle_order_update(self, order, quantity):
+        """处理一个已终结的订单(来自推送或 REST 查询)"""
+        status = order.get('status')
+        if self.buy_order and order.get('id') == self.buy_order.get("id"):
+            if status in (CANCELLED, EXPIRED):  # 如果买单被取消了,将self.buy_order置为None,等待下一轮下单
+                self.ledger.release(self.buy_order.get("id"))
+                logger.info(f"买单 {self.buy_order.get('id')} 已取消，状态: {status}")
+                self.buy_order = None
+            elif status == FILLED:  # 如果买单已成交,下卖单
+                self.on_buy_filled(order, quantity)
+        elif self.sell_order and order.get('id') == self.sell_order.get("id"):
+            if status in (CANCELLED, EXPIRED):
+                self.ledger.release(self.sell_order.get("id"))
+                logger.info(f"卖单 {self.sell_order.get('id')} 已取消，状态: {status}")
+                self.sell_order = None
+            elif status == FILLED:
+                self.on_sell_filled(order, quantity)
+        elif order.get('id') in self.stale_orders:
+            self.stale_orders.pop(order.get('id'))
+            if status in (CANCELLED, EXPIRED):
+                self.ledger.release(order.get('id'))
+            else:
+                self.ledger.forget(order.get('id'))
+            logger.info(f"撤单失败的挂单 {order.get('id')} 已终结，状态: {status}")
+
+    def reconcile_orders(self, quantity):
+        """通过 REST 查询买卖单状态"""
+        self.retry_stale()
+        # 查看买单信息
+        if self.buy_order:
+            check_buy_order = self.bpx.getOpenOrder(self.symbol, self.buy_order.get("id"))
+            self.order_store.track(check_buy_order)
+            if not check_buy_order:
+                logger.error("买单已成交或者取消, 在历史订单中查找")
+                check_buy_order = self.getOrderInfo(self.buy_order.get("id"))
+            
+            if check_buy_order:
+                self.handle_order_update(check_buy_order, quantity)
+            else:
+                logger.error("买单查询失败")
+                # 抛出错误，等待5秒
+                    
+        # 查看卖单信息
+        if self.sell_order:
+            check_sell_order = self.bpx.getOpenOrder(self.symbol, self.sell_order.get("id"))
+            self.order_store.track(check_sell_order)
+            if not check_sell_order:
+                logger.error("卖单已成交或者取消, 在历史订单中查找")
+                check_sell_order = self.getOrderInfo(self.sell_order.get("id"))
+            if check_sell_order:
+                self.handle_order_update(check_sell_order, quantity)
+            else:
+                logger.error("卖单查询失败")
+                # 抛出错误，等待5秒
+
+    def live_orders(self, order):
+        """参与差量调整的挂单: 另一边的挂单和上次撤单失败的挂单(与新报价一致时保留，否则再撤一次)"""
+        return ([order] if order else []) + list(self.stale_orders.values())
+
+    def keep_stale(self, failed):
+        """撤单失败的挂单可能仍在交易所或已经部分成交，记下来等终结或下次调整时再撤"""
+        self.stale_orders = {o.get('id'): o for o in failed}
+        if failed:
+            logger.warning(f"撤单失败的挂单: {list(self.stale_orders)}")
+
+    def retry_stale(self):
+        """对账时处理撤单失败的挂单: 仍在挂单中的再撤一次，已经不在的查询最终状态"""
+        for order_id, order in list(self.stale_orders.items()):
+            if self.bpx.getOpenOrder(self.symbol, order_id):
+                if self.cancel_order(order):
+                    self.stale_orders.pop(order_id, None)
+                continue
+            final = self.getOrderInfo(order_id)
+            if final:
+                self.handle_order_update(final, None)
+
+    def on_buy_filled(self, check_buy_order, quantity):
+        """买单成交: 围绕成交价重新报价，卖单价格变化时才撤销重下"""
+        logger.info(f"买单成交时间: {datetime.now()}, 价格: {check_buy_order.get('price')}, 数量: {check_buy_order.get('quantity')}")
+        if self.use_stream:
+            self.ledger.forget(self.buy_order.get("id"))  # 成交已经由 orderFill 推送记账
+        else:
+            self.apply_fill(check_buy_order)
+        self.buy_order = None
+        
+        # 重新下买单和卖单
+        bid_price, ask_price = self.get_bid_ask_price()
+        sell_price = self.round_to(float(check_buy_order.get("price")) * (1 + float(self.gap_percent)), self.price_precision)
+
+        if 0 < sell_price < ask_price:
+            sell_price = self.round_to(ask_price, self.price_precision)
+
+        buy_price = self.round_to(float(check_buy_order.get("price")) * (1 - float(self.gap_percent)),
+                        self.price_precision)
+        if buy_price > bid_price > 0:
+            buy_price = self.round_to(bid_price, self.price_precision)
+
+        # 差量调整: 原卖单价格不变时保留，否则撤销，新报价一起提交
+        (new_sell_order, new_buy_order), failed = self.reconciler.apply([
+            dict(symbol=self.symbol, side="Ask", orderType="Limit", timeInForce="GTC", quantity=quantity, price=sell_price),
+            dict(symbol=self.symbol, side="Bid", orderType="Limit", timeInForce="GTC", quantity=quantity, price=buy_price),
+        ], self.live_orders(self.sell_order))
+        self.keep_stale(failed)
+        if new_sell_order is not self.sell_order:
+            self.sell_order = new_sell_order
+            logger.info(f"创建新卖单: {self.sell_order}")
+        if new_buy_order:
+            self.buy_order = new_buy_order
+            logger.info(f"创建新买单: {self.buy_order}")
+
+    def on_sell_filled(self, check_sell_order, quantity):
+        """卖单成交: 围绕成交价重新报价，买单价格变化时才撤销重下"""
+        logger.info(f"卖单成交时间: {datetime.now()}, 价格: {check_sell_order.get('price')}, 数量: {check_sell_order.get('quantity')}")
+        if self.use_stream:
+            self.ledger.forget(self.sell_order.get("id"))  # 成交已经由 orderFill 推送记账
+        else:
+            self.apply_fill(check_sell_order)
+        self.sell_order = None
+
+        bid_price, ask_price = self.get_bid_ask_price()
+
+        # 卖单成交，先下买单.
+        buy_price = self.round_to(float(check_sell_order.get("price")) * (1 - float(self.gap_percent)), self.price_precision)
+        if buy_price > bid_price > 0:
+            buy_price = self.round_to(bid_price, self.price_precision)
+
+        sell_price = self.round_to(float(check_sell_order.get("price")) * (1 + float(self.gap_percent)), self.price_precision)
+
+        if 0 < sell_price < ask_price:
+            sell_price = self.round_to(ask_price, self.price_precision)
+
+        # 差量调整: 原买单价格不变时保留，否则撤销，新报价一起提交
+        (new_buy_order, new_sell_order), failed = self.reconciler.apply([
+            dict(symbol=self.symbol, side="Bid", orderType="Limit", timeInForce="GTC", quantity=quantity, price=buy_price),
+            dict(symbol=self.symbol, side="Ask", orderType="Limit", timeInForce="GTC", quantity=quantity, price=sell_price),
+        ], self.live_orders(self.buy_order))
+        self.keep_stale(failed)
+        if new_buy_order is not self.buy_order:
+            self.buy_order = new_buy_order
+            logger.info(f"创建新买单: {self.buy_order}")
+
+        if new_sell_order:
+            self.sell_order = new_sell_order
+            logger.info(f"创建新卖单: {self.sell_order}")
                 
     def test_order(self):
         """启动网格"""
@@ -252,7 +411,7 @@ class SpotGrid:
         logger.info(f"订单下单量调整为{quantity}")
         while True:
             try:
-                s = Status()  # 获取系统状态
+                s = MARKET_DATA.Status()  # 获取系统状态(缓存，多个网格共用一次请求)
                 # 如果返回不是Ok，说明系统维护中，等待10秒后再次请求
                 if s and s.get('status') != "Ok":
                     logger.info("系统维护中...")
@@ -345,6 +504,7 @@ class SpotGrid:
 if __name__ == "__main__":
     grid = SpotGrid()
     # grid.start_grid()
+    # grid.start_grid(stream=True)  # 订单推送模式
     # grid.test_order()
     grid.test_order2()
     
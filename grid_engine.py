@@ -0,0 +1,158 @@
+import time
+import threading
+from functools import partial
+from loguru import logger
+
+from bpx.bpx import BpxClient
+from bpx.bpx_ws import BpxStream
+from ledger import BalanceLedger
+from grid_wss import SpotGrid
+
+
+class GridEngine:
+    """在一个进程里托管多个网格
+
+    所有网格共用一个 REST 连接池、一个余额账本和一条已认证的 websocket 连接:
+    - 每个交易对只订阅一次 depth.<symbol> 和 account.orderUpdate.<symbol>
+    - 深度推送转发给该交易对的所有网格
+    - 订单推送按 clientId 前缀(strategy_prefix)转发给对应网格，不属于任何网格的只更新余额账本
+    - 流水线模式(默认)下读取线程只把推送放进各网格的行情/订单阶段，下单撤单不阻塞共用的读取线程
+    """
+
+    def __init__(self, api_key, secret, pool_size=None, url=None, stream_url=None, rate_limit=None):
+        self.bpx = BpxClient()
+        self.bpx.init(api_key, secret, pool_size=pool_size, url=url, rate_limit=rate_limit)
+        self.ledger = BalanceLedger(self.bpx)
+        self.grids = []
+        self.prefixes = {}  # strategy_prefix -> 网格
+        self.lock = threading.Lock()  # 两个流水线阶段可能同时出错停止同一个网格
+        self.stream = None
+        self.stream_url = stream_url
+
+    def add_grid(self, symbol, max_price, min_price, gap_percent, price_precision, quantity, quantity_precision,
+                 strategy_prefix, depth_limit=None, recorder=None, levels=1, pipeline=True):
+        """添加一个网格，参数与 grid_wss.SpotGrid 相同"""
+        strategy_prefix = str(strategy_prefix)
+        if strategy_prefix in self.prefixes:
+            raise Exception(f"策略编号 {strategy_prefix} 重复")
+        grid = SpotGrid(self.bpx.api_key, self.bpx.api_secret, symbol, max_price, min_price, gap_percent,
+                        price_precision, quantity, quantity_precision, strategy_prefix, depth_limit=depth_limit,
+                        bpx=self.bpx, ledger=self.ledger, connect=False, recorder=recorder,
+                        levels=levels, pipeline=pipeline)
+        # 流水线阶段出错与 run_grid 出错相同: 撤销该网格订单并停止该网格
+        grid.market_stage.on_error = grid.order_stage.on_error = lambda stage, e: self.drop_grid(grid, e)
+        self.grids.append(grid)
+        self.prefixes[strategy_prefix] = grid
+        for g in self.grids:
+            g.exclusive_symbol = sum(1 for other in self.grids if other.symbol == g.symbol) == 1
+        return grid
+
+    def symbols(self):
+        return sorted({g.symbol for g in self.grids})
+
+    def start(self):
+        self.ledger.sync()
+        self.ledger.start_auto_sync()
+        streams = []
+        for grid in self.grids:
+            streams += [s for s in grid.streams() if s not in streams]
+        self.stream = BpxStream(self.bpx.signer, streams, self.on_event, on_reconnect=self.on_reconnect,
+                                stream_url=self.stream_url)
+        self.stream.start()
+        self.stream.connected.wait()
+        for grid in list(self.grids):
+            self.run_grid(grid, self.start_grid)
+
+    def start_grid(self, grid):
+        self.reload_depth(grid)
+        grid.place_fist_order()
+        # 首次报价完成后再开始处理推送，期间收到的推送在队列中等待(与 SpotGrid.on_open 在读取推送之前执行相同)
+        if grid.pipeline:
+            grid.market_stage.start()
+            grid.order_stage.start()
+
+    def reload_depth(self, grid):
+        grid.bid_price, grid.ask_price = grid.get_bid_ask_price()
+
+    def on_reconnect(self):
+        # 重连期间可能漏掉了深度推送和订单推送，重新加载快照并按 clientId 对账，挂单保留
+        # 流水线模式下分别排在行情阶段和订单阶段中，排在断线前已经收到的推送之后
+        for grid in list(self.grids):
+            if grid.pipeline:
+                grid.market_stage.put(partial(self.reload_depth, grid))
+                grid.order_stage.put(grid.reconcile_orders)
+            else:
+                self.run_grid(grid, self.reload_depth)
+                self.run_grid(grid, SpotGrid.reconcile_orders)
+
+    def run_grid(self, grid, func, *args):
+        """在网格上执行操作，出错时按 SpotGrid.on_error 的方式撤销该网格的订单并停止该网格"""
+        try:
+            return func(grid, *args)
+        except Exception as e:
+            self.drop_grid(grid, e)
+
+    def drop_grid(self, grid, error):
+        """撤销网格的订单并停止该网格(停止后入队的推送直接丢弃)"""
+        with self.lock:
+            if grid not in self.grids:
+                return
+            self.grids.remove(grid)
+            self.prefixes.pop(str(grid.strategy_prefix), None)
+        logger.error(f"网格 {grid.strategy_prefix}({grid.symbol}) 异常: {error}, 撤销该网格订单并停止")
+        grid.market_stage.stop()
+        grid.order_stage.stop()
+        try:
+            grid.release_cancelled(grid.cancel_grid_orders())
+        except Exception as ex:
+            logger.error(f"撤销网格 {grid.strategy_prefix} 订单失败: {ex}")
+
+    def route(self, data):
+        """按 clientId 前缀找到订单所属的网格"""
+        client_id = data.get('c')
+        if client_id is None:
+            return None
+        grid = self.prefixes.get(str(client_id)[:-6])
+        if grid and grid.symbol == data.get('s'):
+            return grid
+        return None
+
+    def on_event(self, stream, data):
+        if data.get('e') in ('depth', 'trade'):
+            symbol = data.get('s') or stream.split('.', 1)[1]
+            for grid in list(self.grids):
+                if grid.symbol == symbol:
+                    self.deliver(grid, data)
+            return
+        grid = self.route(data)
+        if grid:
+            self.deliver(grid, data)
+        else:
+            self.ledger.on_order_update(data)
+
+    def deliver(self, grid, data):
+        """推送交给网格: 流水线模式下入队，否则在读取线程中直接处理"""
+        if grid.pipeline:
+            grid.dispatch(data)
+        else:
+            self.run_grid(grid, SpotGrid.handle_event, data)
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+        # 处理完已入队的推送后停止
+        for grid in list(self.grids):
+            grid.market_stage.stop()
+            grid.order_stage.stop()
+
+
+if __name__ == "__main__":
+    engine = GridEngine(api_key="", secret="")
+    engine.add_grid(symbol="SOL_USDC", max_price=130, min_price=120, gap_percent=0.0005, price_precision=2,
+                    quantity=0.01, quantity_precision=2, strategy_prefix="1")
+    engine.add_grid(symbol="SOL_USDC", max_price=140, min_price=130, gap_percent=0.001, price_precision=2,
+                    quantity=0.01, quantity_precision=2, strategy_prefix="2")
+    engine.start()
+
+    while True:
+        time.sleep(1)
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import numpy as np
+from loguru import logger
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from bpx import bpx_pub, ratelimit
+from grid_wss import SpotGrid
+from mock_exchange import MockExchange
+
+# 各阶段的起止打点
+STAGES = (
+    ('fill_to_event', 'fill', 'recv'),  # 交易所撮合 -> 收到 orderFill 推送
+    ('event_to_handler', 'recv', 'handler'),  # 收到推送 -> 进入 handle_order_fill(解码、排队、账本、订单簿)
+    ('handler_to_cancel', 'handler', 'cancel_sent'),  # 进入 handle_order_fill -> 发出撤单(差量调整不需要撤单时没有这几个阶段)
+    ('cancel_ack', 'cancel_sent', 'cancel_done'),  # 发出撤单 -> 撤单返回
+    ('cancel_to_place', 'cancel_done', 'place_sent'),  # 撤单返回 -> 发出新挂单
+    ('handler_to_place', 'handler', 'place_sent'),  # 进入 handle_order_fill -> 发出新挂单
+    ('place_ack', 'place_sent', 'place_done'),  # 发出新挂单 -> 新买单/卖单确认
+    ('tick_to_trade', 'recv', 'place_done'),  # 收到推送 -> 新买单/卖单确认
+    ('fill_to_requote', 'fill', 'place_done'),  # 撮合 -> 新买单/卖单确认
+)
+
+
+def _percentiles(samples_us):
+    a = np.asarray(samples_us, dtype=np.float64)
+    if not len(a):
+        return {'count': 0}
+    p50, p99, p999 = np.percentile(a, [50, 99, 99.9])
+    return {'count': int(len(a)), 'mean_us': round(float(a.mean()), 1), 'p50_us': round(float(p50), 1),
+            'p99_us': round(float(p99), 1), 'p999_us': round(float(p999), 1), 'max_us': round(float(a.max()), 1)}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class FillBenchmark:
+    """成交 -> 重新挂单 的端到端延迟基准测试
+
+    在本地模拟交易所上运行 grid_wss.SpotGrid，由内置账户逐个吃掉网格的买单或卖单，
+    在 SpotGrid 实例上给各处理函数打点(不修改网格代码)，统计每个阶段的 p50/p99/p999。
+    所有打点都用同一进程内的 perf_counter_ns，撮合在同一进程内完成，因此各阶段可以直接相减。
+    """
+
+    def __init__(self, fills=2000, warmup=100, symbol='SOL_USDC', mid=130.0, gap_percent=0.001,
+                 quantity=0.1, latency=0.0, jitter=0.0, ws_latency=0.0, timeout=5.0, seed=1, rate_limit=None,
+                 pipeline=True, depth_gap_every=0, disconnect_every=0):
+        self.fills = fills
+        self.warmup = warmup
+        self.symbol = symbol
+        self.mid = mid
+        self.gap_percent = gap_percent
+        self.quantity = quantity
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.pipeline = pipeline
+        self.depth_gap_every = depth_gap_every  # 每隔多少次成交制造一次深度增量缺口，0 表示不制造
+        self.disconnect_every = disconnect_every  # 每隔多少次成交断开一次 websocket，0 表示不断开
+        self.reconnect_seconds = []
+        self.reconciled = threading.Event()  # 重连后的对账已完成
+        self.random = random.Random(seed)
+        self.config = {k: v for k, v in locals().items() if k != 'self'}
+        self.exchange = MockExchange(latency=latency, jitter=jitter, ws_latency=ws_latency)
+        self.grid = None
+        self.samples = []
+        self.sample = None  # 正在处理的成交的打点
+        self.pending_fill = None  # 已撮合、还没收到推送的成交时间
+        self.done = threading.Event()
+        self.timeouts = 0
+
+    # 打点
+    def mark(self, name):
+        if self.sample is not None and name not in self.sample:
+            self.sample[name] = time.perf_counter_ns()
+
+    def _stamp(self, name, before, after):
+        func = getattr(self.grid, name)
+
+        def wrapper(*args, **kwargs):
+            self.mark(before)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.mark(after)
+        setattr(self.grid, name, wrapper)
+
+    def instrument(self):
+        grid = self.grid
+        on_message, handle_order_fill = grid.on_message, grid.handle_order_fill
+
+        def timed_on_message(ws, message):
+            # 在读取线程打点，之后的排队(流水线订单阶段)计入 event_to_handler
+            recv = time.perf_counter_ns()
+            if self.pending_fill is not None and b'"orderFill"' in message:
+                self.sample = {'fill': self.pending_fill, 'recv': recv}
+                self.pending_fill = None
+            return on_message(ws, message)
+
+        def timed_handle_order_fill(order):
+            self.mark('handler')
+            try:
+                return handle_order_fill(order)
+            finally:
+                if self.sample is not None:
+                    self.samples.append(self.sample)
+                    self.sample = None
+                    self.done.set()
+
+        grid.on_message = timed_on_message
+        grid.handle_order_fill = timed_handle_order_fill
+        reconcile_orders = grid.reconcile_orders
+
+        def timed_reconcile_orders():
+            try:
+                return reconcile_orders()
+            finally:
+                self.reconciled.set()
+
+        grid.reconcile_orders = timed_reconcile_orders
+        self._stamp('cancel_order', 'cancel_sent', 'cancel_done')
+        self._stamp('create_orders', 'place_sent', 'place_done')
+        # 差量调整器在网格创建时保存了撤单和下单方法，换成打点后的版本
+        grid.reconciler.cancel, grid.reconciler.place = grid.cancel_order, grid.create_orders
+
+    def setup(self):
+        self.exchange.start()
+        # 做市单铺在网格挂单前面，网格挂单不会被价格优先的吃单扫到，由 fill_order 精确成交
+        self.exchange.seed_book(self.symbol, self.mid, levels=50, tick=0.01, qty=1000)
+        bpx_pub.set_base_url(self.exchange.url)
+        key = ed25519.Ed25519PrivateKey.generate()
+        secret = base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                                    serialization.NoEncryption())).decode()
+        # 客户端限频器按账户共用，先按测试参数创建，默认不限频
+        rate = self.rate_limit or 1e9
+        self.account = self.exchange.account_key(secret)
+        ratelimit.for_account(self.account, rate=rate, burst=max(rate * 2, 1))
+        self.exchange.set_balance(self.exchange.account_key(secret), self.symbol.split('_')[0], 1e9)
+        self.exchange.set_balance(self.exchange.account_key(secret), self.symbol.split('_')[1], 1e12)
+        self.grid = SpotGrid('', secret, self.symbol, self.mid * 2, self.mid / 2, self.gap_percent, 2,
+                             self.quantity, 2, '9', url=self.exchange.url, stream_url=self.exchange.stream_url,
+                             connect=False, pipeline=self.pipeline)
+        self.grid.reconnect_backoff = 0.01  # 模拟断线后立即重连
+        self.instrument()
+        threading.Thread(target=self.grid.create_ws_connection, daemon=True).start()
+        deadline = time.time() + self.timeout
+        while not (self.grid.buy_order and self.grid.sell_order):
+            if time.time() > deadline:
+                raise Exception("网格初始挂单超时")
+            time.sleep(0.01)
+
+    def run(self):
+        self.setup()
+        total = self.warmup + self.fills
+        start = time.perf_counter()
+        for i in range(total):
+            if i == self.warmup:
+                self.samples = []
+                start = time.perf_counter()
+            if self.depth_gap_every and i % self.depth_gap_every == self.depth_gap_every - 1:
+                self.exchange.inject_depth_gap(self.symbol)
+            if self.disconnect_every and i % self.disconnect_every == self.disconnect_every - 1:
+                self.reconnect()
+            order = self.grid.buy_order if self.random.random() < 0.5 else self.grid.sell_order
+            self.done.clear()
+            self.pending_fill = time.perf_counter_ns()
+            self.exchange.fill_order(order['id'])
+            if not self.done.wait(self.timeout):
+                self.timeouts += 1
+                self.pending_fill = None
+                logger.warning(f"第 {i} 次成交等待重新挂单超时")
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def reconnect(self):
+        """断开 websocket，等待网格重连、对账完成"""
+        grid, exchange = self.grid, self.exchange
+        start = time.perf_counter()
+        self.reconciled.clear()
+        exchange.drop_connections()
+        stream = f'account.orderUpdate.{self.symbol}'
+        deadline = time.time() + self.timeout
+        # 交易所处理完订阅之前的成交推送会丢失(对账只覆盖重连之前)，等订阅生效后再继续成交
+        while not (self.reconciled.is_set() and grid.connected.is_set()
+                   and any(c.wants(stream, self.account) for c in list(exchange.ws_clients))):
+            if time.time() > deadline:
+                raise Exception("网格重连超时")
+            time.sleep(0.001)
+        self.reconnect_seconds.append(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        stages = {}
+        for name, begin, end in STAGES:
+            stages[name] = _percentiles([(s[end] - s[begin]) / 1000 for s in self.samples if begin in s and end in s])
+        return {
+            'benchmark': 'grid_wss.fill_to_requote',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': self.config,
+            'fills': len(self.samples),
+            'timeouts': self.timeouts,
+            'elapsed_s': round(elapsed, 3),
+            'fills_per_s': round(len(self.samples) / elapsed, 1) if elapsed else None,
+            'rest_requests': self.exchange.stats['requests'],
+            'http_connections': self.grid.bpx.connection_stats(),
+            'reconciler': dict(self.grid.reconciler.stats),
+            'rate_limiter': self.grid.bpx.limiter.stats if self.grid.bpx.limiter else None,
+            'pipeline': self.grid.pipeline_stats() if self.pipeline else None,
+            'depth': dict(self.grid.depth.stats),
+            'reconnects': self.grid.reconnects,
+            'reconnect': _percentiles([s * 1e6 for s in self.reconnect_seconds]),  # 断开 -> 重连、对账完成
+            'stages': stages,
+        }
+
+    def stop(self):
+        self.exchange.stop()
+
+
+def print_report(result):
+    print(f"{result['fills']} 次成交, 超时 {result['timeouts']}, {result['fills_per_s']} 次/秒")
+    print(f"{'stage':<20}{'p50(us)':>12}{'p99(us)':>12}{'p999(us)':>12}{'max(us)':>12}")
+    for name, s in result['stages'].items():
+        if s['count']:
+            print(f"{name:<20}{s['p50_us']:>12}{s['p99_us']:>12}{s['p999_us']:>12}{s['max_us']:>12}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='grid_wss 成交 -> 重新挂单 延迟基准测试(本地模拟交易所)')
+    parser.add_argument('--fills', type=int, default=2000, help='统计的成交次数')
+    parser.add_argument('--warmup', type=int, default=100, help='预热的成交次数(不统计)')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟交易所 REST 固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='模拟交易所 REST 随机延迟上限(秒)')
+    parser.add_argument('--ws-latency', type=float, default=0.0, help='模拟交易所推送延迟(秒)')
+    parser.add_argument('--rate-limit', type=float, default=None, help='客户端限频(每秒请求数)，默认不限频')
+    parser.add_argument('--depth-gap-every', type=int, default=0, help='每隔多少次成交制造一次深度增量缺口(测试恢复)')
+    parser.add_argument('--disconnect-every', type=int, default=0, help='每隔多少次成交断开一次 websocket(测试重连)')
+    parser.add_argument('--no-pipeline', action='store_true', help='在读取线程中依次处理推送(不使用流水线)')
+    parser.add_argument('--output', default='grid_bench.json', help='结果文件(JSON)')
+    parser.add_argument('--log-level', default='WARNING', help='网格日志级别，逐笔日志会计入延迟')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    bench = FillBenchmark(fills=args.fills, warmup=args.warmup, latency=args.latency, jitter=args.jitter,
+                          ws_latency=args.ws_latency, rate_limit=args.rate_limit, pipeline=not args.no_pipeline,
+                          depth_gap_every=args.depth_gap_every, disconnect_every=args.disconnect_every)
+    try:
+        result = bench.run()
+    finally:
+        bench.stop()
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print_report(result)
+    print(f"结果已写入 {args.output}")
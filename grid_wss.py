@@ -4,26 +4,57 @@ import threading
 import random
 import string
 import logging
-import base64
 from websocket import (
     ABNF,
     create_connection,
     WebSocketException,
     WebSocketConnectionClosedException
 )
-from nacl.signing import SigningKey
-from nacl.encoding import Base64Encoder
 from loguru import logger
 
 from bpx.bpx import *
 from bpx.bpx_pub import *
+from bpx.cache import MARKET_DATA
+from bpx import events
+from orderbook import OrderBook
+from ledger import BalanceLedger
+from orders import OrderStore, TERMINAL_STATUSES
+from ladder import Ladder
+from reconciler import Reconciler
+from pipeline import Stage
 from datetime import datetime
 import random
 import string
 
 class SpotGrid(threading.Thread):
-    def __init__(self, api_key, secret, symbol, max_price, min_price, gap_percent, price_precision, quantity, quantity_precision, strategy_prefix):
-        threading.Thread.__init__(self)
+    reconnect_backoff = 1  # 断线后第一次重连前等待的秒数，之后每次翻倍
+    max_reconnect_backoff = 30
+
+    def __init__(self, api_key, secret, symbol, max_price, min_price, gap_percent, price_precision, quantity, quantity_precision, strategy_prefix, depth_limit=None,
+                 bpx=None, ledger=None, connect=True, recorder=None, url=None, stream_url=None, levels=1,
+                 pipeline=True, market_queue=10000, order_queue=1000):
+        """
+        Args:
+            bpx (BpxClient, optional): 共用的 REST 客户端，为空时自己创建
+            ledger (BalanceLedger, optional): 共用的余额账本，为空时自己创建
+            connect (bool, optional): 是否自己建立 websocket 连接，由 GridEngine 托管时为 False
+            recorder (MarketRecorder, optional): 行情记录器，不为空时记录深度增量、深度快照和逐笔成交
+            url (str, optional): REST 根地址，自己创建 BpxClient 时使用，默认正式环境
+            stream_url (str, optional): websocket 地址，默认正式环境
+            levels (int, optional): 每边挂单数。1 为原来的单买单/单卖单模式；大于 1 时为多档模式，
+                在 min_price ~ max_price 的等比档位上两边各挂 levels 个单，成交后挂单窗口移动一档
+            pipeline (bool, optional): 是否按流水线处理推送，False 时在读取线程中依次处理(原来的方式)
+            market_queue (int, optional): 行情阶段(深度、逐笔成交)的队列长度
+            order_queue (int, optional): 订单阶段(订单推送、撤单、下单)的队列长度
+
+        自己建立 websocket 连接时按流水线处理推送: 读取线程只接收和解码，深度和逐笔成交交给行情阶段更新本地深度簿，
+        订单推送交给订单阶段更新账本并撤单/下单，下单等待 REST 返回时不会阻塞读取，本地深度簿保持最新。
+        队列满时读取线程等待(背压)，不丢弃推送；队列深度和排队延迟见 pipeline_stats()。
+
+        连接断开或出错时按退避时间自动重连，重新认证订阅后用 REST 对账(reconcile_orders)，挂单保留在交易所；
+        只有处理推送出错(余额不足等)时才撤销挂单并停止。
+        """
+        threading.Thread.__init__(self, name=f"grid-{strategy_prefix}-reader")
         self.api_key = api_key
         self.secret = secret
         self.symbol = symbol
@@ -39,12 +70,43 @@ class SpotGrid(threading.Thread):
         self.bid_price = None
         self.ask_price = None
         self.grid_size = (self.max_price - self.min_price) * self.gap_percent  # 定义 grid_size
-        self.stream_url = "wss://ws.backpack.exchange/"
+        self.levels = levels
+        self.ladder = Ladder(min_price, max_price, gap_percent, price_precision) if levels > 1 else None
+        self.bids = {}  # 多档模式: 档位下标 -> 买单
+        self.asks = {}  # 多档模式: 档位下标 -> 卖单
+        self.stale_orders = {}  # 单网格模式: 撤单失败、可能仍在交易所的挂单 id -> 订单，下次调整报价时再撤销
+        self.reconciler = Reconciler(self.cancel_order, self.create_orders, price_precision, quantity_precision)
+        self.stream_url = stream_url or "wss://ws.backpack.exchange/"
         self.ws = None
-        self.depth = {"asks": [], "bids": []}  # 深度数据
+        self.running = True
+        self.connected = threading.Event()  # 已连接并订阅
+        self.reconnects = 0
+        self.depth = OrderBook(depth_limit)  # 本地深度簿，depth_limit 为保留的档位数，None 表示不限制
+        self.next_resync = 0.0  # 深度缺口恢复失败后，下次取快照的时间
         self.logger = logger  # 初始化日志记录器
-        self.bpx = BpxClient()
-        self.bpx.init(api_key, secret)
+        self.recorder = recorder
+        if recorder and recorder.ident is None:
+            recorder.start()
+        self.exclusive_symbol = True  # 是否独占交易对，与其他网格共用交易对时只能撤销自己的订单
+        if bpx is None:
+            bpx = BpxClient()
+            bpx.init(api_key, secret, url=url)
+        self.bpx = bpx
+        self.order_store = OrderStore()  # 本地订单簿(按 id/clientId 索引)
+        if ledger is None:
+            ledger = BalanceLedger(self.bpx)  # 本地余额账本，由订单推送更新，后台定期对账
+            ledger.sync()
+            ledger.start_auto_sync()
+        self.ledger = ledger
+        self.pipeline = pipeline
+        self.market_stage = Stage(f"grid-{strategy_prefix}-market", self.process_event, market_queue,
+                                  on_error=self.on_stage_error)
+        self.order_stage = Stage(f"grid-{strategy_prefix}-orders", self.process_event, order_queue,
+                                 on_error=self.on_stage_error)
+        if connect:
+            self.start()
+
+    def run(self):
         self.create_ws_connection()
  
         
@@ -62,39 +124,38 @@ class SpotGrid(threading.Thread):
         return int(f"{self.strategy_prefix}{id}")
     
     def get_balance(self):
-        """获取交易对的余额"""
-
-        b = self.bpx.balances()
-        if b:
-            s = self.symbol.split("_")
-            b1 = float(b.get(s[0], {}).get("available", 0.0))
-            b2 = float(b.get(s[1], {}).get("available", 0.0))
-            return b1, b2
-        else:
-            return None, None
+        """获取交易对的余额(本地账本)"""
+        return self.ledger.get_pair(self.symbol)
     
     def get_bid_ask_price(self):
         """获取买卖价格"""
-        self.depth = Depth(self.symbol)
-        if self.depth:
-            self.depth['asks'] = [[float(price), float(amount)] for price, amount in self.depth['asks']]
-            self.depth['bids'] = [[float(price), float(amount)] for price, amount in self.depth['bids']]
-            self.depth['lastUpdateId'] = int(self.depth['lastUpdateId'])
-            return float(self.depth['bids'][-1][0]), float(self.depth['asks'][0][0])
+        snapshot = Depth(self.symbol)
+        if snapshot:
+            if self.recorder:
+                self.recorder.record_snapshot(snapshot)
+            self.depth.resync(snapshot)  # 重放快照之前已经缓冲的增量(重连时)
+            return self.depth.best_bid(), self.depth.best_ask()
         else:
             return None, None
 
-    def generate_signature(self, timestamp, window):
-        message = f'instruction=subscribe&timestamp={timestamp}&window={window}'
-        signing_key = SigningKey(self.secret, encoder=Base64Encoder)
-        signed = signing_key.sign(message.encode('utf-8'))
-        signature = base64.b64encode(signed.signature).decode('utf-8')
-        verifying_key = base64.b64encode(signing_key.verify_key.encode()).decode('utf-8')
-        return verifying_key, signature
+    def snapshot_bid_ask(self):
+        """从最新的 REST 深度快照读取买一卖一价，不改动本地深度簿(由行情阶段维护)"""
+        snapshot = Depth(self.symbol)
+        if not snapshot or not snapshot.get('bids') or not snapshot.get('asks'):
+            return None, None
+        return max(float(p) for p, _ in snapshot['bids']), min(float(p) for p, _ in snapshot['asks'])
+
+    def generate_signature(self):
+        """订阅私有频道的签名，与 REST 共用 BpxClient 的签名器"""
+        return self.bpx.signer.ws_signature('subscribe')
 
     def get_client_id(self, size=6, chars=string.digits):
         id = "".join(random.choice(chars) for _ in range(size))
         return int(f"{self.strategy_prefix}{id}")
+
+    def owns(self, client_id, size=6):
+        """clientId 是否属于本网格(策略编号 + size 位随机数)"""
+        return client_id is not None and str(client_id)[:-size] == str(self.strategy_prefix)
     
     def round_to(self, number, precision):
         return float(f'{number:.{precision}f}')
@@ -102,33 +163,103 @@ class SpotGrid(threading.Thread):
 
     def on_message(self, ws, message):
         try:
-            data = json.loads(message)
-        except json.JSONDecodeError:
-            raise f"Failed to decode message as JSON, message: {message}"
+            _, data = events.decode(message)
+        except events.JSONDecodeError:
+            raise Exception(f"Failed to decode message as JSON, message: {message}")
 
         # 确保 'data' 键存在且其值不是 None
-        if 'data' not in data or data['data'] is None:
-            raise "'data' field is missing or None in the message, message: {message}"
+        if data is None:
+            raise Exception(f"'data' field is missing or None in the message, message: {message}")
+
+        self.dispatch(data)
+
+    MARKET_EVENTS = ('depth', 'trade')
 
-        event = data['data'].get('e')
+    def dispatch(self, data):
+        """流水线模式下读取线程只入队，行情和订单分别在各自的阶段按顺序处理；否则在调用线程中直接处理"""
+        if not self.pipeline:
+            self.handle_event(data)
+        elif data.get('e') in self.MARKET_EVENTS:
+            self.market_stage.put(data)
+        else:
+            self.order_stage.put(data)
+
+    def process_event(self, data):
+        """流水线阶段的处理函数: 推送交给 handle_event(每次调用时查找，便于替换)，函数(重连后的对账)直接执行"""
+        if callable(data):
+            data()
+        else:
+            self.handle_event(data)
+
+    def on_stage_error(self, stage, error):
+        """流水线阶段处理出错: 与读取线程中出错相同，撤销挂单并停止，同时关闭连接让读取线程退出"""
+        self.logger.error(f"Error from {stage.name}: {error}")
+        try:
+            self.close()
+        except Exception as e:
+            self.logger.error(f"关闭 websocket 失败: {e}")
+        self.on_error(self, error)
+
+    def pipeline_stats(self):
+        """各阶段的队列深度、最大深度、排队延迟和处理耗时"""
+        return {'market': self.market_stage.snapshot(), 'orders': self.order_stage.snapshot()}
+
+    def handle_event(self, data):
+        """处理一条推送的 data 部分(自己的连接或 GridEngine 转发)，data 为 bpx.events 解码的事件，原始字典会先解码"""
+        if isinstance(data, dict):
+            data = events.decode_data(data)
+        event = data.get('e')
         if event is None:
             logger.error("'e' field is missing or None in the 'data'")
-            raise "'e' field is missing or None in the 'data'"
-        if event == 'depth':
-            self.update_depth(data['data'])
-        elif event == 'orderFill':  # 订单成交处理
-            # logger.info(f"Order Fill : {data['data']}")
-            self.handle_order_fill(data['data'])
-        elif event == 'orderCancelled':
-            # logger.info(f"Order Cancelled : {data['data']}")
-            pass
-        elif event == 'orderAccepted':
-            self.handle_order_accepted(data['data'])
-        elif event == 'orderExpired':
-            logger.info(f"Order Expired : {data['data']}")
-        else:
+            raise Exception("'e' field is missing or None in the 'data'")
+        handler = self.HANDLERS.get(event)
+        if handler is None:
             logger.warning(f"Unhandled event type: {event}")
             logger.debug(f"Message: {data}")
+            return
+        handler(self, data)
+
+    # 推送处理，按事件类型查表分发(HANDLERS)
+    def on_depth(self, data):
+        if self.recorder:
+            self.recorder.record_depth(data)
+        self.update_depth(data)
+
+    def on_trade(self, data):
+        if self.recorder:
+            self.recorder.record_trade(data)
+
+    def on_order_event(self, data):
+        """所有订单推送都先更新余额账本和订单状态机"""
+        self.ledger.on_order_update(data)
+        self.order_store.apply_event(data)
+        if data.status in TERMINAL_STATUSES and self.stale_orders.pop(data.order_id, None):
+            logger.info(f"撤单失败的挂单已终结: {data.order_id}, 状态: {data.status}")
+
+    def on_order_fill(self, data):
+        self.on_order_event(data)
+        if self.ladder:
+            self.handle_ladder_fill(data)
+        else:
+            self.handle_order_fill(data)
+
+    def on_order_accepted(self, data):
+        self.on_order_event(data)
+        if not self.ladder:
+            self.handle_order_accepted(data)
+
+    def on_order_expired(self, data):
+        self.on_order_event(data)
+        logger.info(f"Order Expired : {data}")
+
+    HANDLERS = {
+        'depth': on_depth,
+        'trade': on_trade,
+        'orderFill': on_order_fill,
+        'orderAccepted': on_order_accepted,
+        'orderCancelled': on_order_event,
+        'orderExpired': on_order_expired,
+    }
 
     def on_ping(self, ws, message):
         logger.debug("Received ping, sending pong")
@@ -139,31 +270,127 @@ class SpotGrid(threading.Thread):
         if '余额不足' in error_message:
             logger.error(f"Error 余额不足: {error}, 程序将撤销所有，并停止运行。")
         logger.error(f"WebSocket error: {error}")
-        self.bpx.cancelAllOpenOrders(self.symbol)
+        self.running = False  # 不再重连
+        self.cancel_grid_orders()
         exit()
 
     def on_close(self, ws):
         logger.warning("WebSocket closed")
         self.ws.close()
 
-    def on_open(self, ws):
-        timestamp = int(time.time() * 1000)
-        window = 5000
-        verifying_key, signature = self.generate_signature(timestamp, window)
-        self.bid_price, self.ask_price = self.get_bid_ask_price()
+    def streams(self):
+        """需要订阅的数据流，开启行情记录时额外订阅逐笔成交"""
+        streams = [f"depth.{self.symbol}", f"account.orderUpdate.{self.symbol}"]
+        if self.recorder:
+            streams.append(f"trade.{self.symbol}")
+        return streams
+
+    def subscribe(self):
+        """订阅行情和订单推送，每次连接重新签名"""
         auth_message = {
             "method": "SUBSCRIBE",
-            "params": [f"depth.{self.symbol}", f"account.orderUpdate.{self.symbol}"],
-            "signature": [verifying_key, signature, str(timestamp), str(window)]
+            "params": self.streams(),
+            "signature": self.generate_signature()
         }
         self.send_message(json.dumps(auth_message))
         logger.info(f"WebSocket connection opened and subscribed to {auth_message['params']}")
+
+    def on_open(self, ws):
+        self.bid_price, self.ask_price = self.get_bid_ask_price()
+        self.subscribe()
         self.place_fist_order()
+
+    def on_reconnect(self, ws):
+        """重连后重新订阅并对账，不撤单
+
+        深度不重新加载: 断线期间漏掉的增量会在下一条推送时被发现为缺口，由 resync_depth 恢复。
+        对账放在订单阶段执行，排在断线前已经收到的订单推送之后。
+        """
+        self.subscribe()
+        if self.pipeline:
+            self.order_stage.put(self.reconcile_orders)
+        else:
+            self.reconcile_orders()
+
+    def reconcile_orders(self):
+        """按 clientId 把交易所的挂单(getAllOpenOrders 一次)与本地的挂单对应起来
+
+        - 仍在交易所的挂单保留
+        - 本地有、交易所已经没有的挂单(断线期间成交或取消，推送丢失)查订单和成交历史，只按确认的成交数量处理:
+          单网格有成交时按成交重新报价，没有成交(取消、过期或历史里找不到)时按原价补挂；
+          多档网格补挂窗口内缺少的档位；余额重新同步
+        - 交易所有、本地没有的本网格挂单(下单返回丢失等)撤销
+        """
+        open_orders = self.bpx.getAllOpenOrders(self.symbol)
+        if not isinstance(open_orders, list):
+            raise Exception(f"对账获取挂单失败: {open_orders}")
+        live = {str(o.get('clientId')): o for o in open_orders if self.owns(o.get('clientId'))}
+        if self.ladder:
+            expected = [*self.bids.values(), *self.asks.values()]
+        else:
+            expected = [o for o in (self.buy_order, self.sell_order) if o]
+        missing = [o for o in expected if str(o.get('clientId')) not in live]
+        known = {str(o.get('clientId')) for o in expected}
+        stray = [o for cid, o in live.items() if cid not in known]
+        logger.info(f"重连对账: 交易所挂单 {len(live)} 个, 本地挂单 {len(expected)} 个, 已不在交易所 {len(missing)} 个, "
+                    f"多余 {len(stray)} 个")
+        for o in stray:
+            if self.cancel_order(o):
+                self.stale_orders.pop(o['id'], None)
+        # 撤单失败的挂单已经不在交易所: 断线期间成交或取消
+        for order_id in [i for i, o in self.stale_orders.items() if str(o.get('clientId')) not in live]:
+            self.stale_orders.pop(order_id)
+        if not missing:
+            return
+        final = self.bpx.findHistoryOrders(missing)
+        for o in missing:
+            self.ledger.forget(o['id'])
+            if o['clientId'] in final:
+                self.order_store.track(final[o['clientId']])
+            else:
+                self.order_store.forget(o['id'])
+        self.ledger.sync()
+        if self.ladder:
+            for book in (self.bids, self.asks):
+                for i in [i for i, o in book.items() if o in missing]:
+                    del book[i]
+            self.shift_ladder(self.ladder_center())
+        elif len(missing) == len(expected):
+            # 断线前的盘口价格已经过时，按最新的深度快照重新居中
+            bid_price, ask_price = self.snapshot_bid_ask()
+            if bid_price and ask_price:
+                self.bid_price, self.ask_price = bid_price, ask_price
+            self.place_fist_order()
+        else:
+            o = missing[0]
+            done = final.get(o['clientId'])
+            executed = float(done.get('executedQuantity') or 0) if done else 0
+            if executed > 0:
+                # 只按确认的成交数量合成成交推送，成交价取成交均价
+                quote = float(done.get('executedQuoteQuantity') or 0)
+                self.handle_order_fill(events.decode_data({
+                    'e': 'orderFill', 's': o['symbol'], 'c': o['clientId'], 'S': o['side'], 'o': o.get('orderType'),
+                    'f': o.get('timeInForce'), 'q': o['quantity'], 'p': o['price'], 'X': done.get('status'),
+                    'i': o['id'], 'l': executed, 'z': executed, 'L': quote / executed if quote else o['price'],
+                }))
+                return
+            logger.warning(f"挂单没有成交就已经不在交易所({done.get('status') if done else '历史中未找到'}), "
+                           f"按原价补挂: {o['id']}")
+            new_order, = self.create_orders([dict(symbol=o['symbol'], side=o['side'], orderType=o['orderType'],
+                                                  timeInForce=o['timeInForce'], quantity=float(o['quantity']),
+                                                  price=float(o['price']))])
+            if o is self.buy_order:
+                self.buy_order = new_order
+            else:
+                self.sell_order = new_order
     
     def place_fist_order(self):
 
         while True:
-            s = Status()  # 获取系统状态
+            try:
+                s = MARKET_DATA.Status()  # 获取系统状态(缓存，多个网格共用一次请求)
+            except RETRY_EXCEPTIONS as e:
+                s = {'status': str(e)}
             # 如果返回不是Ok，说明系统维护中，等待10秒后再次请求
             if s and s.get('status') != "Ok":
                 logger.info("系统维护中...")
@@ -174,58 +401,127 @@ class SpotGrid(threading.Thread):
         logger.info(f"当前价格: {self.bid_price} ~ {self.ask_price}")
         logger.info(f"网格区间: {self.min_price} ~ {self.max_price}")
         # 取消所有挂单
-        self.bpx.cancelAllOpenOrders(self.symbol)
+        self.release_cancelled(self.cancel_grid_orders())
+        if self.ladder:
+            self.place_ladder_orders()
+            return
         mid_price = (self.bid_price + self.ask_price) / 2
         if self.bid_price > 0 and  self.ask_price > 0:
                # 创建新卖单
             buy_price = self.round_to(mid_price * (1 - float(self.gap_percent)), self.price_precision)
-            self.buy_order = self.create_order(self.symbol, "Bid", "Limit", "GTC", self.quantity, buy_price)
-            logger.info(f"创建新买单: clientId:{self.buy_order['clientId']}, id: {self.buy_order['id']}, price:{self.buy_order['price']}, quantity:{self.buy_order['quantity']}, side:{self.buy_order['side']}")
-                # 创建新买单.
             sell_price = self.round_to(mid_price * (1 + float(self.gap_percent)), self.price_precision)
-            self.sell_order = self.create_order(self.symbol, "Ask", "Limit", "GTC", self.quantity, sell_price)  # 下卖单
-            logger.info(f"创建新卖单: clientId:{self.sell_order['clientId']}, id: {self.sell_order['id']}, price:{self.sell_order['price']}, quantity:{self.sell_order['quantity']}, side:{self.sell_order['side']}")
+            self.buy_order, self.sell_order = self.place_orders([
+                dict(symbol=self.symbol, side="Bid", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=buy_price),
+                dict(symbol=self.symbol, side="Ask", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=sell_price),
+            ])
+            if self.buy_order:
+                logger.info(f"创建新买单: clientId:{self.buy_order['clientId']}, id: {self.buy_order['id']}, price:{self.buy_order['price']}, quantity:{self.buy_order['quantity']}, side:{self.buy_order['side']}")
+            if self.sell_order:
+                logger.info(f"创建新卖单: clientId:{self.sell_order['clientId']}, id: {self.sell_order['id']}, price:{self.sell_order['price']}, quantity:{self.sell_order['quantity']}, side:{self.sell_order['side']}")
+            if not (self.buy_order and self.sell_order):
+                raise Exception("首次挂单失败")  # 已经生效的挂单已经记下，on_error 会一起撤销
 
 
     
+    def place_ladder_orders(self):
+        """多档模式首次挂单: 以离中间价最近的档位为中心，两边各挂 levels 个单，且不与盘口交叉"""
+        if not (self.bid_price and self.ask_price):
+            return
+        self.bids, self.asks = {}, {}
+        center = self.ladder_center()
+        logger.info(f"多档网格: 共 {len(self.ladder)} 档, 每边 {self.levels} 个单, 中心价格 {self.ladder.price(center)}")
+        self.shift_ladder(center)
+
+    def ladder_center(self):
+        """离中间价最近、且挂单不与盘口交叉的档位"""
+        center = self.ladder.nearest((self.bid_price + self.ask_price) / 2)
+        while center > 0 and self.ladder.price(center - 1) >= self.ask_price:
+            center -= 1
+        while center < len(self.ladder) - 1 and self.ladder.price(center + 1) <= self.bid_price:
+            center += 1
+        return center
+
+    def shift_ladder(self, center):
+        """把挂单窗口移动到以 center 档为中心: 只撤销移出窗口的挂单，只补挂窗口内缺少的档位"""
+        buys, sells = self.ladder.window(center, self.levels)
+        # 与盘口交叉的档位会直接吃单成交，先不挂，等下次移动窗口时再补
+        levels = [('Bid', i) for i in buys if i in self.bids or not (0 < self.ask_price <= self.ladder.price(i))] + \
+                 [('Ask', i) for i in sells if i in self.asks or not (self.ladder.price(i) <= self.bid_price)]
+        desired = [dict(symbol=self.symbol, side=side, orderType="Limit", timeInForce="GTC", quantity=self.quantity,
+                        price=self.round_to(self.ladder.price(i), self.price_precision)) for side, i in levels]
+        live = {o['id']: (side, i) for side, book in (('Bid', self.bids), ('Ask', self.asks)) for i, o in book.items()}
+        orders, failed = self.reconciler.apply(desired, [*self.bids.values(), *self.asks.values()])
+        self.bids, self.asks = {}, {}
+        # 撤销失败的挂单可能已经成交，留在窗口外等待成交推送
+        for (side, i), order in [*zip(levels, orders), *((live[o['id']], o) for o in failed)]:
+            if order is None:
+                continue
+            (self.bids if side == 'Bid' else self.asks)[i] = order
+            if order['id'] not in live:
+                logger.info(f"创建新{'买' if side == 'Bid' else '卖'}单: clientId:{order['clientId']}, id: {order['id']}, price:{order['price']}, quantity:{order['quantity']}, 档位:{i}")
+
+    def handle_ladder_fill(self, order):
+        """多档模式成交处理: 订单完全成交后以该档为中心移动挂单窗口"""
+        if order.status != 'Filled':
+            return
+        order_id = order.order_id
+        for side in (self.bids, self.asks):
+            level = next((i for i, o in side.items() if o.get('id') == order_id), None)
+            if level is not None:
+                del side[level]
+                break
+        else:
+            logger.warning(f"成交的订单不在当前挂单窗口中: {order_id}")
+            return
+        logger.success(f"订单成交, 成交时间: {datetime.now()}, 订单id:{order_id}, 订单类型:{order.side}, 价格: {order.price}, 档位: {level}")
+        self.shift_ladder(level)
+
     def update_depth(self, data):
-        update_id = int(data.get('u'))
- 
-        def update_side(side, old_data, updates):
-            for update in updates:
-                price, qty = float(update[0]), float(update[1])
-                now_data = [entry for entry in old_data if entry[0] != price]
-                if qty != 0:
-                    now_data.append([price, qty])
-            now_data.sort(key=lambda x: x[0], reverse=(side == "bids"))
-            return now_data
-        
-        
-        if update_id > self.depth.get('lastUpdateId'):
-            self.depth["lastUpdateId"] = update_id
-            if data['a']:
-                self.depth["asks"] = update_side("asks", self.depth["asks"], data["a"])
+        if self.depth.apply_diff(data):
+            self.ask_price = self.depth.best_ask()
+            self.bid_price = self.depth.best_bid()
+        elif self.depth.syncing and time.monotonic() >= self.next_resync:
+            self.resync_depth()
 
-            if data['b']:
-                self.depth["bids"] = update_side("bids",self.depth["bids"], data["b"])
-            
-            self.ask_price = self.depth['asks'][0][0]
-            self.bid_price = self.depth["bids"][0][0]
+    def resync_depth(self, retry_interval=0.2):
+        """深度增量出现缺口: 增量先缓冲，取一次快照后重放，不断开连接也不撤单
+
+        恢复之前 bid_price/ask_price 保持缺口前的值。快照比缓冲的增量还旧或请求失败时，
+        retry_interval 秒后随下一条增量再取一次。
+        """
+        book = self.depth
+        logger.warning(f"{self.symbol} 深度增量缺口: 本地 lastUpdateId {book.last_update_id}, 已缓冲 {len(book.buffer)} 条，重新加载快照")
+        try:
+            snapshot = Depth(self.symbol, deadline=2.0)
+        except (*RETRY_EXCEPTIONS, CircuitOpen) as e:
+            logger.error(f"获取深度快照失败: {e}")
+            snapshot = None
+        if snapshot and self.recorder:
+            self.recorder.record_snapshot(snapshot)
+        if snapshot and book.resync(snapshot):
+            self.bid_price, self.ask_price = book.best_bid(), book.best_ask()
+            logger.info(f"{self.symbol} 深度已恢复: lastUpdateId {book.last_update_id}, 第 {book.stats['resyncs']} 次恢复, "
+                        f"累计缺口 {book.stats['gaps']} 次, 累计耗时 {book.stats['resync_seconds']:.3f} 秒")
+            return True
+        self.next_resync = time.monotonic() + retry_interval
+        return False
         
     def handle_order_fill(self, order):
-        order_id = order.get('i')
-        order_price = order.get('p')
-        order_side = order.get('S')
-        logger.success(f"订单成交, 成交时间: {datetime.now()}, 订单id:{order_id}, 订单类型:{order_side}, 价格: {order_price}, 数量: {order.get('l')}")
-        r = self.bpx.cancelAllOpenOrders(self.symbol)
-        # logger.debug(f'取消未成交订单, 结果: {r}')
-        if order_id == self.buy_order.get("id"):  # 买单成交
-            sell_price = self.round_to(float(order_price) * (1 + float(self.gap_percent)), self.price_precision)
-            buy_price = self.round_to(float(order_price) * (1 - float(self.gap_percent)), self.price_precision)
+        order_id = order.order_id
+        order_price = order.price
+        order_side = order.side
+        logger.success(f"订单成交, 成交时间: {datetime.now()}, 订单id:{order_id}, 订单类型:{order_side}, 价格: {order_price}, 数量: {order.fill_quantity}")
+        if order_id not in [o.get("id") for o in (self.buy_order, self.sell_order) if o]:
+            logger.warning(f"成交的订单不是当前挂单: {order_id}")
+            return
+        buy_id = self.buy_order.get("id") if self.buy_order else None
+        if order_id == buy_id:  # 买单成交
+            sell_price = self.round_to(order_price * (1 + float(self.gap_percent)), self.price_precision)
+            buy_price = self.round_to(order_price * (1 - float(self.gap_percent)), self.price_precision)
             
-        elif order_id == self.sell_order.get("id"):  # 卖单成交
-            buy_price = self.round_to(float(order_price) * (1 - float(self.gap_percent)), self.price_precision)
-            sell_price = self.round_to(float(order_price) * (1 + float(self.gap_percent)), self.price_precision)
+        else:  # 卖单成交
+            buy_price = self.round_to(order_price * (1 - float(self.gap_percent)), self.price_precision)
+            sell_price = self.round_to(order_price * (1 + float(self.gap_percent)), self.price_precision)
        
         # 重新下买单和卖单
         if buy_price > self.bid_price > 0:
@@ -233,40 +529,101 @@ class SpotGrid(threading.Thread):
         if 0 < sell_price < self.ask_price:
             sell_price = self.round_to(self.ask_price, self.price_precision)
         
-        new_buy_order = self.create_order(symbol=self.symbol, side="Bid", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=buy_price)  # 下买单
-        if new_buy_order:
-            self.buy_order = new_buy_order
-            logger.info(f"创建新买单: clientId:{self.buy_order['clientId']}, id: {self.buy_order['id']}, price:{self.buy_order['price']}, quantity:{self.buy_order['quantity']}, side:{self.buy_order['side']}")
-        new_sell_order = self.create_order(symbol=self.symbol, side="Ask", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=sell_price)  # 下卖单
-        if new_sell_order:
+        filled = self.buy_order if order_id == buy_id else self.sell_order
+        # 上次撤单失败的挂单一起参与差量调整: 与新报价一致时保留，否则再撤一次
+        live = [o for o in (self.buy_order, self.sell_order) if o and o is not filled] + list(self.stale_orders.values())
+        stale = {}
+        # 部分成交、仍在挂单的订单剩余部分也要撤销
+        if order.status not in TERMINAL_STATUSES and not self.cancel_order(filled):
+            stale[filled['id']] = filled
+        # 差量调整: 价格和数量不变的挂单保留，其余撤销，新报价一起提交
+        (new_buy_order, new_sell_order), failed = self.reconciler.apply([
+            dict(symbol=self.symbol, side="Bid", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=buy_price),
+            dict(symbol=self.symbol, side="Ask", orderType="Limit", timeInForce="GTC", quantity=self.quantity, price=sell_price),
+        ], live)
+        # 撤单失败的挂单可能仍在交易所或已经部分成交，记下来等终结推送或下次调整时再撤
+        stale.update((o['id'], o) for o in failed)
+        self.stale_orders = stale
+        if stale:
+            logger.warning(f"撤单失败的挂单: {list(stale)}")
+        if new_buy_order is not self.buy_order:
+            self.buy_order = new_buy_order  # 下单失败时为 None，等下一次成交时补挂
+            if new_buy_order:
+                logger.info(f"创建新买单: clientId:{self.buy_order['clientId']}, id: {self.buy_order['id']}, price:{self.buy_order['price']}, quantity:{self.buy_order['quantity']}, side:{self.buy_order['side']}")
+        if new_sell_order is not self.sell_order:
             self.sell_order = new_sell_order
-            logger.info(f"创建新卖单: clientId:{self.sell_order['clientId']}, id: {self.sell_order['id']}, price:{self.sell_order['price']}, quantity:{self.sell_order['quantity']}, side:{self.sell_order['side']}")
+            if new_sell_order:
+                logger.info(f"创建新卖单: clientId:{self.sell_order['clientId']}, id: {self.sell_order['id']}, price:{self.sell_order['price']}, quantity:{self.sell_order['quantity']}, side:{self.sell_order['side']}")
+        logger.debug(f"HTTP连接统计: {self.bpx.connection_stats()}")
     
+    def cancel_grid_orders(self):
+        """撤销本网格的挂单。独占交易对时一次撤销全部，与其他网格共用交易对时按 clientId 前缀只撤销自己的"""
+        if self.exclusive_symbol:
+            return self.bpx.cancelAllOpenOrders(self.symbol)
+        cancelled = []
+        for o in self.bpx.getAllOpenOrders(self.symbol) or []:
+            if self.owns(o.get('clientId')) and self.bpx.cancelOrder(self.symbol, o.get('id')):
+                cancelled.append(o)
+        return cancelled
+
+    def cancel_order(self, order):
+        """撤销一个挂单，成功后在本地账本中解冻"""
+        try:
+            r = self.bpx.cancelOrder(self.symbol, order['id'])
+        except (*RETRY_EXCEPTIONS, CircuitOpen) as e:
+            logger.error(f"撤单失败: {order['id']}, {e}")
+            return False
+        if r:
+            self.release_cancelled([order])
+            return True
+        return False
+
+    def release_cancelled(self, orders):
+        """撤单成功后立即在本地账本中解冻，不必等待 orderCancelled 推送"""
+        if isinstance(orders, list):
+            for o in orders:
+                self.ledger.release(o.get('id'))
+
     def handle_order_accepted(self, order):
         orderInfo = {
-                        'clientId': order.get('c'),
+                        'clientId': order.client_id,
                         'createdAt': None,
                         'executedQuantity': '0',
                         'executedQuoteQuantity': '0',
-                        'id': order.get('i'),
-                        'orderType': order.get('o'),
+                        'id': order.order_id,
+                        'orderType': order.order_type,
                         'postOnly': False,
-                        'price': str(order.get('p')),
-                        'quantity': str(order.get('q')),
+                        'price': str(order.price),
+                        'quantity': str(order.quantity),
                         'selfTradePrevention': 'RejectTaker',
-                        'side': order.get('S'),
+                        'side': order.side,
                         'status': 'New',
-                        'symbol': order.get('s'),
-                        'timeInForce': order.get('f'),
+                        'symbol': order.symbol,
+                        'timeInForce': order.time_in_force,
                         'triggerPrice': None
                     }
-        if order.get('S') == 'Bid' and order.get('X') == 'New':
+        if order.side == 'Bid' and order.status == 'New':
             self.buy_order = orderInfo
-        elif order.get('S') == 'Ask' and order.get('X') == 'New':
+        elif order.side == 'Ask' and order.status == 'New':
             self.sell_order = orderInfo
         else:
             raise (f'收到未知订单类型: {order}')
     
+    def check_order(self, symbol, side, quantity, price):
+        """下单前检查价格区间和余额，不满足时抛出异常"""
+        if price < self.min_price or price > self.max_price:
+            logger.info(f"当前价格{price}不在网格下单范围内({self.min_price} ~ {self.max_price})，不下单")
+            raise Exception(f"当前价格{price}不在网格下单范围内({self.min_price} ~ {self.max_price})，不下单")
+        
+        if side == 'Ask' and not self.ledger.has_funds(symbol, side, quantity, price):
+            logger.error("卖单余额不足...")
+            # 抛出异常
+            raise Exception("卖单余额不足")
+        
+        if side == "Bid" and not self.ledger.has_funds(symbol, side, quantity, price):
+            logger.error("买单余额不足...")
+            raise Exception("买单余额不足")
+
     def create_order(self, symbol, side, orderType, timeInForce, quantity, price):
         """创建订单
 
@@ -281,31 +638,99 @@ class SpotGrid(threading.Thread):
         Returns:
             _type_: 返回订单信息
         """
-        b1, b2 = self.get_balance()
-        
-        if price < self.min_price or price > self.max_price:
-            logger.info(f"当前价格{price}不在网格下单范围内({self.min_price} ~ {self.max_price})，不下单")
-            raise Exception(f"当前价格{price}不在网格下单范围内({self.min_price} ~ {self.max_price})，不下单")
-        
-        if side == 'Ask' and b1 < quantity:
-            logger.error("卖单余额不足...")
-            # 抛出异常
-            raise Exception("卖单余额不足")
-        
-        if side == "Bid" and b2 < quantity * price:
-            logger.error("买单余额不足...")
-            raise Exception("买单余额不足")
-
-        return self.bpx.ExeOrder(cid=self.get_client_id(), symbol=symbol, side=side, orderType=orderType, 
+        self.check_order(symbol, side, quantity, price)
+        order = self.bpx.ExeOrder(cid=self.get_client_id(), symbol=symbol, side=side, orderType=orderType, 
                               timeInForce=timeInForce, quantity=quantity, price=price)
+        if order:
+            self.ledger.reserve(order)
+            self.order_store.track(order)
+        return order
+
+    def create_orders(self, orders):
+        """批量创建订单，一次签名请求(或并发)提交，缩短只有一边挂单的时间
+
+        未通过检查或提交失败的订单为 None，不抛出异常，已经生效的订单都记账并返回给调用方
+
+        Args:
+            orders (list): 订单参数列表，每个元素为 create_order 的参数字典
+
+        Returns:
+            list: 与 orders 对应的订单信息，失败为 None
+        """
+        valid = []
+        for i, o in enumerate(orders):
+            try:
+                self.check_order(o['symbol'], o['side'], o['quantity'], o['price'])
+                valid.append(i)
+            except Exception as e:
+                logger.warning(f"报价未通过检查，不下单: {e}")
+        results = [None] * len(orders)
+        submitted = self.bpx.ExeOrders([{**orders[i], 'cid': self.get_client_id()} for i in valid]) if valid else []
+        for i, r in zip(valid, submitted):
+            if isinstance(r, BpxError):
+                logger.error(f"订单提交失败: {r}")
+                continue
+            self.ledger.reserve(r)
+            self.order_store.track(r)
+            results[i] = r
+        return results
+
+    place_retries = 2  # 一组报价只有部分生效时补下失败报价的次数
+
+    def place_orders(self, orders):
+        """下一组报价: 已经生效的订单保留，只补下失败的报价，最多 place_retries 次
+
+        Returns:
+            list: 与 orders 对应的订单信息，重试后仍然失败的为 None
+        """
+        placed = self.create_orders(orders)
+        for _ in range(self.place_retries):
+            missing = [i for i, o in enumerate(placed) if o is None]
+            if not missing:
+                break
+            logger.warning(f"{len(missing)} 个报价下单失败，补下")
+            for i, o in zip(missing, self.create_orders([orders[i] for i in missing])):
+                placed[i] = o
+        return placed
     
 
     def create_ws_connection(self):
-        self.logger.debug(f"Creating connection with WebSocket Server: {self.stream_url}")
-        self.ws = create_connection(self.stream_url)
-        self.logger.debug(f"WebSocket connection has been established: {self.stream_url}")
-        self._callback(self.on_open)
-        self.read_data()  # 开始读取数据
+        """连接并读取推送，断开后按退避时间重连，直到 close() 或 on_error 停止"""
+        if self.pipeline:
+            self.market_stage.start()
+            self.order_stage.start()
+        delay = self.reconnect_backoff
+        first = True
+        try:
+            while self.running:
+                try:
+                    self.logger.debug(f"Creating connection with WebSocket Server: {self.stream_url}")
+                    self.ws = create_connection(self.stream_url)
+                    self.logger.debug(f"WebSocket connection has been established: {self.stream_url}")
+                    if first:
+                        self.on_open(self)
+                    else:
+                        self.reconnects += 1
+                        self.on_reconnect(self)
+                    first = False
+                    delay = self.reconnect_backoff
+                    self.connected.set()
+                    self.read_data()  # 开始读取数据
+                except (WebSocketException, OSError) as e:
+                    # 网络错误(包括订阅、对账时 REST 连接失败)重连
+                    self.logger.error(f"Websocket exception: {e}")
+                except Exception as e:
+                    self.on_error(self, e)
+                finally:
+                    self.connected.clear()
+                if self.running:
+                    self.logger.warning(f"WebSocket 连接断开，{delay} 秒后重连")
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_backoff)
+        finally:
+            # 处理完已入队的推送后停止
+            self.market_stage.stop()
+            self.order_stage.stop()
 
     def send_message(self, message):
         self.logger.debug(f"Sending message to WebSocket Server: {message}")
@@ -337,12 +762,11 @@ class SpotGrid(threading.Thread):
                 self.logger.debug("Received PONG frame")
                 self._callback(self.on_pong)
             else:
-                data = frame.data
-                if op_code == ABNF.OPCODE_TEXT:
-                    data = data.decode("utf-8")
-                self._callback(self.on_message, data)
+                # 文本帧不转 str，直接把 bytes 交给 orjson 解码
+                self._callback(self.on_message, frame.data)
 
     def close(self):
+        self.running = False
         if not self.ws.connected:
             self.logger.warn("Websocket already closed")
         else:
@@ -359,6 +783,8 @@ class SpotGrid(threading.Thread):
                     self.on_error(self, e)
 
 if __name__ == "__main__":
+    # from recorder import MarketRecorder  # 记录行情时取消注释，并传入下面的 recorder 参数
+    # from bpx import metrics; metrics.serve(9108)  # REST 延迟/状态码/重试指标: http://127.0.0.1:9108/metrics
     # 使用传入的参数创建SpotGrid实例
     grid = SpotGrid(
         api_key="",
@@ -370,9 +796,10 @@ if __name__ == "__main__":
         price_precision=2, # 价格精度
         quantity=0.01, # 每次下单数量
         quantity_precision=2, # 数量精度
-        strategy_prefix="1" #  策略唯一编号，取值保守的话可以1~40，保证每个策略这个不同就行，这样可以运行多个网格
-    )
-    grid.start()
+        strategy_prefix="1", #  策略唯一编号，取值保守的话可以1~40，保证每个策略这个不同就行，这样可以运行多个网格
+        # recorder=MarketRecorder("market_data", "SOL_USDC"), # 记录深度和逐笔成交
+        # levels=5, # 多档模式，每边挂5个单
+    )  # connect=True 时在后台读取线程中连接并运行
 
     while True:
         time.sleep(1)
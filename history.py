@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+from bpx.ratelimit import RateLimiter, RateLimitShed, HISTORY
+
+
+def _fill_key(r):
+    # 自成交时同一个 tradeId 有买卖两条记录
+    return f"{r.get('tradeId')}:{r.get('orderId')}"
+
+
+# 历史接口: 名称 -> (取一页的函数, 记录的唯一键)
+SOURCES = {
+    'fills': (lambda client, symbol, limit, offset: client.fillHistoryQuery(symbol or '', limit, offset), _fill_key),
+    'orders': (lambda client, symbol, limit, offset: client.orderHistoryQuery(symbol or '', limit, offset),
+               lambda r: r.get('id')),
+    'withdrawals': (lambda client, symbol, limit, offset: client.withdrawals(limit, offset), lambda r: r.get('id')),
+}
+
+
+class Checkpoint:
+    """历史拉取的断点文件(JSON)，每个数据流(kind:symbol)一项:
+
+    - frontier: 上次完整拉取时最新的若干条记录的键，之后的拉取遇到其中任意一条就停止
+    - resume: 中断的拉取 {'head': 该次拉取开始时最新的若干条记录的键, 'offset': 从 head 开始已经处理的条数,
+      'cursor': 最后处理的一条记录的键}
+
+    先写临时文件再替换，写到一半退出不会损坏原文件。path 为空时只保存在内存中。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, name):
+        return self.state.get(name) or {}
+
+    def put(self, name, value):
+        with self.lock:
+            self.state[name] = value
+            if not self.path:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+
+
+class HistoryStream:
+    """分页遍历历史记录的生成器，按接口返回的顺序(最新在前)逐条产出
+
+    - 最多 concurrency 页同时请求，按 rate(页/秒)限速；请求同时经过客户端按账户共用的限频器(历史通道优先级最低)，
+      被丢弃(RateLimitShed)时退避重试，不会挤占下单和撤单
+    - 按页的顺序产出，先返回的后面的页等待前面的页
+    - 相邻两页重叠一条记录，翻页期间有新记录插入(offset 整体后移)时据此发现并重新请求，不会漏掉记录；
+      按记录的唯一键去重
+    - 每处理完一页写一次断点；遇到上次完整拉取时最新的记录(frontier)停止，下次只拉取新记录；
+      中途中断(异常或调用方提前结束迭代)时下次从中断处继续，先补上中断后产生的新记录
+    - 断点只在整页处理完后推进，中断所在页的记录下次会再产出一次(至少一次)
+
+    假设历史只在最新一端追加(成交历史满足；订单历史中长时间挂单在成交后才出现在旧位置时可能被跳过)。
+
+    Args:
+        client (BpxClient): REST 客户端
+        kind (str): fills / orders / withdrawals
+        symbol (str, optional): 交易对，withdrawals 忽略
+        limit (int, optional): 每页条数
+        concurrency (int, optional): 同时请求的页数
+        rate (float, optional): 每秒最多请求的页数
+        checkpoint (Checkpoint | str, optional): 断点或断点文件路径，为空时每次从头拉取
+        max_retries (int, optional): 单页被限频丢弃后最多重试的次数
+    """
+
+    def __init__(self, client, kind, symbol=None, limit=100, concurrency=4, rate=5.0, checkpoint=None, max_retries=5):
+        self.client = client
+        self.fetch, self.key = SOURCES[kind]
+        self.symbol = symbol
+        self.name = f"{kind}:{symbol or '*'}"
+        self.limit = limit
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint)
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(rate=rate, burst=max(concurrency, 1), reserve=(0, 0, 0, 0),
+                                   max_wait=(None,) * 4, max_queue=(None,) * 4)
+        self.stats = {'pages': 0, 'records': 0, 'duplicates': 0, 'refetched': 0, 'shifted': 0, 'shed': 0}
+        self.lock = threading.Lock()  # _page 在线程池中执行，stats 的更新加锁
+
+    def _page(self, offset):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(HISTORY)
+            try:
+                page = self.fetch(self.client, self.symbol, self.limit, offset)
+            except RateLimitShed as e:
+                with self.lock:
+                    self.stats['shed'] += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = min(0.5 * 2 ** attempt, 5.0)
+                logger.warning(f"{self.name} 历史请求被限频丢弃，{delay} 秒后重试: {e}")
+                time.sleep(delay)
+                continue
+            if not isinstance(page, list):
+                raise Exception(f"{self.name} 获取历史记录(offset {offset})失败: {page}")
+            with self.lock:
+                self.stats['pages'] += 1
+            return page
+
+    def _pages(self, start, last=None):
+        """从 start 开始按顺序产出连续的页，短页(最后一页)后停止
+
+        相邻两页的请求重叠一条记录(步长 limit - 1)。并发请求时后面的页可能先取到，之后最新一端插入的新记录
+        会让列表整体后移，两页之间就会漏掉记录；所以每页都必须包含上一页的最后一条(last)，去掉它和之前的部分，
+        不包含时重新请求。下一页从上一页最后一条现在的位置开始，列表后移后已经预取的页不再对齐，丢弃重新请求。
+        """
+        step = self.limit - 1
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='history') as pool:
+            futures = {}
+            offset = start
+            try:
+                while True:
+                    for o in [o for o in futures if o < offset or (o - offset) % step]:
+                        futures.pop(o).cancel()
+                    for o in range(offset, offset + step * self.concurrency, step):
+                        if o not in futures:
+                            futures[o] = pool.submit(self._page, o)
+                    page = futures.pop(offset).result()
+                    j = -1
+                    if last is not None:
+                        page, offset, j = self._after(page, offset, last)
+                    if page:
+                        last = self.key(page[-1])
+                        offset += len(page) - 1
+                    yield page[j + 1:]
+                    if len(page) < self.limit:
+                        return
+            finally:
+                for f in futures.values():
+                    f.cancel()
+
+    def _after(self, page, offset, last):
+        """找到包含 last 的页，返回 (页, 该页的 offset, last 在页中的下标)，找不到时下标为 -1
+
+        请求时列表已经后移的页包含 last 和之前重复的记录；请求后才后移的页不包含 last，在同一位置重新请求；
+        重新请求仍然没有，说明取两页之间插入的记录超过一页，往后找。
+        """
+        for attempt in range(self.max_retries + 1):
+            keys = [self.key(r) for r in page]
+            if last in keys:
+                j = keys.index(last)
+                if j:
+                    self.stats['shifted'] += 1
+                return page, offset, j
+            if attempt == self.max_retries:
+                break
+            if attempt:
+                offset += self.limit - 1
+            self.stats['refetched'] += 1
+            page = self._page(offset)
+        logger.warning(f"{self.name} offset {offset} 附近找不到上一页的最后一条记录 {last}，可能漏掉记录")
+        return page, offset, -1
+
+    def _walk(self, start, stop, seen, head=None, progress=None, cursor=None):
+        """从 start 开始产出记录，遇到 stop 中的键时返回 (键, 位置)，拉取到最后一页返回 None
+
+        cursor 为 start 前一条记录的键(断点)，用来确认从断点继续时没有漏掉记录。
+        """
+        pages = self._pages(start - 1, cursor) if cursor is not None else self._pages(start)
+        pos = start
+        try:
+            for page in pages:
+                for r in page:
+                    k = self.key(r)
+                    if k in stop:
+                        return k, pos
+                    pos += 1
+                    if k in seen:
+                        self.stats['duplicates'] += 1
+                        continue
+                    seen.add(k)
+                    if head is not None and len(head) < self.limit:
+                        head.append(k)
+                    self.stats['records'] += 1
+                    yield r
+                if progress and page:
+                    progress(pos, self.key(page[-1]))
+            return None
+        finally:
+            pages.close()
+
+    def __iter__(self):
+        state = self.checkpoint.get(self.name)
+        frontier = state.get('frontier') or []
+        resume = state.get('resume')
+        seen, head = set(), []
+        start, cursor, walk_head = 0, None, head
+        if resume:
+            # 先取中断后产生的新记录，直到遇到中断时的 head，据此换算中断处现在的位置
+            hit = yield from self._walk(0, {*frontier, *resume['head']}, seen, head)
+            if hit is None or hit[0] not in resume['head']:
+                self._finish(frontier, head + resume['head'])
+                return
+            key, pos = hit
+            start = pos - resume['head'].index(key) + resume['offset']
+            cursor = resume.get('cursor')
+            head = (head + resume['head'])[:self.limit]
+            walk_head = None
+            self.checkpoint.put(self.name, {'frontier': frontier,
+                                            'resume': {'head': head, 'offset': start, 'cursor': cursor}})
+
+        def progress(offset, last):
+            self.checkpoint.put(self.name, {'frontier': frontier,
+                                            'resume': {'head': head, 'offset': offset, 'cursor': last}})
+
+        yield from self._walk(start, set(frontier), seen, walk_head, progress, cursor)
+        self._finish(frontier, head)
+
+    def _finish(self, frontier, head):
+        self.checkpoint.put(self.name, {'frontier': head[:self.limit] or frontier, 'resume': None})
+        logger.info(f"{self.name} 历史拉取完成: {self.stats}")
+
+
+def stream(client, kind, symbol=None, **kwargs):
+    """HistoryStream 的简写: for fill in stream(client, 'fills', 'SOL_USDC', checkpoint='history.json'): ..."""
+    return iter(HistoryStream(client, kind, symbol, **kwargs))
+
+
+def _serial(client, kind, symbol, limit):
+    """原来的逐页拉取(每次从 offset 0 开始)，仅用于基准对比"""
+    fetch, _ = SOURCES[kind]
+    records, offset = [], 0
+    while True:
+        page = fetch(client, symbol, limit, offset)
+        records += page
+        if len(page) < limit:
+            return records
+        offset += limit
+
+
+if __name__ == '__main__':
+    import base64
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    from bpx.bpx import BpxClient
+    from mock_exchange import MockExchange
+
+    parser = argparse.ArgumentParser(description='历史记录拉取基准测试(本地模拟交易所)')
+    parser.add_argument('--records', type=int, default=5000, help='模拟的成交记录数')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟交易所 REST 延迟(秒)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=200.0, help='每秒最多请求的页数')
+    args = parser.parse_args()
+
+    logger.remove()
+    exchange = MockExchange(latency=args.latency).start()
+    key = ed25519.Ed25519PrivateKey.generate()
+    secret = base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                                serialization.NoEncryption())).decode()
+    exchange.seed_fills(exchange.account_key(secret), 'SOL_USDC', args.records)
+    client = BpxClient()
+    client.init('', secret, url=exchange.url, rate_limit={'rate': 1000, 'burst': 2000})
+    try:
+        start = time.perf_counter()
+        serial = _serial(client, 'fills', 'SOL_USDC', 100)
+        serial_s = time.perf_counter() - start
+
+        checkpoint = Checkpoint()
+        hs = HistoryStream(client, 'fills', 'SOL_USDC', concurrency=args.concurrency, rate=args.rate,
+                           checkpoint=checkpoint)
+        start = time.perf_counter()
+        full = list(hs)
+        full_s = time.perf_counter() - start
+
+        exchange.seed_fills(exchange.account_key(secret), 'SOL_USDC', 250)
+        inc = HistoryStream(client, 'fills', 'SOL_USDC', concurrency=args.concurrency, rate=args.rate,
+                            checkpoint=checkpoint)
+        start = time.perf_counter()
+        new = list(inc)
+        inc_s = time.perf_counter() - start
+    finally:
+        exchange.stop()
+    print(f"逐页拉取: {len(serial)} 条, {serial_s:.2f} 秒")
+    print(f"并发拉取: {len(full)} 条, {full_s:.2f} 秒, {hs.stats}")
+    print(f"增量拉取: {len(new)} 条新记录, {inc_s:.2f} 秒, {inc.stats}")
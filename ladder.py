@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class Ladder:
+    """等比网格的全部价格档位
+
+    从 min_price 开始每档乘以 (1 + gap_percent)，到 max_price 为止，按价格精度取整后去掉重复的档位
+    (价格很低、间距小于一个 tick 时相邻档位会取整到同一个价格)。档位只在创建时用 numpy 计算一次，
+    之后按下标取价，成交后挂单窗口只需要移动一档。
+    """
+
+    def __init__(self, min_price, max_price, gap_percent, price_precision):
+        if not 0 < min_price < max_price or gap_percent <= 0:
+            raise Exception(f"网格参数错误: {min_price} ~ {max_price}, gap_percent={gap_percent}")
+        n = int(np.floor(np.log(max_price / min_price) / np.log1p(gap_percent))) + 1
+        prices = np.round(min_price * np.exp(np.arange(n) * np.log1p(gap_percent)), price_precision)
+        prices = np.unique(prices)
+        self.prices = prices[(prices >= min_price) & (prices <= max_price)]
+        self.price_precision = price_precision
+
+    def __len__(self):
+        return len(self.prices)
+
+    def price(self, index):
+        return float(self.prices[index])
+
+    def nearest(self, price):
+        """离 price 最近的档位下标"""
+        i = int(np.searchsorted(self.prices, price))
+        if i == 0:
+            return 0
+        if i == len(self.prices):
+            return i - 1
+        return i if self.prices[i] - price < price - self.prices[i - 1] else i - 1
+
+    def window(self, center, levels):
+        """以 center 档为中心(该档不挂单)，返回下方 levels 个买单档位和上方 levels 个卖单档位，超出网格的不挂
+
+        Returns:
+            (range, range): 买单档位下标(由近到远), 卖单档位下标(由近到远)
+        """
+        return range(center - 1, max(center - 1 - levels, -1), -1), range(center + 1, min(center + 1 + levels, len(self.prices)))
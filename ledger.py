@@ -0,0 +1,182 @@
+import time
+import threading
+from loguru import logger
+
+from bpx.ratelimit import RateLimitShed
+from bpx.events import decode_data, OrderEvent
+
+
+class BalanceLedger:
+    """本地余额账本
+
+    启动时从 /api/v1/capital 同步一次余额，之后根据下单结果和 account.orderUpdate 推送
+    (orderAccepted / orderFill / orderCancelled / orderExpired) 在本地增减可用和冻结余额，
+    下单前的余额检查直接读内存，不再请求 REST。
+    余额出现异常(负数、收到未知订单的成交等)时标记为过期，下一次检查时重新同步；
+    也可以用 start_auto_sync 在后台定期对账。
+    """
+
+    EPSILON = 1e-9
+
+    def __init__(self, client, sync_interval=60):
+        self.client = client
+        self.sync_interval = sync_interval  # 后台定期对账间隔，单位秒
+        self.available = {}  # 资产 -> 可用余额
+        self.locked = {}  # 资产 -> 冻结余额
+        self.orders = {}  # 订单id -> 本地冻结信息
+        self.stale = True
+        self.last_sync = 0
+        self.lock = threading.RLock()
+        self._sync_thread = None
+
+    def sync(self):
+        """从 REST 重新同步余额"""
+        b = self.client.balances()
+        if not b:
+            logger.error("余额同步失败")
+            return False
+        with self.lock:
+            self.available = {k: float(v.get('available', 0.0)) for k, v in b.items()}
+            self.locked = {k: float(v.get('locked', 0.0)) for k, v in b.items()}
+            self.stale = False
+            self.last_sync = time.time()
+        return True
+
+    def start_auto_sync(self):
+        """启动后台对账线程"""
+        if self._sync_thread:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.sync_interval)
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"余额对账异常: {e}")
+
+        self._sync_thread = threading.Thread(target=run, daemon=True)
+        self._sync_thread.start()
+
+    def mark_stale(self):
+        self.stale = True
+
+    def get_pair(self, symbol):
+        """返回交易对 (基础币可用, 计价币可用)"""
+        if self.stale:
+            try:
+                self.sync()
+            except RateLimitShed as e:
+                logger.warning(f"余额对账被限频丢弃，使用本地余额: {e}")
+        base, quote = symbol.split('_')
+        with self.lock:
+            return self.available.get(base, 0.0), self.available.get(quote, 0.0)
+
+    def has_funds(self, symbol, side, quantity, price):
+        """检查下单余额是否充足，本地余额不足时先与 REST 对账一次再判断，避免误拒单"""
+        for attempt in range(2):
+            b1, b2 = self.get_pair(symbol)
+            if side == 'Ask' and b1 + self.EPSILON >= quantity:
+                return True
+            if side == 'Bid' and b2 + self.EPSILON >= quantity * price:
+                return True
+            if attempt == 0:
+                self.mark_stale()
+        return False
+
+    def _add(self, book, asset, amount):
+        book[asset] = book.get(asset, 0.0) + amount
+        if book[asset] < -self.EPSILON:
+            logger.warning(f"本地余额出现负数 {asset}: {book[asset]}，等待重新对账")
+            self.stale = True
+
+    def reserve(self, order):
+        """冻结新订单占用的余额，order 为 ExeOrder 返回的订单信息"""
+        order_id = order.get('id')
+        if not order_id:
+            return
+        with self.lock:
+            if order_id in self.orders:
+                return
+            base, quote = order['symbol'].split('_')
+            price = float(order['price'])
+            remaining = float(order['quantity']) - float(order.get('executedQuantity') or 0)
+            self.orders[order_id] = {'symbol': order['symbol'], 'side': order['side'],
+                                     'price': price, 'remaining': remaining}
+            if order['side'] == 'Bid':
+                self._add(self.available, quote, -remaining * price)
+                self._add(self.locked, quote, remaining * price)
+            else:
+                self._add(self.available, base, -remaining)
+                self._add(self.locked, base, remaining)
+
+    def release(self, order_id):
+        """订单取消或过期，解冻剩余部分"""
+        with self.lock:
+            o = self.orders.pop(order_id, None)
+            if not o:
+                return
+            base, quote = o['symbol'].split('_')
+            if o['side'] == 'Bid':
+                self._add(self.locked, quote, -o['remaining'] * o['price'])
+                self._add(self.available, quote, o['remaining'] * o['price'])
+            else:
+                self._add(self.locked, base, -o['remaining'])
+                self._add(self.available, base, o['remaining'])
+
+    def forget(self, order_id):
+        """不再跟踪订单(REST 轮询发现已成交时使用，余额以下一次对账为准)"""
+        with self.lock:
+            self.orders.pop(order_id, None)
+
+    def fill(self, order_id, symbol, side, fill_qty, fill_price, fee=0.0, fee_asset=None):
+        """订单成交，扣减冻结并增加对手币种余额"""
+        base, quote = symbol.split('_')
+        with self.lock:
+            o = self.orders.get(order_id)
+            if o is None:
+                # 下单响应还没回来就收到了成交，直接从可用余额中扣，随后对账
+                logger.warning(f"收到未知订单 {order_id} 的成交，等待重新对账")
+                self.stale = True
+                if side == 'Bid':
+                    self._add(self.available, quote, -fill_qty * fill_price)
+                else:
+                    self._add(self.available, base, -fill_qty)
+            else:
+                o['remaining'] -= fill_qty
+                if side == 'Bid':
+                    self._add(self.locked, quote, -fill_qty * o['price'])
+                    # 成交价优于挂单价的部分退回可用
+                    self._add(self.available, quote, fill_qty * (o['price'] - fill_price))
+                else:
+                    self._add(self.locked, base, -fill_qty)
+                if o['remaining'] <= self.EPSILON:
+                    self.orders.pop(order_id, None)
+            if side == 'Bid':
+                self._add(self.available, base, fill_qty)
+            else:
+                self._add(self.available, quote, fill_qty * fill_price)
+            if fee and fee_asset:
+                self._add(self.available, fee_asset, -fee)
+
+    def on_order_update(self, data):
+        """处理 account.orderUpdate 推送(bpx.events 解码的订单事件，原始字典会先解码)"""
+        if isinstance(data, dict):
+            data = decode_data(data)
+        if not isinstance(data, OrderEvent):
+            return
+        event = data.event
+        if event == 'orderAccepted':
+            self.reserve({
+                'id': data.order_id,
+                'symbol': data.symbol,
+                'side': data.side,
+                'price': data.price,
+                'quantity': data.quantity,
+                'executedQuantity': data.executed_quantity,
+            })
+        elif event == 'orderFill':
+            self.fill(data.order_id, data.symbol, data.side, data.fill_quantity, data.fill_price,
+                      data.fee or 0.0, data.fee_symbol)
+        elif event in ('orderCancelled', 'orderExpired'):
+            self.release(data.order_id)
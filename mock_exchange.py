@@ -0,0 +1,852 @@
+import json
+import time
+import queue
+import base64
+import random
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+from bisect import bisect_left
+from collections import deque
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.exceptions import InvalidSignature
+from loguru import logger
+
+# (请求方法, 路径) -> 签名指令
+INSTRUCTIONS = {
+    ('GET', 'api/v1/capital'): 'balanceQuery',
+    ('POST', 'api/v1/order'): 'orderExecute',
+    ('GET', 'api/v1/order'): 'orderQuery',
+    ('DELETE', 'api/v1/order'): 'orderCancel',
+    ('GET', 'api/v1/orders'): 'orderQueryAll',
+    ('POST', 'api/v1/orders'): 'orderExecute',
+    ('DELETE', 'api/v1/orders'): 'orderCancelAll',
+    ('GET', 'wapi/v1/history/orders'): 'orderHistoryQueryAll',
+    ('GET', 'wapi/v1/history/fills'): 'fillHistoryQueryAll',
+}
+
+MARKET_MAKER = '__market_maker__'  # 内置做市/吃单账户，用于铺深度和制造成交
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _fmt(x):
+    return f'{x:.10f}'.rstrip('0').rstrip('.') if x else '0'
+
+
+def _now_us():
+    return int(time.time() * 1_000_000)
+
+
+def verify_signature(headers, instruction, params, max_window=60000):
+    """按 Backpack 的规则校验 ed25519 签名，返回调用方的公钥(base64)"""
+    api_key, signature = headers.get('X-API-KEY'), headers.get('X-SIGNATURE')
+    timestamp, window = headers.get('X-TIMESTAMP'), headers.get('X-WINDOW') or '5000'
+    if not api_key or not signature or not timestamp:
+        raise ApiError(401, 'UNAUTHORIZED', 'Missing signature headers')
+    if abs(int(time.time() * 1000) - int(timestamp)) > min(int(window), max_window):
+        raise ApiError(401, 'INVALID_CLIENT_REQUEST', 'Request has expired')
+    if isinstance(params, list):
+        parts = [urlencode({'instruction': instruction, **dict(sorted(p.items()))}) for p in params]
+    else:
+        parts = [urlencode({'instruction': instruction, **dict(sorted((params or {}).items()))})]
+    message = '&'.join(parts) + '&' + urlencode({'timestamp': timestamp, 'window': window})
+    try:
+        key = ed25519.Ed25519PublicKey.from_public_bytes(base64.b64decode(api_key))
+        key.verify(base64.b64decode(signature), message.encode())
+    except (InvalidSignature, ValueError) as e:
+        raise ApiError(401, 'INVALID_SIGNATURE', f'Invalid signature: {e}')
+    return api_key
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Book:
+    """单个交易对的订单簿，价格优先、时间优先"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bid_prices = []  # 升序
+        self.ask_prices = []  # 升序
+        self.levels = {'Bid': {}, 'Ask': {}}  # 价格 -> deque[订单]
+        self.update_id = 0
+
+    def prices(self, side):
+        return self.bid_prices if side == 'Bid' else self.ask_prices
+
+    def add(self, order):
+        side, price = order['side'], order['_price']
+        level = self.levels[side].get(price)
+        if level is None:
+            level = self.levels[side][price] = deque()
+            prices = self.prices(side)
+            prices.insert(bisect_left(prices, price), price)
+        level.append(order)
+
+    def remove(self, order):
+        side, price = order['side'], order['_price']
+        level = self.levels[side].get(price)
+        if level is None:
+            return
+        try:
+            level.remove(order)
+        except ValueError:
+            return
+        if not level:
+            self._drop_level(side, price)
+
+    def _drop_level(self, side, price):
+        del self.levels[side][price]
+        prices = self.prices(side)
+        del prices[bisect_left(prices, price)]
+
+    def best(self, side):
+        prices = self.prices(side)
+        if not prices:
+            return None
+        return prices[-1] if side == 'Bid' else prices[0]
+
+    def level_qty(self, side, price):
+        level = self.levels[side].get(price)
+        return sum(o['_remaining'] for o in level) if level else 0.0
+
+    def snapshot(self, limit=1000):
+        return {
+            'asks': [[_fmt(p), _fmt(self.level_qty('Ask', p))] for p in self.ask_prices[:limit]],
+            'bids': [[_fmt(p), _fmt(self.level_qty('Bid', p))] for p in self.bid_prices[-limit:]],
+            'lastUpdateId': str(self.update_id),
+        }
+
+
+class MockExchange:
+    """本地模拟 Backpack 交易所
+
+    - REST: capital、order、orders、history、depth、status、ping、time、ticker
+    - WS: depth.<symbol>、trade.<symbol>、account.orderUpdate[.<symbol>]，订阅私有频道需要签名
+    - 所有签名按交易所规则用 ed25519 校验
+    - 可配置 REST 延迟(latency + 随机 jitter)、并发处理上限(max_inflight)、每个 API Key 的限频(rate_limit/秒)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, ws_port=0, latency=0.0, jitter=0.0, ws_latency=0.0,
+                 max_inflight=64, rate_limit=None, rate_burst=None, fee_rate=0.0,
+                 default_balances=None):
+        self.host = host
+        self.latency = latency
+        self.jitter = jitter
+        self.ws_latency = ws_latency
+        self.fee_rate = fee_rate
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst or (rate_limit * 2 if rate_limit else None)
+        self.default_balances = default_balances or {'SOL': 1000.0, 'USDC': 100000.0}
+        self.inflight = threading.BoundedSemaphore(max_inflight)
+        self.lock = threading.RLock()
+        self.books = {}
+        self.accounts = {}  # api_key -> {asset: [available, locked]}
+        self.open_orders = {}  # 订单id -> 订单
+        self.history = {}  # api_key -> [订单] 最新在后
+        self.fills = {}  # api_key -> [成交]
+        self.buckets = {}
+        self.next_order_id = 1
+        self.next_trade_id = 1
+        self.stats = {'requests': 0, 'rejected_rate_limit': 0, 'rejected_signature': 0, 'faults': 0, 'depth_gaps': 0, 'ws_drops': 0}
+        self.faults = []  # inject_fault 注入的故障
+        self.ws_clients = set()
+
+        handler = type('Handler', (_RestHandler,), {'exchange': self})
+        self.http = ThreadingHTTPServer((host, port), handler)
+        self.http.daemon_threads = True
+        self.ws = _WsServer(self, host, ws_port)
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.http.server_address[1]}/'
+
+    @property
+    def stream_url(self):
+        return f'ws://{self.host}:{self.ws.port}/'
+
+    def start(self):
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.ws.start()
+        logger.info(f"模拟交易所已启动 REST: {self.url} WS: {self.stream_url}")
+        return self
+
+    def stop(self):
+        self.http.shutdown()
+        self.http.server_close()
+        self.ws.stop()
+
+    # 账户
+    def account(self, api_key):
+        acct = self.accounts.get(api_key)
+        if acct is None:
+            acct = self.accounts[api_key] = {k: [float(v), 0.0] for k, v in self.default_balances.items()}
+            self.history[api_key] = []
+            self.fills[api_key] = []
+        return acct
+
+    @staticmethod
+    def account_key(api_secret):
+        """由 API Secret 算出账户的 API Key(公钥 base64)，用于在测试中预先设置余额"""
+        key = ed25519.Ed25519PrivateKey.from_private_bytes(base64.b64decode(api_secret))
+        return base64.b64encode(key.public_key().public_bytes_raw()).decode()
+
+    def set_balance(self, api_key, asset, available):
+        with self.lock:
+            self.account(api_key)[asset] = [float(available), 0.0]
+
+    def seed_fills(self, api_key, symbol, count, price=130.0):
+        """直接写入 count 条成交历史(不经过撮合)，用于测试历史拉取"""
+        with self.lock:
+            self.account(api_key)
+            fills = self.fills[api_key]
+            for _ in range(count):
+                trade_id = self.next_trade_id
+                self.next_trade_id += 1
+                fills.append({
+                    'clientId': None, 'fee': '0', 'feeSymbol': symbol.split('_')[1], 'isMaker': True,
+                    'orderId': str(self.next_order_id), 'price': _fmt(price), 'quantity': '0.1',
+                    'side': 'Bid' if trade_id % 2 else 'Ask', 'symbol': symbol,
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()), 'tradeId': trade_id,
+                })
+                self.next_order_id += 1
+
+    def check_rate_limit(self, api_key):
+        if not self.rate_limit:
+            return
+        bucket = self.buckets.get(api_key)
+        if bucket is None:
+            bucket = self.buckets[api_key] = TokenBucket(self.rate_limit, self.rate_burst)
+        if not bucket.take():
+            self.stats['rejected_rate_limit'] += 1
+            raise ApiError(429, 'TOO_MANY_REQUESTS', 'Rate limit exceeded')
+
+    def book(self, symbol):
+        b = self.books.get(symbol)
+        if b is None:
+            b = self.books[symbol] = Book(symbol)
+        return b
+
+    # 下单撮合
+    def execute(self, api_key, params):
+        with self.lock:
+            order = self.new_order(api_key, params)
+            book = self.book(order['symbol'])
+            changed = self.match(book, order)
+            if order['_remaining'] > 1e-12 and order['orderType'] == 'Limit' and order['timeInForce'] == 'GTC':
+                book.add(order)
+                self.open_orders[order['id']] = order
+                changed.add((order['side'], order['_price']))
+            elif order['_remaining'] > 1e-12:
+                self.finish(order, 'Cancelled' if order['_executed'] == 0 else 'Expired')
+                self.order_event('orderCancelled' if order['status'] == 'Cancelled' else 'orderExpired', order)
+            self.publish_depth(book, changed)
+            return self.public(order)
+
+    def new_order(self, api_key, params):
+        """校验参数、冻结资金并登记订单(推送 orderAccepted)，不撮合"""
+        symbol, side = params.get('symbol'), params.get('side')
+        order_type = params.get('orderType', 'Limit')
+        if side not in ('Bid', 'Ask') or not symbol or '_' not in symbol:
+            raise ApiError(400, 'INVALID_ORDER', 'Invalid side or symbol')
+        try:
+            qty = float(params['quantity'])
+            price = float(params['price']) if order_type == 'Limit' else None
+        except (KeyError, TypeError, ValueError):
+            raise ApiError(400, 'INVALID_ORDER', 'Invalid quantity or price')
+        base, quote = symbol.split('_')
+        with self.lock:
+            acct = self.account(api_key)
+            book = self.book(symbol)
+            # 冻结: 限价买单冻结 qty * price 计价币，卖单冻结 qty 基础币，市价买单按对手盘估算
+            if side == 'Bid':
+                cost = qty * (price if price is not None else (book.best('Ask') or 0) * 1.05)
+                if acct.setdefault(quote, [0.0, 0.0])[0] + 1e-9 < cost:
+                    raise ApiError(400, 'INSUFFICIENT_FUNDS', 'Insufficient funds')
+                acct[quote][0] -= cost
+                acct[quote][1] += cost
+            else:
+                if acct.setdefault(base, [0.0, 0.0])[0] + 1e-9 < qty:
+                    raise ApiError(400, 'INSUFFICIENT_FUNDS', 'Insufficient funds')
+                acct[base][0] -= qty
+                acct[base][1] += qty
+                cost = qty
+            order = {
+                'clientId': params.get('clientId'),
+                'createdAt': int(time.time() * 1000),
+                'executedQuantity': '0',
+                'executedQuoteQuantity': '0',
+                'id': str(self.next_order_id),
+                'orderType': order_type,
+                'postOnly': bool(params.get('postOnly', False)),
+                'price': _fmt(price) if price is not None else None,
+                'quantity': _fmt(qty),
+                'selfTradePrevention': 'RejectTaker',
+                'side': side,
+                'status': 'New',
+                'symbol': symbol,
+                'timeInForce': params.get('timeInForce', 'GTC'),
+                'triggerPrice': None,
+                '_owner': api_key,
+                '_price': price,
+                '_remaining': qty,
+                '_reserved': cost,
+                '_executed': 0.0,
+                '_executed_quote': 0.0,
+            }
+            self.next_order_id += 1
+            self.history[api_key].append(order)
+            self.order_event('orderAccepted', order)
+            return order
+
+    def match(self, book, taker):
+        """撮合，返回变化的档位集合"""
+        changed = set()
+        maker_side = 'Ask' if taker['side'] == 'Bid' else 'Bid'
+        while taker['_remaining'] > 1e-12:
+            best = book.best(maker_side)
+            if best is None:
+                break
+            if taker['_price'] is not None and (
+                    (taker['side'] == 'Bid' and best > taker['_price']) or
+                    (taker['side'] == 'Ask' and best < taker['_price'])):
+                break
+            level = book.levels[maker_side][best]
+            maker = level[0]
+            qty = min(taker['_remaining'], maker['_remaining'])
+            self.trade(book.symbol, maker, taker, best, qty)
+            changed.add((maker_side, best))
+            if maker['_remaining'] <= 1e-12:
+                level.popleft()
+                self.open_orders.pop(maker['id'], None)
+                if not level:
+                    book._drop_level(maker_side, best)
+        return changed
+
+    def trade(self, symbol, maker, taker, price, qty):
+        base, quote = symbol.split('_')
+        trade_id = self.next_trade_id
+        self.next_trade_id += 1
+        for order, is_maker in ((maker, True), (taker, False)):
+            acct = self.account(order['_owner'])
+            fee = qty * price * self.fee_rate if order['side'] == 'Ask' else qty * self.fee_rate
+            fee_asset = quote if order['side'] == 'Ask' else base
+            if order['side'] == 'Bid':
+                limit = order['_price'] if order['_price'] is not None else order['_reserved'] / max(
+                    float(order['quantity']), 1e-12)
+                release = min(qty * limit, order['_reserved'])
+                order['_reserved'] -= release
+                acct[quote][1] -= release
+                acct[quote][0] += release - qty * price
+                acct.setdefault(base, [0.0, 0.0])[0] += qty - fee
+            else:
+                order['_reserved'] -= qty
+                acct[base][1] -= qty
+                acct.setdefault(quote, [0.0, 0.0])[0] += qty * price - fee
+            order['_remaining'] -= qty
+            order['_executed'] += qty
+            order['_executed_quote'] += qty * price
+            order['executedQuantity'] = _fmt(order['_executed'])
+            order['executedQuoteQuantity'] = _fmt(order['_executed_quote'])
+            done = order['_remaining'] <= 1e-12
+            if done:
+                self.finish(order, 'Filled')
+            else:
+                order['status'] = 'PartiallyFilled'
+            self.fills[order['_owner']].append({
+                'clientId': order['clientId'], 'fee': _fmt(fee), 'feeSymbol': fee_asset, 'isMaker': is_maker,
+                'orderId': order['id'], 'price': _fmt(price), 'quantity': _fmt(qty), 'side': order['side'],
+                'symbol': symbol, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+                'tradeId': trade_id,
+            })
+            self.order_event('orderFill', order, fill_qty=qty, fill_price=price, is_maker=is_maker,
+                             fee=fee, fee_asset=fee_asset, trade_id=trade_id)
+        self.publish(f'trade.{symbol}', {
+            'e': 'trade', 'E': _now_us(), 's': symbol, 'p': _fmt(price), 'q': _fmt(qty),
+            'b': maker['id'] if maker['side'] == 'Bid' else taker['id'],
+            'a': maker['id'] if maker['side'] == 'Ask' else taker['id'],
+            't': trade_id, 'T': _now_us(), 'm': maker['side'] == 'Bid',
+        })
+
+    def finish(self, order, status):
+        order['status'] = status
+        # 解冻剩余冻结
+        if order['_reserved'] > 1e-12:
+            base, quote = order['symbol'].split('_')
+            asset = quote if order['side'] == 'Bid' else base
+            acct = self.account(order['_owner'])
+            acct[asset][1] -= order['_reserved']
+            acct[asset][0] += order['_reserved']
+            order['_reserved'] = 0.0
+
+    def cancel(self, api_key, symbol, order_id=None, client_id=None):
+        with self.lock:
+            order = self.find_open(api_key, symbol, order_id, client_id)
+            if order is None:
+                raise ApiError(404, 'RESOURCE_NOT_FOUND', 'Order not found')
+            book = self.book(symbol)
+            book.remove(order)
+            self.open_orders.pop(order['id'], None)
+            self.finish(order, 'Cancelled')
+            self.order_event('orderCancelled', order)
+            self.publish_depth(book, {(order['side'], order['_price'])})
+            return self.public(order)
+
+    def cancel_all(self, api_key, symbol):
+        with self.lock:
+            orders = [o for o in self.open_orders.values() if o['_owner'] == api_key and o['symbol'] == symbol]
+            return [self.cancel(api_key, symbol, o['id']) for o in orders]
+
+    def find_open(self, api_key, symbol, order_id=None, client_id=None):
+        if order_id is not None:
+            o = self.open_orders.get(str(order_id))
+            return o if o and o['_owner'] == api_key and (not symbol or o['symbol'] == symbol) else None
+        if client_id is not None:
+            for o in self.open_orders.values():
+                if o['_owner'] == api_key and str(o['clientId']) == str(client_id) and (not symbol or o['symbol'] == symbol):
+                    return o
+        return None
+
+    @staticmethod
+    def public(order):
+        return {k: v for k, v in order.items() if not k.startswith('_')}
+
+    # 内置账户: 铺深度、吃单
+    def seed_book(self, symbol, mid, levels=20, tick=0.01, qty=10.0):
+        """以 mid 为中心在两边各挂 levels 档做市单"""
+        self.fund_market_maker(symbol)
+        for i in range(1, levels + 1):
+            self.execute(MARKET_MAKER, {'symbol': symbol, 'side': 'Bid', 'orderType': 'Limit',
+                                        'quantity': qty, 'price': round(mid - i * tick, 10)})
+            self.execute(MARKET_MAKER, {'symbol': symbol, 'side': 'Ask', 'orderType': 'Limit',
+                                        'quantity': qty, 'price': round(mid + i * tick, 10)})
+
+    def fund_market_maker(self, symbol):
+        base, quote = symbol.split('_')
+        with self.lock:
+            acct = self.account(MARKET_MAKER)
+            for asset, amount in ((base, 1e12), (quote, 1e15)):
+                balance = acct.setdefault(asset, [0.0, 0.0])
+                balance[0] = max(balance[0], amount)
+
+    def take(self, symbol, side, quantity, price=None):
+        """内置账户主动吃单(IOC)，用于制造成交。price 为空时为市价单"""
+        self.fund_market_maker(symbol)
+        params = {'symbol': symbol, 'side': side, 'quantity': quantity, 'timeInForce': 'IOC',
+                  'orderType': 'Limit' if price is not None else 'Market'}
+        if price is not None:
+            params['price'] = price
+        return self.execute(MARKET_MAKER, params)
+
+    def fill_order(self, order_id, quantity=None):
+        """内置账户直接与指定挂单成交(不按价格优先)，用于基准测试中精确地制造成交而不扫掉其他档位"""
+        with self.lock:
+            maker = self.open_orders.get(str(order_id))
+            if maker is None:
+                raise ApiError(404, 'RESOURCE_NOT_FOUND', 'Order not found')
+            symbol, price = maker['symbol'], maker['_price']
+            qty = min(quantity or maker['_remaining'], maker['_remaining'])
+            self.fund_market_maker(symbol)
+            taker = self.new_order(MARKET_MAKER, {'symbol': symbol, 'side': 'Ask' if maker['side'] == 'Bid' else 'Bid',
+                                                  'orderType': 'Limit', 'timeInForce': 'IOC', 'quantity': qty,
+                                                  'price': price})
+            book = self.book(symbol)
+            self.trade(symbol, maker, taker, price, qty)
+            if maker['_remaining'] <= 1e-12:
+                book.remove(maker)
+                self.open_orders.pop(maker['id'], None)
+            self.publish_depth(book, {(maker['side'], price)})
+            return self.public(taker)
+
+    # 推送
+    def publish(self, stream, data, account=None):
+        message = json.dumps({'stream': stream, 'data': data})
+        for client in list(self.ws_clients):
+            if client.wants(stream, account):
+                client.send_text(message)
+
+    def publish_depth(self, book, changed):
+        if not changed:
+            return
+        bids = [[_fmt(p), _fmt(book.level_qty('Bid', p))] for s, p in changed if s == 'Bid' and p is not None]
+        asks = [[_fmt(p), _fmt(book.level_qty('Ask', p))] for s, p in changed if s == 'Ask' and p is not None]
+        first = book.update_id + 1
+        book.update_id += 1
+        self.publish(f'depth.{book.symbol}', {
+            'e': 'depth', 'E': _now_us(), 's': book.symbol, 'a': asks, 'b': bids,
+            'U': first, 'u': book.update_id, 'T': _now_us(),
+        })
+
+    def order_event(self, event, order, fill_qty=None, fill_price=None, is_maker=None, fee=None,
+                    fee_asset=None, trade_id=None):
+        data = {
+            'e': event, 'E': _now_us(), 's': order['symbol'], 'c': order['clientId'], 'S': order['side'],
+            'o': order['orderType'], 'f': order['timeInForce'], 'q': order['quantity'], 'p': order['price'],
+            'X': order['status'], 'i': order['id'], 'z': order['executedQuantity'],
+            'Z': order['executedQuoteQuantity'], 'T': _now_us(),
+        }
+        if event == 'orderFill':
+            data.update({'l': _fmt(fill_qty), 'L': _fmt(fill_price), 'm': is_maker, 'n': _fmt(fee),
+                         'N': fee_asset, 't': trade_id})
+        self.publish(f"account.orderUpdate.{order['symbol']}", data, account=order['_owner'])
+
+    def inject_fault(self, path, status=503, count=1, after=False, method=None):
+        """让接下来 count 个 path 请求返回 status
+
+        after=True 时先正常处理再返回错误，模拟请求已经生效但响应丢失(网关超时等)
+        """
+        with self.lock:
+            self.faults.append({'path': path, 'method': method, 'status': status, 'count': count, 'after': after})
+
+    def drop_connections(self):
+        """断开所有 websocket 连接(模拟网络中断)，客户端需要重连并重新订阅"""
+        for client in list(self.ws_clients):
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+        self.stats['ws_drops'] += 1
+
+    def inject_depth_gap(self, symbol, count=1):
+        """跳过 count 个深度更新 id 不推送，客户端下一条增量会出现缺口"""
+        with self.lock:
+            self.book(symbol).update_id += count
+            self.stats['depth_gaps'] += 1
+
+    def _take_fault(self, method, path):
+        with self.lock:
+            for f in self.faults:
+                if f['count'] > 0 and f['path'] == path and f['method'] in (None, method):
+                    f['count'] -= 1
+                    self.stats['faults'] += 1
+                    return f
+        return None
+
+    # REST 路由
+    def handle(self, method, path, query, body, headers):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.random() * self.jitter)
+        self.stats['requests'] += 1
+        fault = self._take_fault(method, path) if self.faults else None
+        if fault and not fault['after']:
+            raise ApiError(fault['status'], 'SERVICE_UNAVAILABLE', 'Injected fault')
+        result = self.route(method, path, query, body, headers)
+        if fault:
+            raise ApiError(fault['status'], 'SERVICE_UNAVAILABLE', 'Injected fault after execution')
+        return result
+
+    def route(self, method, path, query, body, headers):
+        params = {k: v[-1] for k, v in query.items()}
+        # 公共接口
+        if method == 'GET':
+            if path == 'api/v1/status':
+                return {'status': 'Ok', 'message': None}
+            if path == 'api/v1/ping':
+                return 'pong'
+            if path == 'api/v1/time':
+                return str(int(time.time() * 1000))
+            if path == 'api/v1/depth':
+                with self.lock:
+                    return self.book(params.get('symbol')).snapshot()
+            if path == 'api/v1/ticker':
+                with self.lock:
+                    book = self.book(params.get('symbol'))
+                    return {'symbol': book.symbol, 'lastPrice': _fmt(book.best('Bid') or 0),
+                            'firstPrice': '0', 'high': '0', 'low': '0', 'volume': '0', 'quoteVolume': '0', 'trades': 0}
+
+        instruction = INSTRUCTIONS.get((method, path))
+        if instruction is None:
+            raise ApiError(404, 'NOT_FOUND', f'{method} /{path}')
+        signed = body if method in ('POST', 'DELETE') else params
+        try:
+            api_key = verify_signature(headers, instruction, signed)
+        except ApiError:
+            self.stats['rejected_signature'] += 1
+            raise
+        self.check_rate_limit(api_key)
+        with self.lock:
+            self.account(api_key)
+
+        if path == 'api/v1/capital':
+            with self.lock:
+                return {a: {'available': _fmt(v[0]), 'locked': _fmt(v[1]), 'staked': '0'}
+                        for a, v in self.account(api_key).items()}
+        if path == 'api/v1/order':
+            if method == 'POST':
+                return self.execute(api_key, body)
+            if method == 'GET':
+                with self.lock:
+                    o = self.find_open(api_key, params.get('symbol'), params.get('orderId'), params.get('clientId'))
+                if o is None:
+                    raise ApiError(404, 'RESOURCE_NOT_FOUND', 'Order not found')
+                return self.public(o)
+            return self.cancel(api_key, body.get('symbol'), body.get('orderId'), body.get('clientId'))
+        if path == 'api/v1/orders':
+            if method == 'POST':
+                results = []
+                for p in body:
+                    try:
+                        results.append(self.execute(api_key, p))
+                    except ApiError as e:
+                        results.append({'code': e.code, 'message': e.message})
+                return results
+            if method == 'GET':
+                with self.lock:
+                    return [self.public(o) for o in self.open_orders.values()
+                            if o['_owner'] == api_key and (not params.get('symbol') or o['symbol'] == params['symbol'])]
+            return self.cancel_all(api_key, body.get('symbol'))
+        limit, offset = int(params.get('limit', 100)), int(params.get('offset', 0))
+        symbol = params.get('symbol')
+        with self.lock:
+            rows = self.history[api_key] if path == 'wapi/v1/history/orders' else self.fills[api_key]
+            rows = [r for r in reversed(rows) if not symbol or r['symbol'] == symbol][offset:offset + limit]
+            return [self.public(r) for r in rows]
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写，不关 Nagle 会叠加 40ms 的延迟确认
+    exchange = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+            with self.exchange.inflight:
+                result = self.exchange.handle(method, url.path.lstrip('/'), parse_qs(url.query), body, self.headers)
+            status = 200
+        except ApiError as e:
+            status, result = e.status, {'code': e.code, 'message': e.message}
+        except json.JSONDecodeError:
+            status, result = 400, {'code': 'INVALID_CLIENT_REQUEST', 'message': 'Invalid JSON body'}
+        except Exception as e:
+            logger.exception(e)
+            status, result = 500, {'code': 'INTERNAL_ERROR', 'message': str(e)}
+        data = (result if isinstance(result, str) else json.dumps(result)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain' if isinstance(result, str) else 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class _WsClient:
+    """一个 websocket 连接，发送走独立的写线程"""
+
+    def __init__(self, exchange, sock):
+        self.exchange = exchange
+        self.sock = sock
+        self.streams = set()
+        self.account = None
+        self.outbox = queue.Queue()
+        self.alive = True
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def wants(self, stream, account):
+        if account is not None:
+            if account != self.account:
+                return False
+            return stream in self.streams or 'account.orderUpdate' in self.streams
+        return stream in self.streams
+
+    def send_text(self, text):
+        if self.alive:
+            self.outbox.put((0x1, text.encode()))
+
+    def send_frame(self, opcode, payload):
+        if self.alive:
+            self.outbox.put((opcode, payload))
+
+    def _writer(self):
+        while self.alive:
+            opcode, payload = self.outbox.get()
+            if opcode is None:
+                break
+            if self.exchange.ws_latency:
+                time.sleep(self.exchange.ws_latency)
+            header = bytes([0x80 | opcode])
+            n = len(payload)
+            if n < 126:
+                header += bytes([n])
+            elif n < 65536:
+                header += bytes([126]) + struct.pack('!H', n)
+            else:
+                header += bytes([127]) + struct.pack('!Q', n)
+            try:
+                self.sock.sendall(header + payload)
+            except OSError:
+                self.close()
+
+    def _recv_exact(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('closed')
+            data += chunk
+        return data
+
+    def serve(self):
+        try:
+            while self.alive:
+                b1, b2 = self._recv_exact(2)
+                opcode, masked, n = b1 & 0x0F, b2 & 0x80, b2 & 0x7F
+                if n == 126:
+                    n = struct.unpack('!H', self._recv_exact(2))[0]
+                elif n == 127:
+                    n = struct.unpack('!Q', self._recv_exact(8))[0]
+                mask = self._recv_exact(4) if masked else b'\0\0\0\0'
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(n)))
+                if opcode == 0x8:
+                    self.send_frame(0x8, payload[:2])
+                    break
+                if opcode == 0x9:
+                    self.send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    self.on_text(payload.decode())
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+
+    def on_text(self, text):
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        params = message.get('params') or []
+        if message.get('method') == 'SUBSCRIBE':
+            if any(p.startswith('account.') for p in params):
+                sig = message.get('signature') or []
+                try:
+                    headers = {'X-API-KEY': sig[0], 'X-SIGNATURE': sig[1], 'X-TIMESTAMP': sig[2], 'X-WINDOW': sig[3]}
+                    self.account = verify_signature(headers, 'subscribe', {})
+                except (ApiError, IndexError) as e:
+                    self.send_text(json.dumps({'error': {'code': 4006, 'message': str(e)}}))
+                    return
+            self.streams.update(params)
+        elif message.get('method') == 'UNSUBSCRIBE':
+            self.streams.difference_update(params)
+
+    def close(self):
+        if not self.alive:
+            return
+        self.alive = False
+        self.outbox.put((None, None))
+        self.exchange.ws_clients.discard(self)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _WsServer(threading.Thread):
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, exchange, host, port):
+        threading.Thread.__init__(self, daemon=True)
+        self.exchange = exchange
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                conn.close()
+                return
+            request += chunk
+        key = ''
+        for line in request.decode(errors='ignore').split('\r\n'):
+            if line.lower().startswith('sec-websocket-key:'):
+                key = line.split(':', 1)[1].strip()
+        accept = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+        conn.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        client = _WsClient(self.exchange, conn)
+        self.exchange.ws_clients.add(client)
+        client.serve()
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+        for client in list(self.exchange.ws_clients):
+            client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟 Backpack 交易所')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--ws-port', type=int, default=8081)
+    parser.add_argument('--symbol', default='SOL_USDC')
+    parser.add_argument('--mid', type=float, default=130.0)
+    parser.add_argument('--latency', type=float, default=0.0, help='REST 固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='REST 随机延迟上限(秒)')
+    parser.add_argument('--rate-limit', type=float, default=None, help='每个 API Key 每秒请求数')
+    parser.add_argument('--max-inflight', type=int, default=64, help='同时处理的 REST 请求数上限')
+    parser.add_argument('--takers-per-sec', type=float, default=0.0, help='内置账户每秒随机吃单次数')
+    args = parser.parse_args()
+
+    exchange = MockExchange(port=args.port, ws_port=args.ws_port, latency=args.latency, jitter=args.jitter,
+                            rate_limit=args.rate_limit, max_inflight=args.max_inflight).start()
+    exchange.seed_book(args.symbol, args.mid)
+    while True:
+        if args.takers_per_sec:
+            exchange.take(args.symbol, random.choice(('Bid', 'Ask')), round(random.uniform(0.01, 1), 2))
+            time.sleep(1 / args.takers_per_sec)
+        else:
+            time.sleep(1)
@@ -0,0 +1,209 @@
+import time
+import random
+from bisect import bisect_left
+
+from bpx.events import DepthDiff
+
+
+class OrderBook:
+    """本地深度簿
+
+    买卖两边都用两个并行的升序数组(价格、数量)保存，按价格二分查找:
+    - 单个档位更新 O(log n) 定位 (插入/删除为一次 memmove)
+    - 最优买价为买盘数组末尾，最优卖价为卖盘数组开头，O(1)
+    - depth_limit 不为空时只保留最优的 N 档，限制内存
+
+    按推送的 U(本条第一个更新 id)、u(最后一个更新 id)检查连续性: U > lastUpdateId + 1 说明漏了增量，
+    之后进入同步状态(syncing)，增量只缓冲不应用，由调用方取一次快照调用 resync 重放。
+    """
+
+    def __init__(self, depth_limit=None, max_buffer=10000):
+        self.depth_limit = depth_limit
+        self.max_buffer = max_buffer  # 同步期间最多缓冲的增量条数，超过时丢弃最旧的
+        self.bid_prices = []
+        self.bid_qtys = []
+        self.ask_prices = []
+        self.ask_qtys = []
+        self.last_update_id = 0
+        self.syncing = False
+        self.buffer = []  # 同步期间收到的增量
+        self.gap_started = None
+        self.stats = {'stale': 0, 'gaps': 0, 'buffered': 0, 'overflow': 0, 'resyncs': 0, 'resync_seconds': 0.0,
+                      'max_resync_seconds': 0.0}
+
+    def clear(self):
+        self.bid_prices.clear()
+        self.bid_qtys.clear()
+        self.ask_prices.clear()
+        self.ask_qtys.clear()
+        self.last_update_id = 0
+
+    def load_snapshot(self, snapshot):
+        """加载 REST 深度快照(bpx_pub.Depth 的返回值)"""
+        self.clear()
+        for price, qty in snapshot.get('bids', []):
+            self._set_level(self.bid_prices, self.bid_qtys, float(price), float(qty))
+        for price, qty in snapshot.get('asks', []):
+            self._set_level(self.ask_prices, self.ask_qtys, float(price), float(qty))
+        self.last_update_id = int(snapshot.get('lastUpdateId', 0))
+        self._truncate()
+
+    def apply_diff(self, data):
+        """应用 websocket depth 增量，过期的消息(u <= lastUpdateId)直接丢弃，发现缺口或同步中时缓冲
+
+        data 为 bpx.events.DepthDiff(档位已经是浮点数)或推送原始字典
+
+        Returns:
+            bool: 是否应用了本条消息，返回 False 且 syncing 为 True 时需要 resync
+        """
+        if self.syncing:
+            self._buffer(data)
+            return False
+        typed = type(data) is DepthDiff
+        first_id, update_id = (data.first_id, data.last_id) if typed else (data.get('U'), data.get('u'))
+        update_id = int(update_id)
+        if update_id <= self.last_update_id:
+            self.stats['stale'] += 1
+            return False
+        if first_id is not None and self.last_update_id and int(first_id) > self.last_update_id + 1:
+            if self.gap_started is None:  # 重放时再次发现的缺口算同一次
+                self.stats['gaps'] += 1
+                self.gap_started = time.monotonic()
+            self.syncing = True
+            self._buffer(data)
+            return False
+        if typed:
+            bids, asks = data.bids, data.asks
+        else:
+            bids = [(float(p), float(q)) for p, q in data.get('b') or ()]
+            asks = [(float(p), float(q)) for p, q in data.get('a') or ()]
+        for price, qty in bids:
+            self._set_level(self.bid_prices, self.bid_qtys, price, qty)
+        for price, qty in asks:
+            self._set_level(self.ask_prices, self.ask_qtys, price, qty)
+        self.last_update_id = update_id
+        self._truncate()
+        return True
+
+    def _buffer(self, data):
+        self.buffer.append(data)
+        self.stats['buffered'] += 1
+        if len(self.buffer) > self.max_buffer:
+            del self.buffer[0]  # 最旧的增量会被之后的快照覆盖
+            self.stats['overflow'] += 1
+
+    def resync(self, snapshot):
+        """加载快照，按顺序重放缓冲中 u > lastUpdateId 的增量
+
+        Returns:
+            bool: 是否恢复连续；快照比缓冲的增量还旧(重放时仍有缺口)时返回 False，需要再取一次快照
+        """
+        buffered, self.buffer = self.buffer, []
+        self.syncing = False
+        self.load_snapshot(snapshot)
+        for data in buffered:
+            self.apply_diff(data)
+        if self.syncing:
+            return False
+        if self.gap_started is not None:
+            elapsed = time.monotonic() - self.gap_started
+            self.gap_started = None
+            self.stats['resyncs'] += 1
+            self.stats['resync_seconds'] += elapsed
+            self.stats['max_resync_seconds'] = max(self.stats['max_resync_seconds'], elapsed)
+        return True
+
+    @staticmethod
+    def _set_level(prices, qtys, price, qty):
+        i = bisect_left(prices, price)
+        if i < len(prices) and prices[i] == price:
+            if qty == 0:
+                del prices[i]
+                del qtys[i]
+            else:
+                qtys[i] = qty
+        elif qty != 0:
+            prices.insert(i, price)
+            qtys.insert(i, qty)
+
+    def _truncate(self):
+        n = self.depth_limit
+        if not n:
+            return
+        if len(self.bid_prices) > n:
+            del self.bid_prices[:-n]
+            del self.bid_qtys[:-n]
+        if len(self.ask_prices) > n:
+            del self.ask_prices[n:]
+            del self.ask_qtys[n:]
+
+    def best_bid(self):
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self):
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def bids(self, n=None):
+        """买盘，价格从高到低"""
+        levels = list(zip(reversed(self.bid_prices), reversed(self.bid_qtys)))
+        return levels[:n] if n else levels
+
+    def asks(self, n=None):
+        """卖盘，价格从低到高"""
+        levels = list(zip(self.ask_prices, self.ask_qtys))
+        return levels[:n] if n else levels
+
+
+def _legacy_update_side(side, old_data, updates):
+    """grid_wss.SpotGrid.update_depth 原有的实现，仅用于基准对比"""
+    now_data = old_data
+    for update in updates:
+        price, qty = float(update[0]), float(update[1])
+        now_data = [entry for entry in old_data if entry[0] != price]
+        if qty != 0:
+            now_data.append([price, qty])
+    now_data.sort(key=lambda x: x[0], reverse=(side == "bids"))
+    return now_data
+
+
+def benchmark(levels=500, messages=20000, updates_per_message=5, seed=1):
+    """对比原实现与 OrderBook 每秒能处理的 depth 消息数"""
+    rng = random.Random(seed)
+    mid = 130.0
+    snapshot = {
+        'bids': [[f'{mid - 0.01 * (i + 1):.2f}', '1.5'] for i in range(levels)][::-1],
+        'asks': [[f'{mid + 0.01 * (i + 1):.2f}', '1.5'] for i in range(levels)],
+        'lastUpdateId': 0,
+    }
+    msgs = []
+    for u in range(1, messages + 1):
+        def diff():
+            return [[f'{mid + rng.choice((-1, 1)) * 0.01 * rng.randint(1, levels):.2f}',
+                     rng.choice(('0', f'{rng.random() * 10:.2f}'))] for _ in range(updates_per_message)]
+        msgs.append({'e': 'depth', 'u': u, 'b': diff(), 'a': diff()})
+
+    legacy = {
+        'bids': [[float(p), float(q)] for p, q in snapshot['bids']],
+        'asks': [[float(p), float(q)] for p, q in snapshot['asks']],
+    }
+    start = time.perf_counter()
+    for m in msgs:
+        legacy['bids'] = _legacy_update_side('bids', legacy['bids'], m['b'])
+        legacy['asks'] = _legacy_update_side('asks', legacy['asks'], m['a'])
+    legacy_rate = messages / (time.perf_counter() - start)
+
+    book = OrderBook()
+    book.load_snapshot(snapshot)
+    start = time.perf_counter()
+    for m in msgs:
+        book.apply_diff(m)
+    book_rate = messages / (time.perf_counter() - start)
+
+    return {'levels': levels, 'messages': messages, 'legacy_msg_per_sec': legacy_rate, 'orderbook_msg_per_sec': book_rate}
+
+
+if __name__ == '__main__':
+    for n in (50, 500, 2000):
+        r = benchmark(levels=n, messages=5000)
+        print(f"档位 {n:>5}: 原实现 {r['legacy_msg_per_sec']:>10.0f} msg/s, OrderBook {r['orderbook_msg_per_sec']:>10.0f} msg/s, "
+              f"提升 {r['orderbook_msg_per_sec'] / r['legacy_msg_per_sec']:.1f}x")
@@ -0,0 +1,180 @@
+import time
+import threading
+from collections import OrderedDict
+
+from bpx.events import decode_data, OrderEvent
+
+# 订单状态
+NEW = 'New'
+PARTIALLY_FILLED = 'PartiallyFilled'
+FILLED = 'Filled'
+CANCELLED = 'Cancelled'
+EXPIRED = 'Expired'
+
+TERMINAL_STATUSES = (FILLED, CANCELLED, EXPIRED)
+
+# 状态机允许的转换: New -> PartiallyFilled -> Filled/Cancelled/Expired
+TRANSITIONS = {
+    NEW: (PARTIALLY_FILLED, FILLED, CANCELLED, EXPIRED),
+    PARTIALLY_FILLED: (PARTIALLY_FILLED, FILLED, CANCELLED, EXPIRED),
+}
+
+
+class OrderStore:
+    """本地订单簿，按交易所订单 id 和 clientId 建索引，查询为 O(1) 的内存操作
+
+    - 订单信息与 ExeOrder 返回的字典格式一致
+    - 数据来源: ExeOrder/getOpenOrder 返回值(track)、account.orderUpdate 推送(apply_event)、历史订单分页回补(backfill)
+    - 推送只会让 status 按 TRANSITIONS 前进，已终结的订单收到迟到的推送会被忽略
+    - 只淘汰已终结的订单: 超过 max_terminal 个时淘汰最久未访问的，超过 terminal_ttl 秒的直接淘汰
+    """
+
+    def __init__(self, max_terminal=1000, terminal_ttl=3600):
+        self.max_terminal = max_terminal
+        self.terminal_ttl = terminal_ttl
+        self.orders = {}  # 订单id -> 订单信息
+        self.client_ids = {}  # clientId -> 订单id
+        self.terminal = OrderedDict()  # 已终结的订单id -> 终结时间，按访问先后排序(LRU)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _put(self, order):
+        order_id = order['id']
+        self.orders[order_id] = order
+        if order.get('clientId') is not None:
+            self.client_ids[str(order['clientId'])] = order_id
+        if order.get('status') in TERMINAL_STATUSES:
+            self._mark_terminal(order_id)
+
+    def _mark_terminal(self, order_id):
+        if order_id not in self.terminal:
+            self.terminal[order_id] = time.time()
+        self.terminal.move_to_end(order_id)
+        self._evict()
+
+    def _evict(self):
+        expire = time.time() - self.terminal_ttl
+        while self.terminal:
+            order_id, finished_at = next(iter(self.terminal.items()))
+            if len(self.terminal) <= self.max_terminal and finished_at >= expire:
+                break
+            self.terminal.pop(order_id)
+            order = self.orders.pop(order_id, None)
+            if order and self.client_ids.get(str(order.get('clientId'))) == order_id:
+                self.client_ids.pop(str(order.get('clientId')))
+
+    def track(self, order):
+        """保存 REST 返回的订单信息(下单、查询、历史订单)，与已有信息合并，REST 的状态为准"""
+        if not order or not order.get('id'):
+            return
+        with self.lock:
+            current = self.orders.get(order['id'])
+            if current is None:
+                self._put(dict(order))
+            elif current.get('status') not in TERMINAL_STATUSES:
+                current.update({k: v for k, v in order.items() if v is not None})
+                self._put(current)
+
+    def get(self, order_id):
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order_id in self.terminal:
+                self.terminal.move_to_end(order_id)
+            return order
+
+    def get_by_client_id(self, client_id):
+        order_id = self.client_ids.get(str(client_id))
+        return self.get(order_id) if order_id else None
+
+    def transition(self, order, status):
+        """按状态机更新订单状态，返回是否发生了转换"""
+        current = order.get('status') or NEW
+        if status == current and status != PARTIALLY_FILLED:
+            return False
+        if status not in TRANSITIONS.get(current, ()):
+            return False
+        order['status'] = status
+        return True
+
+    def apply_event(self, data):
+        """处理一条订单推送(bpx.events 解码的订单事件，原始字典会先解码)
+
+        Returns:
+            dict | None: 状态发生转换时返回更新后的订单信息，否则返回 None
+        """
+        if isinstance(data, dict):
+            data = decode_data(data)
+        if not isinstance(data, OrderEvent):
+            return None
+        event = data.event
+        order_id = data.order_id
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                if event not in ('orderAccepted', 'orderFill'):
+                    return None
+                # orderFill 可能先于下单响应到达，先按推送建档
+                order = {
+                    'clientId': data.client_id,
+                    'id': order_id,
+                    'orderType': data.order_type,
+                    'price': str(data.price),
+                    'quantity': str(data.quantity),
+                    'executedQuantity': '0',
+                    'side': data.side,
+                    'status': NEW,
+                    'symbol': data.symbol,
+                    'timeInForce': data.time_in_force,
+                }
+                self._put(order)
+                if event == 'orderAccepted':
+                    return dict(order)
+            if event == 'orderFill':
+                if data.executed_quantity is not None:
+                    order['executedQuantity'] = str(data.executed_quantity)
+                status = FILLED if data.status == FILLED else PARTIALLY_FILLED
+            elif event == 'orderCancelled':
+                status = CANCELLED
+            elif event == 'orderExpired':
+                status = EXPIRED
+            else:
+                return None
+            if not self.transition(order, status):
+                return None
+            if status in TERMINAL_STATUSES:
+                self._mark_terminal(order_id)
+            return dict(order)
+
+    def backfill(self, client, symbol, limit=100, max_pages=10, stop_at=None):
+        """分页拉取历史订单写入本地
+
+        Args:
+            client (BpxClient): REST 客户端
+            symbol (str): 交易对
+            limit (int, optional): 每页数量. 默认 100.
+            max_pages (int, optional): 最多拉取页数. 默认 10.
+            stop_at (str, optional): 拉取到该订单 id 后停止
+
+        Returns:
+            int: 写入的订单数
+        """
+        count = 0
+        for page in range(max_pages):
+            orders = client.getHistoryOrders(symbol, limit=limit, offset=page * limit)
+            if not isinstance(orders, list):
+                break
+            for o in orders:
+                self.track(o)
+            count += len(orders)
+            if len(orders) < limit or (stop_at and any(o.get('id') == stop_at for o in orders)):
+                break
+        return count
+
+    def forget(self, order_id):
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+            self.terminal.pop(order_id, None)
+            if order and self.client_ids.get(str(order.get('clientId'))) == order_id:
+                self.client_ids.pop(str(order.get('clientId')))
@@ -0,0 +1,108 @@
+import time
+import queue
+import threading
+from loguru import logger
+
+from bpx.metrics import METRICS, Histogram, LAG_BUCKETS
+
+_STOP = object()
+
+
+class Stage:
+    """流水线的一个阶段: 独立线程按到达顺序处理队列中的消息
+
+    - put 只入队不等待处理；队列满(maxsize)时阻塞调用方并计数 full，作为背压，不丢弃消息
+    - 每条消息记录排队延迟(入队 -> 开始处理)和处理耗时，当前队列深度和最大深度可以随时读取
+    - 处理函数抛出异常时调用 on_error(stage, error)，之后该阶段停止，停止后 put 的消息直接丢弃并计数 dropped
+    """
+
+    def __init__(self, name, handler, maxsize=0, on_error=None):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.stopped = False
+        self.lag = Histogram(LAG_BUCKETS)  # 排队延迟(秒)
+        self.busy = Histogram(LAG_BUCKETS)  # 处理耗时(秒)
+        self.stats = {'processed': 0, 'errors': 0, 'full': 0, 'dropped': 0, 'max_depth': 0, 'max_lag': 0.0}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+            METRICS.register_stage(self)
+        return self
+
+    def put(self, item):
+        entry = (time.perf_counter(), item)
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.stats['full'] += 1
+            logger.warning(f"{self.name} 队列已满({self.maxsize})，等待处理")
+            while not self.stopped:
+                try:
+                    self.queue.put(entry, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+        if self.stopped:
+            self.stats['dropped'] += 1
+            return
+        depth = self.queue.qsize()
+        if depth > self.stats['max_depth']:
+            self.stats['max_depth'] = depth
+
+    def run(self):
+        get, handler, stats = self.queue.get, self.handler, self.stats
+        try:
+            while True:
+                queued, item = get()
+                if item is _STOP:
+                    break
+                start = time.perf_counter()
+                lag = start - queued
+                self.lag.observe(lag)
+                if lag > stats['max_lag']:
+                    stats['max_lag'] = lag
+                try:
+                    handler(item)
+                except Exception as e:
+                    stats['errors'] += 1
+                    logger.error(f"{self.name} 处理失败: {e}")
+                    if self.on_error:
+                        self.on_error(self, e)
+                    break
+                finally:
+                    stats['processed'] += 1
+                    self.busy.observe(time.perf_counter() - start)
+        finally:
+            self.stopped = True
+
+    def stop(self, timeout=5.0):
+        """处理完已入队的消息后停止"""
+        METRICS.unregister_stage(self)
+        if self.thread is None or self.stopped:
+            self.stopped = True
+            return
+        self.queue.put((time.perf_counter(), _STOP))
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def snapshot(self):
+        """队列深度和延迟统计，延迟单位为微秒"""
+        lag, busy = self.lag, self.busy
+        stats = dict(self.stats)
+        max_lag = stats.pop('max_lag')
+        return {
+            **stats,
+            'depth': self.depth(),
+            'lag_mean_us': round(lag.sum / lag.count * 1e6, 1) if lag.count else None,
+            'lag_max_us': round(max_lag * 1e6, 1),
+            'busy_mean_us': round(busy.sum / busy.count * 1e6, 1) if busy.count else None,
+        }
@@ -0,0 +1,70 @@
+from loguru import logger
+
+
+def quote_key(side, price, quantity, price_precision, quantity_precision):
+    """按精度取整后的 (方向, 价格, 数量)，用于比较挂单和目标报价"""
+    return side, round(float(price), price_precision), round(float(quantity), quantity_precision)
+
+
+def diff(desired, live, price_precision, quantity_precision):
+    """比较目标报价和当前挂单
+
+    Args:
+        desired (list): 目标报价，每个元素为 create_order 的参数字典(side, price, quantity, ...)
+        live (list): 当前挂单，ExeOrder 返回的订单信息
+        price_precision (int): 价格精度
+        quantity_precision (int): 数量精度
+
+    Returns:
+        (list, list, list): 与 desired 一一对应的可保留挂单(没有则为 None), 需要撤销的挂单, 需要新下的报价
+    """
+    pool = {}
+    for o in live:
+        pool.setdefault(quote_key(o['side'], o['price'], o['quantity'], price_precision, quantity_precision), []).append(o)
+    kept, to_place = [], []
+    for q in desired:
+        orders = pool.get(quote_key(q['side'], q['price'], q['quantity'], price_precision, quantity_precision))
+        if orders:
+            kept.append(orders.pop(0))
+        else:
+            kept.append(None)
+            to_place.append(q)
+    to_cancel = [o for orders in pool.values() for o in orders]
+    return kept, to_cancel, to_place
+
+
+class Reconciler:
+    """差量调整挂单
+
+    只撤销价格或数量与目标报价不一致的挂单，一致的原样保留(保留排队位置)，只补下缺少的报价。
+    撤单先于下单执行，撤单释放的资金可以用于新挂单；新挂单一次批量提交。
+
+    Args:
+        cancel (callable): cancel(order) 撤销一个挂单，成功返回 True
+        place (callable): place(quotes) 批量下单，返回与 quotes 对应的订单信息(失败为 None)
+        price_precision (int): 价格精度
+        quantity_precision (int): 数量精度
+    """
+
+    def __init__(self, cancel, place, price_precision, quantity_precision):
+        self.cancel = cancel
+        self.place = place
+        self.price_precision = price_precision
+        self.quantity_precision = quantity_precision
+        self.stats = {'kept': 0, 'cancelled': 0, 'placed': 0}
+
+    def apply(self, desired, live):
+        """把挂单调整为 desired
+
+        Returns:
+            (list, list): 与 desired 一一对应的订单信息(下单失败为 None), 撤销失败的挂单(可能已经成交)
+        """
+        kept, to_cancel, to_place = diff(desired, live, self.price_precision, self.quantity_precision)
+        failed = [o for o in to_cancel if not self.cancel(o)]
+        placed = iter(self.place(to_place) if to_place else [])
+        orders = [o if o is not None else next(placed) for o in kept]
+        self.stats['kept'] += len(desired) - len(to_place)
+        self.stats['cancelled'] += len(to_cancel) - len(failed)
+        self.stats['placed'] += len(to_place)
+        logger.debug(f"差量调整挂单: 保留 {len(desired) - len(to_place)}, 撤销 {len(to_cancel)}, 新下 {len(to_place)}")
+        return orders, failed
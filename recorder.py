@@ -0,0 +1,155 @@
+import os
+import time
+import queue
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from loguru import logger
+
+# 每个数据流的列定义，每列单独一个定长二进制文件，可以直接 memmap 读取
+SCHEMAS = {
+    # snapshot: 0 为 websocket 增量，1 为 REST 快照；side: 1 为买盘，-1 为卖盘；qty 为 0 表示删除该档位
+    'depth': (('ts', np.int64), ('update_id', np.int64), ('snapshot', np.int8), ('side', np.int8),
+              ('price', np.float64), ('qty', np.float64)),
+    # buyer_maker: 1 表示买方为挂单方(主动卖出)
+    'trade': (('ts', np.int64), ('trade_id', np.int64), ('price', np.float64), ('qty', np.float64),
+              ('buyer_maker', np.int8)),
+}
+
+
+def _now_us():
+    return int(time.time() * 1_000_000)
+
+
+def _day(ts_us):
+    return datetime.fromtimestamp(ts_us / 1_000_000, tz=timezone.utc).strftime('%Y%m%d')
+
+
+class MarketRecorder(threading.Thread):
+    """行情记录器
+
+    把 depth 增量、REST 深度快照和逐笔成交按列追加写入定长二进制文件:
+        <root>/<symbol>/<YYYYMMDD>/<stream>/<column>.bin
+    推送线程只把原始数据放入队列(record_*)，解析和写盘在后台线程完成，按 UTC 日期切换目录。
+    ts 为本地接收时间(微秒)，用 open_stream / slice_time 以 memmap 方式零拷贝读取。
+    """
+
+    def __init__(self, root, symbol, max_queue=100000, flush_interval=1.0):
+        threading.Thread.__init__(self, daemon=True)
+        self.root = root
+        self.symbol = symbol
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.dropped = 0  # 队列满时丢弃的消息数
+        self.running = True
+        self.files = {}  # (day, stream) -> {column: file}
+
+    # 以下方法在推送线程中调用，只入队
+    def record_depth(self, data):
+        self._put(('depth', _now_us(), data))
+
+    def record_snapshot(self, snapshot):
+        self._put(('snapshot', _now_us(), snapshot))
+
+    def record_trade(self, data):
+        self._put(('trade', _now_us(), data))
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    # 后台线程
+    def run(self):
+        while self.running or not self.queue.empty():
+            batch = {'depth': [], 'trade': []}
+            deadline = time.time() + self.flush_interval
+            while time.time() < deadline:
+                try:
+                    kind, ts, data = self.queue.get(timeout=max(deadline - time.time(), 0.001))
+                except queue.Empty:
+                    break
+                try:
+                    if kind == 'trade':
+                        batch['trade'].append((ts, int(data.get('t') or 0), float(data['p']), float(data['q']),
+                                               1 if data.get('m') else 0))
+                    else:
+                        self._depth_rows(batch['depth'], kind, ts, data)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"记录行情失败: {e}, {data}")
+            for stream, rows in batch.items():
+                if rows:
+                    self._append(stream, rows)
+        self.close()
+
+    @staticmethod
+    def _depth_rows(rows, kind, ts, data):
+        if kind == 'snapshot':
+            update_id, flag, bids, asks = int(data.get('lastUpdateId') or 0), 1, data.get('bids'), data.get('asks')
+        else:
+            update_id, flag, bids, asks = int(data.get('u') or 0), 0, data.get('b'), data.get('a')
+        for price, qty in bids or ():
+            rows.append((ts, update_id, flag, 1, float(price), float(qty)))
+        for price, qty in asks or ():
+            rows.append((ts, update_id, flag, -1, float(price), float(qty)))
+
+    def _append(self, stream, rows):
+        schema = SCHEMAS[stream]
+        # 一个批次可能跨天，按天拆分
+        ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        days = [_day(t) for t in (ts[0], ts[-1])]
+        bounds = [(days[0], 0, len(rows))]
+        if days[0] != days[1]:
+            split = int(np.searchsorted([_day(t) for t in ts], days[1]))
+            bounds = [(days[0], 0, split), (days[1], split, len(rows))]
+        for day, lo, hi in bounds:
+            files = self._files(day, stream)
+            for i, (name, dtype) in enumerate(schema):
+                column = np.fromiter((r[i] for r in rows[lo:hi]), dtype=dtype, count=hi - lo)
+                files[name].write(column.tobytes())
+                files[name].flush()
+
+    def _files(self, day, stream):
+        key = (day, stream)
+        if key not in self.files:
+            # 换天后关闭前一天的文件
+            for old in [k for k in self.files if k[1] == stream]:
+                for f in self.files.pop(old).values():
+                    f.close()
+            path = os.path.join(self.root, self.symbol, day, stream)
+            os.makedirs(path, exist_ok=True)
+            self.files[key] = {name: open(os.path.join(path, f'{name}.bin'), 'ab') for name, _ in SCHEMAS[stream]}
+        return self.files[key]
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        for files in self.files.values():
+            for f in files.values():
+                f.close()
+        self.files = {}
+
+
+def open_stream(root, symbol, day, stream):
+    """以只读 memmap 打开某一天的数据流，返回 {列名: 数组}"""
+    path = os.path.join(root, symbol, day, stream)
+    columns = {}
+    lengths = []
+    for name, dtype in SCHEMAS[stream]:
+        file = os.path.join(path, f'{name}.bin')
+        size = os.path.getsize(file) if os.path.exists(file) else 0
+        count = size // np.dtype(dtype).itemsize
+        columns[name] = np.memmap(file, dtype=dtype, mode='r', shape=(count,)) if count else np.empty(0, dtype=dtype)
+        lengths.append(count)
+    # 写入中途读取时各列长度可能不一致，按最短的截齐
+    n = min(lengths) if lengths else 0
+    return {name: col[:n] for name, col in columns.items()}
+
+
+def slice_time(columns, start_us, end_us):
+    """按时间范围 [start_us, end_us) 切片，返回的是 memmap 的视图，不拷贝数据"""
+    ts = columns['ts']
+    lo, hi = np.searchsorted(ts, start_us, 'left'), np.searchsorted(ts, end_us, 'left')
+    return {name: col[lo:hi] for name, col in columns.items()}
@@ -0,0 +1,117 @@
+import base64
+import itertools
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from bpx.bpx import BpxClient
+from history import HistoryStream, Checkpoint, stream, SOURCES
+from mock_exchange import MockExchange
+
+SYMBOL = 'SOL_USDC'
+
+
+def new_secret():
+    key = ed25519.Ed25519PrivateKey.generate()
+    return base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                              serialization.NoEncryption())).decode()
+
+
+@pytest.fixture(scope='module')
+def exchange():
+    exchange = MockExchange().start()
+    exchange.seed_book(SYMBOL, 130, levels=5, tick=0.01, qty=10)
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def account(exchange):
+    """每个测试一个新账户，成交历史互不影响"""
+    secret = new_secret()
+    client = BpxClient()
+    client.init('', secret, url=exchange.url, rate_limit={'rate': 1000, 'burst': 2000})
+    return client, exchange.account_key(secret)
+
+
+def trade_ids(records):
+    return [r['tradeId'] for r in records]
+
+
+def all_trade_ids(exchange, api_key):
+    return {f['tradeId'] for f in exchange.fills[api_key]}
+
+
+def fills(client, checkpoint, **kwargs):
+    return HistoryStream(client, 'fills', SYMBOL, limit=50, concurrency=3, rate=1000, checkpoint=checkpoint, **kwargs)
+
+
+def test_inserts_during_walk_are_not_skipped_or_duplicated(exchange, account):
+    client, api_key = account
+    exchange.seed_fills(api_key, SYMBOL, 350)
+    before = all_trade_ids(exchange, api_key)
+    checkpoint = Checkpoint()
+    hs = fills(client, checkpoint)
+    fetch, calls = hs.fetch, itertools.count(1)
+
+    def fetch_and_insert(client, symbol, limit, offset):
+        page = fetch(client, symbol, limit, offset)
+        n = next(calls)
+        # 翻页期间最新一端插入新记录，之后的页整体后移(第二次超过一页)
+        if n == 2:
+            exchange.seed_fills(api_key, SYMBOL, 30)
+        elif n == 5:
+            exchange.seed_fills(api_key, SYMBOL, 70)
+        return page
+
+    hs.fetch = fetch_and_insert
+    ids = trade_ids(hs)
+    assert len(ids) == len(set(ids))
+    assert before <= set(ids)
+    assert hs.stats['refetched'] + hs.stats['shifted'] > 0
+    # 插入的记录由下一次增量拉取补上
+    rest = trade_ids(fills(client, checkpoint))
+    assert set(ids) | set(rest) == all_trade_ids(exchange, api_key)
+    assert not set(ids) & set(rest)
+
+
+def test_interrupted_walk_resumes_from_checkpoint(exchange, account):
+    client, api_key = account
+    exchange.seed_fills(api_key, SYMBOL, 300)
+    checkpoint = Checkpoint()
+    records = iter(fills(client, checkpoint))
+    first = [next(records) for _ in range(120)]
+    records.close()  # 调用方提前结束迭代
+    resume = checkpoint.get(f'fills:{SYMBOL}')['resume']
+    assert resume and 0 < resume['offset'] <= 120
+    exchange.seed_fills(api_key, SYMBOL, 20)
+    second = trade_ids(fills(client, checkpoint))
+    assert len(second) == len(set(second))
+    assert set(trade_ids(first)) | set(second) == all_trade_ids(exchange, api_key)
+    # 只重复产出中断所在页中已经产出的部分
+    assert len(set(trade_ids(first)) & set(second)) < 50
+    assert checkpoint.get(f'fills:{SYMBOL}')['resume'] is None
+    assert trade_ids(fills(client, checkpoint)) == []
+
+
+def test_incremental_run_returns_only_new_records(exchange, account):
+    client, api_key = account
+    exchange.seed_fills(api_key, SYMBOL, 130)
+    checkpoint = Checkpoint()
+    assert len(trade_ids(fills(client, checkpoint))) == 130
+    exchange.seed_fills(api_key, SYMBOL, 25)
+    newest = sorted(all_trade_ids(exchange, api_key))[-25:]
+    assert trade_ids(fills(client, checkpoint)) == newest[::-1]
+    assert trade_ids(fills(client, checkpoint)) == []
+
+
+def test_orders_without_symbol(account):
+    client, _ = account
+    placed = [client.ExeOrder(cid=3000 + i, symbol=SYMBOL, side='Bid', orderType='Limit', timeInForce='GTC',
+                              quantity=0.1, price=120 + i) for i in range(3)]
+    client.cancelOrder(SYMBOL, placed[0]['id'])
+    orders = list(stream(client, 'orders', limit=2, rate=1000))
+    assert sorted(o['id'] for o in orders) == sorted(o['id'] for o in placed)
+    key = SOURCES['orders'][1]
+    assert len({key(o) for o in orders}) == 3
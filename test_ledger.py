@@ -0,0 +1,84 @@
+import pytest
+
+from ledger import BalanceLedger
+
+
+class Balances:
+    """只提供 balances() 的客户端"""
+
+    def __init__(self, balances):
+        self.result = balances
+        self.calls = 0
+
+    def balances(self):
+        self.calls += 1
+        return self.result
+
+
+@pytest.fixture
+def ledger():
+    ledger = BalanceLedger(Balances({'SOL': {'available': '10', 'locked': '0'},
+                                     'USDC': {'available': '1000', 'locked': '0'}}))
+    assert ledger.sync()
+    return ledger
+
+
+def total(ledger, asset):
+    return ledger.available.get(asset, 0.0) + ledger.locked.get(asset, 0.0)
+
+
+def test_bid_reserve_fill_release(ledger):
+    ledger.reserve({'id': '1', 'symbol': 'SOL_USDC', 'side': 'Bid', 'price': '100', 'quantity': '2'})
+    assert ledger.get_pair('SOL_USDC') == (10.0, 800.0)
+    assert ledger.locked['USDC'] == pytest.approx(200.0)
+    # 成交价低于挂单价，差额退回可用
+    ledger.fill('1', 'SOL_USDC', 'Bid', 1.0, 99.0)
+    assert ledger.locked['USDC'] == pytest.approx(100.0)
+    assert total(ledger, 'USDC') == pytest.approx(1000 - 99)
+    assert total(ledger, 'SOL') == pytest.approx(11.0)
+    ledger.release('1')
+    assert ledger.locked['USDC'] == pytest.approx(0.0)
+    assert ledger.get_pair('SOL_USDC') == pytest.approx((11.0, 901.0))
+    assert ledger.orders == {}
+    # 全程没有再请求余额
+    assert ledger.client.calls == 1 and not ledger.stale
+
+
+def test_ask_full_fill_from_events(ledger):
+    event = {'s': 'SOL_USDC', 'i': '2', 'S': 'Ask', 'p': '110', 'q': '3', 'z': '0'}
+    ledger.on_order_update({**event, 'e': 'orderAccepted', 'X': 'New'})
+    assert ledger.get_pair('SOL_USDC') == (7.0, 1000.0)
+    ledger.on_order_update({**event, 'e': 'orderFill', 'X': 'PartiallyFilled', 'l': '1', 'L': '110'})
+    ledger.on_order_update({**event, 'e': 'orderFill', 'X': 'Filled', 'l': '2', 'L': '111',
+                            'n': '0.5', 'N': 'USDC'})
+    assert ledger.orders == {}
+    assert ledger.locked['SOL'] == pytest.approx(0.0)
+    assert ledger.get_pair('SOL_USDC') == pytest.approx((7.0, 1000 + 110 + 222 - 0.5))
+    # 已经终结的订单再收到取消不影响余额
+    ledger.on_order_update({**event, 'e': 'orderCancelled', 'X': 'Cancelled'})
+    assert ledger.get_pair('SOL_USDC') == pytest.approx((7.0, 1331.5))
+
+
+def test_reserve_is_idempotent_and_counts_executed(ledger):
+    order = {'id': '3', 'symbol': 'SOL_USDC', 'side': 'Ask', 'price': '110', 'quantity': '3',
+             'executedQuantity': '1'}
+    ledger.reserve(order)
+    ledger.reserve(order)
+    assert ledger.locked['SOL'] == pytest.approx(2.0)
+    assert total(ledger, 'SOL') == pytest.approx(10.0)
+
+
+def test_unknown_fill_marks_stale(ledger):
+    ledger.fill('404', 'SOL_USDC', 'Bid', 1.0, 100.0)
+    assert ledger.stale
+    assert ledger.available['USDC'] == pytest.approx(900.0)
+    ledger.get_pair('SOL_USDC')
+    assert ledger.client.calls == 2 and not ledger.stale
+
+
+def test_has_funds_resyncs_once_before_rejecting(ledger):
+    ledger.reserve({'id': '4', 'symbol': 'SOL_USDC', 'side': 'Bid', 'price': '100', 'quantity': '9'})
+    # 本地只剩 100 USDC，对账后交易所余额为 1000
+    assert ledger.has_funds('SOL_USDC', 'Bid', 2, 100)
+    assert ledger.client.calls == 2
+    assert not ledger.has_funds('SOL_USDC', 'Bid', 20, 100)
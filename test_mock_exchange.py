@@ -0,0 +1,92 @@
+import json
+import base64
+
+import pytest
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from bpx.bpx import BpxClient
+from bpx.signer import Signer
+from mock_exchange import MockExchange
+
+SYMBOL = 'SOL_USDC'
+
+
+def new_secret():
+    key = ed25519.Ed25519PrivateKey.generate()
+    return base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                              serialization.NoEncryption())).decode()
+
+
+@pytest.fixture(scope='module')
+def exchange():
+    exchange = MockExchange().start()
+    exchange.seed_book(SYMBOL, 130, levels=5, tick=0.01, qty=10)
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def client(exchange):
+    client = BpxClient()
+    client.init('', new_secret(), url=exchange.url)
+    return client
+
+
+def order_params(**kw):
+    return {'clientId': 1234567, 'symbol': SYMBOL, 'side': 'Bid', 'orderType': 'Limit', 'timeInForce': 'GTC',
+            'quantity': '0.1', 'price': '129.50', **kw}
+
+
+def test_signed_order_round_trip(client):
+    order = client.ExeOrder(cid=1234567, symbol=SYMBOL, side='Bid', orderType='Limit', timeInForce='GTC',
+                            quantity=0.1, price=129.5)
+    assert order['status'] == 'New' and order['clientId'] == 1234567
+    assert client.getOpenOrder(SYMBOL, order['id'])['id'] == order['id']
+    assert [o['id'] for o in client.getAllOpenOrders(SYMBOL)] == [order['id']]
+    # 没有成交，挂单冻结计价币
+    assert float(client.balances()['USDC']['locked']) == pytest.approx(12.95)
+    assert client.cancelOrder(SYMBOL, order['id'])['status'] == 'Cancelled'
+    assert client.getAllOpenOrders(SYMBOL) == []
+    assert client.getHistoryOrders(SYMBOL)[0]['status'] == 'Cancelled'
+
+
+def test_marketable_order_fills_against_book(exchange, client):
+    order = client.ExeOrder(cid=1234568, symbol=SYMBOL, side='Bid', orderType='Limit', timeInForce='GTC',
+                            quantity=1, price=130.02)
+    assert order['status'] == 'Filled'
+    assert float(order['executedQuantity']) == pytest.approx(1)
+    assert float(client.balances()['SOL']['available']) == pytest.approx(exchange.default_balances['SOL'] + 1)
+
+
+def post(exchange, headers, body):
+    return requests.post(f'{exchange.url}api/v1/order', headers=headers, data=json.dumps(body), timeout=5)
+
+
+def test_bad_signature_is_rejected(exchange):
+    signer = Signer(new_secret())
+    params = order_params()
+    assert post(exchange, signer.sign('orderExecute', params), params).status_code == 200
+    rejected = exchange.stats['rejected_signature']
+    # 签名之后改了参数
+    res = post(exchange, signer.sign('orderExecute', params), order_params(quantity='100'))
+    assert res.status_code == 401 and res.json()['code'] == 'INVALID_SIGNATURE'
+    # 签名的指令与接口不一致
+    res = post(exchange, signer.sign('orderCancel', params), params)
+    assert res.status_code == 401 and res.json()['code'] == 'INVALID_SIGNATURE'
+    # 用别人的公钥发请求
+    headers = {**signer.sign('orderExecute', params), 'X-API-KEY': Signer(new_secret()).verifying_key_b64}
+    assert post(exchange, headers, params).status_code == 401
+    assert exchange.stats['rejected_signature'] == rejected + 3
+
+
+def test_expired_and_unsigned_requests_are_rejected(exchange):
+    signer = Signer(new_secret())
+    params = order_params()
+    headers = signer.sign('orderExecute', params)
+    headers['X-TIMESTAMP'] = str(int(headers['X-TIMESTAMP']) - 60000)
+    res = post(exchange, headers, params)
+    assert res.status_code == 401 and res.json()['code'] == 'INVALID_CLIENT_REQUEST'
+    res = post(exchange, {'Content-Type': 'application/json'}, params)
+    assert res.status_code == 401 and res.json()['code'] == 'UNAUTHORIZED'
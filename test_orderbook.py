@@ -0,0 +1,89 @@
+from bpx.events import decode_data
+from orderbook import OrderBook
+
+
+def snapshot(last_update_id, bids, asks):
+    return {'lastUpdateId': last_update_id, 'bids': [[str(p), str(q)] for p, q in bids],
+            'asks': [[str(p), str(q)] for p, q in asks]}
+
+
+def depth(first_id, last_id, bids=(), asks=()):
+    return {'e': 'depth', 's': 'SOL_USDC', 'U': first_id, 'u': last_id,
+            'b': [[str(p), str(q)] for p, q in bids], 'a': [[str(p), str(q)] for p, q in asks]}
+
+
+def test_load_snapshot_sorts_levels():
+    book = OrderBook()
+    book.load_snapshot(snapshot(10, [(98, 2), (99, 1)], [(102, 2), (101, 1)]))
+    assert book.best_bid() == 99.0 and book.best_ask() == 101.0
+    assert book.bids() == [(99.0, 1.0), (98.0, 2.0)]
+    assert book.asks(1) == [(101.0, 1.0)]
+    assert book.last_update_id == 10
+
+
+def test_apply_diff_updates_and_removes_levels():
+    book = OrderBook()
+    book.load_snapshot(snapshot(10, [(99, 1), (98, 2)], [(101, 1), (102, 2)]))
+    assert book.apply_diff(depth(11, 12, bids=[(99, 0), (100, 3)], asks=[(101, 0), (102, 5)]))
+    assert book.bids() == [(100.0, 3.0), (98.0, 2.0)]
+    assert book.asks() == [(102.0, 5.0)]
+    assert book.last_update_id == 12
+
+
+def test_apply_diff_drops_stale_messages():
+    book = OrderBook()
+    book.load_snapshot(snapshot(10, [(99, 1)], [(101, 1)]))
+    assert not book.apply_diff(depth(9, 10, bids=[(99, 0)]))
+    assert book.bids() == [(99.0, 1.0)]
+
+
+def test_depth_limit_keeps_best_levels():
+    book = OrderBook(depth_limit=2)
+    book.load_snapshot(snapshot(10, [(97, 1), (98, 1), (99, 1)], [(101, 1), (102, 1), (103, 1)]))
+    assert book.bids() == [(99.0, 1.0), (98.0, 1.0)]
+    assert book.asks() == [(101.0, 1.0), (102.0, 1.0)]
+    book.apply_diff(depth(11, 11, bids=[(100, 1)], asks=[(100.5, 1)]))
+    assert book.bids() == [(100.0, 1.0), (99.0, 1.0)]
+    assert book.asks() == [(100.5, 1.0), (101.0, 1.0)]
+
+
+def test_gap_buffers_until_resync():
+    book = OrderBook()
+    book.load_snapshot(snapshot(10, [(99, 1)], [(101, 1)]))
+    # 漏了 11~12
+    assert not book.apply_diff(depth(13, 14, bids=[(99, 2)]))
+    assert book.syncing and book.stats['gaps'] == 1
+    # 同步期间的增量只缓冲，不应用
+    assert not book.apply_diff(decode_data(depth(15, 15, asks=[(101, 3)])))
+    assert book.bids() == [(99.0, 1.0)] and book.asks() == [(101.0, 1.0)]
+    assert len(book.buffer) == 2
+    # 快照覆盖 11~13，只重放 u 更大的增量
+    assert book.resync(snapshot(13, [(99, 5)], [(101, 1)]))
+    assert not book.syncing and book.buffer == []
+    assert book.bids() == [(99.0, 2.0)] and book.asks() == [(101.0, 3.0)]
+    assert book.last_update_id == 15
+    assert book.stats['resyncs'] == 1
+
+
+def test_resync_with_stale_snapshot_stays_syncing():
+    book = OrderBook()
+    book.load_snapshot(snapshot(10, [(99, 1)], [(101, 1)]))
+    book.apply_diff(depth(13, 14, bids=[(99, 2)]))
+    # 快照比缓冲的增量还旧，重放时仍有缺口
+    assert not book.resync(snapshot(11, [(99, 1)], [(101, 1)]))
+    assert book.syncing and book.buffer == [depth(13, 14, bids=[(99, 2)])]
+    assert book.resync(snapshot(12, [(99, 1)], [(101, 1)]))
+    assert book.bids() == [(99.0, 2.0)]
+    # 重放时再次发现的缺口算同一次
+    assert book.stats['gaps'] == 1 and book.stats['resyncs'] == 1
+
+
+def test_buffer_overflow_drops_oldest():
+    book = OrderBook(max_buffer=2)
+    book.load_snapshot(snapshot(10, [(99, 1)], [(101, 1)]))
+    for u in range(12, 16):
+        book.apply_diff(depth(u, u, bids=[(99, u)]))
+    assert [d['u'] for d in book.buffer] == [14, 15]
+    assert book.stats['overflow'] == 2
+    assert book.resync(snapshot(13, [(99, 1)], [(101, 1)]))
+    assert book.bids() == [(99.0, 15.0)]
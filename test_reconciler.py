@@ -0,0 +1,75 @@
+from reconciler import Reconciler, diff
+
+
+def quote(side, price, quantity='1'):
+    return {'symbol': 'SOL_USDC', 'side': side, 'orderType': 'Limit', 'timeInForce': 'GTC',
+            'price': price, 'quantity': quantity}
+
+
+def order(order_id, side, price, quantity='1'):
+    return {'id': order_id, 'side': side, 'price': str(price), 'quantity': str(quantity)}
+
+
+class Exchange:
+    """记录撤单和下单调用，cancel_fails 中的订单撤单失败，place_fails 中的价格下单失败"""
+
+    def __init__(self, cancel_fails=(), place_fails=()):
+        self.cancel_fails = set(cancel_fails)
+        self.place_fails = set(place_fails)
+        self.cancelled = []
+        self.placed = []
+
+    def cancel(self, o):
+        self.cancelled.append(o['id'])
+        return o['id'] not in self.cancel_fails
+
+    def place(self, quotes):
+        self.placed.append(quotes)
+        return [None if q['price'] in self.place_fails else order(f"new-{q['price']}", q['side'], q['price'], q['quantity'])
+                for q in quotes]
+
+
+def test_diff_keeps_matching_orders():
+    bid, ask = order('1', 'Bid', '99.00'), order('2', 'Ask', '101.00')
+    kept, to_cancel, to_place = diff([quote('Bid', 99), quote('Ask', 102)], [bid, ask], 2, 2)
+    assert kept == [bid, None]
+    assert to_cancel == [ask]
+    assert to_place == [quote('Ask', 102)]
+
+
+def test_diff_rounds_to_precision():
+    bid = order('1', 'Bid', '99.001', '0.999')
+    kept, to_cancel, to_place = diff([quote('Bid', 99.0, 1.0)], [bid], 2, 2)
+    assert kept == [bid] and to_cancel == [] and to_place == []
+    # 方向不同不能保留
+    kept, to_cancel, _ = diff([quote('Ask', 99.0, 1.0)], [bid], 2, 2)
+    assert kept == [None] and to_cancel == [bid]
+
+
+def test_diff_matches_each_order_once():
+    a, b = order('1', 'Bid', 99), order('2', 'Bid', 99)
+    kept, to_cancel, to_place = diff([quote('Bid', 99)] * 3, [a, b], 2, 2)
+    assert kept == [a, b, None]
+    assert to_cancel == [] and to_place == [quote('Bid', 99)]
+
+
+def test_apply_without_changes_does_not_place():
+    exchange = Exchange()
+    bid, ask = order('1', 'Bid', 99), order('2', 'Ask', 101)
+    orders, failed = Reconciler(exchange.cancel, exchange.place, 2, 2).apply(
+        [quote('Bid', 99), quote('Ask', 101)], [ask, bid])
+    assert orders == [bid, ask] and failed == []
+    assert exchange.cancelled == [] and exchange.placed == []
+
+
+def test_apply_reports_failed_cancels_and_placements():
+    exchange = Exchange(cancel_fails={'2'}, place_fails={100})
+    reconciler = Reconciler(exchange.cancel, exchange.place, 2, 2)
+    bid, ask, old = order('1', 'Bid', 99), order('2', 'Ask', 101), order('3', 'Ask', 103)
+    orders, failed = reconciler.apply([quote('Bid', 99), quote('Ask', 100), quote('Ask', 102)], [bid, ask, old])
+    assert exchange.cancelled == ['2', '3']
+    assert exchange.placed == [[quote('Ask', 100), quote('Ask', 102)]]
+    assert orders == [bid, None, order('new-102', 'Ask', 102)]
+    # 撤单失败的挂单可能仍在交易所，交还给调用方继续跟踪
+    assert failed == [ask]
+    assert reconciler.stats == {'kept': 1, 'cancelled': 1, 'placed': 2}
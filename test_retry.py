@@ -0,0 +1,194 @@
+import time
+import base64
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from bpx import retry
+from bpx.bpx import BpxClient
+from bpx.retry import RetryPolicy, CircuitBreaker, CircuitOpen, TransientError, attempt_timeout
+from mock_exchange import MockExchange
+
+SYMBOL = 'SOL_USDC'
+
+
+class Clock:
+    """替换 bpx.retry 的 time 模块，sleep 只推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    return clock
+
+
+def failing(calls, error=None, succeed_after=None):
+    def func():
+        calls.append(retry.time.monotonic())
+        if succeed_after is not None and len(calls) > succeed_after:
+            return 'ok'
+        raise error or TransientError('503', status_code=503)
+    return func
+
+
+def test_backoff_is_full_jitter_capped(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(retry.random, 'uniform', lambda a, b: bounds.append((a, b)) or b)
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.5, multiplier=2.0)
+    assert [policy.backoff(n) for n in range(4)] == pytest.approx([0.1, 0.2, 0.4, 0.5])
+    assert all(a == 0 for a, _ in bounds)
+    # 不替换随机数时落在 [0, 上限] 之间，且不是固定值
+    monkeypatch.undo()
+    delays = {policy.backoff(3) for _ in range(50)}
+    assert all(0 <= d <= 0.5 for d in delays) and len(delays) > 1
+
+
+def test_retries_until_success(clock):
+    calls = []
+    assert RetryPolicy(max_attempts=4, base_delay=0.1).call(failing(calls, succeed_after=2), 'op') == 'ok'
+    assert len(calls) == 3 and len(clock.sleeps) == 2
+
+
+def test_gives_up_when_deadline_would_pass(clock, monkeypatch):
+    monkeypatch.setattr(retry.random, 'uniform', lambda a, b: b)
+    calls = []
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=1.0, multiplier=1.0, deadline=2.5)
+    with pytest.raises(TransientError):
+        policy.call(failing(calls), 'op')
+    # t=0、t=1、t=2 各一次，再等 1 秒就超过截止时间，放弃
+    assert calls == [0.0, 1.0, 2.0]
+    assert clock.sleeps == [1.0, 1.0]
+
+
+def test_attempt_timeout_follows_deadline(clock):
+    seen = []
+
+    def func():
+        seen.append(attempt_timeout((3.05, 10)))
+        clock.now += 1.5
+        return 'ok'
+
+    RetryPolicy().call(func, 'op', deadline=2.0)
+    assert seen == [(2.0, 2.0)]
+    # 调用之外不收紧
+    assert attempt_timeout((3.05, 10)) == (3.05, 10)
+
+
+def test_business_errors_are_not_retried(clock):
+    calls = []
+    with pytest.raises(ValueError):
+        RetryPolicy().call(failing(calls, ValueError('bad request')), 'op')
+    assert len(calls) == 1 and clock.sleeps == []
+
+
+def test_breaker_opens_after_threshold_and_half_opens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    for _ in range(2):
+        breaker.allow()
+        breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    # 冷却之后只放行一个探测请求，探测失败重新打开
+    clock.now += 10.0
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10.0
+    breaker.allow()
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats == {'opened': 2, 'rejected': 2}
+
+
+def test_open_breaker_skips_call(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    calls = []
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01)
+    with pytest.raises(CircuitOpen):
+        policy.call(failing(calls), 'op', breaker=breaker)
+    assert len(calls) == 2
+
+
+def new_secret():
+    key = ed25519.Ed25519PrivateKey.generate()
+    return base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                              serialization.NoEncryption())).decode()
+
+
+@pytest.fixture(scope='module')
+def exchange():
+    exchange = MockExchange().start()
+    exchange.seed_book(SYMBOL, 130, levels=5, tick=0.01, qty=10)
+    yield exchange
+    exchange.stop()
+
+
+def place(client, cid):
+    return client.ExeOrder(cid=cid, symbol=SYMBOL, side='Bid', orderType='Limit', timeInForce='GTC',
+                           quantity=0.1, price=129.5)
+
+
+def orders_with_cid(exchange, client, cid):
+    return [o for o in exchange.history[client.verifying_key_b64] if o['clientId'] == cid]
+
+
+def test_order_landed_before_5xx_is_not_placed_twice(exchange):
+    client = BpxClient()
+    client.init('', new_secret(), url=exchange.url)
+    exchange.inject_fault('api/v1/order', status=503, after=True, method='POST')
+    order = place(client, 2001)
+    assert order['status'] == 'New'
+    assert len(orders_with_cid(exchange, client, 2001)) == 1
+
+
+def test_order_landed_before_read_timeout_is_not_placed_twice(exchange, monkeypatch):
+    client = BpxClient()
+    client.init('', new_secret(), url=exchange.url, timeout=(1, 0.3))
+    route = exchange.route
+    delayed = []
+
+    def slow_route(method, path, *args):
+        result = route(method, path, *args)
+        if method == 'POST' and path == 'api/v1/order' and not delayed:
+            delayed.append(path)
+            time.sleep(0.6)  # 订单已经生效，响应超过客户端的读超时
+        return result
+
+    monkeypatch.setattr(exchange, 'route', slow_route)
+    order = place(client, 2002)
+    assert delayed and order['clientId'] == 2002
+    assert len(orders_with_cid(exchange, client, 2002)) == 1
+    assert [o['id'] for o in client.getAllOpenOrders(SYMBOL)] == [order['id']]
+
+
+def test_server_errors_open_breaker(exchange):
+    client = BpxClient()
+    client.init('', new_secret(), url=exchange.url, warmup=False,
+                retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, deadline=2.0))
+    client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+    exchange.inject_fault('api/v1/capital', status=503, count=2)
+    with pytest.raises(TransientError):
+        client.balances()
+    with pytest.raises(CircuitOpen):
+        client.balances()
+    assert exchange.stats['faults'] >= 2
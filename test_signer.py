@@ -0,0 +1,52 @@
+import base64
+from urllib.parse import urlencode
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.hazmat.primitives import serialization
+
+import bpx.signer
+from bpx.signer import Signer, _legacy_sign
+
+
+@pytest.fixture
+def signer(monkeypatch):
+    key = ed25519.Ed25519PrivateKey.generate()
+    secret = base64.b64encode(key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                                serialization.NoEncryption())).decode()
+    monkeypatch.setattr(bpx.signer.time, 'time', lambda: 1700000000.123)
+    return Signer(secret)
+
+
+@pytest.mark.parametrize('params', [
+    None,
+    {},
+    {'symbol': 'SOL_USDC', 'side': 'Bid', 'orderType': 'Limit', 'quantity': 0.1, 'price': 129.87, 'clientId': 9123456},
+    {'symbol': 'SOL_USDC', 'postOnly': True, 'note': 'a b&c=d/é', 'limit': 100, 'offset': 0},
+])
+def test_sign_matches_legacy(signer, params):
+    headers = signer.sign('orderExecute', params)
+    assert headers == _legacy_sign(signer.private_key, signer.verifying_key_b64, 'orderExecute', params)
+
+
+def test_sign_batch_signs_each_instruction(signer):
+    orders = [{'symbol': 'SOL_USDC', 'side': 'Bid', 'quantity': 0.1, 'price': 129.87},
+              {'symbol': 'SOL_USDC', 'side': 'Ask', 'quantity': 0.1, 'price': 130.13}]
+    headers = signer.sign_batch('orderExecute', orders)
+    message = '&'.join(urlencode({'instruction': 'orderExecute', **dict(sorted(o.items()))}) for o in orders)
+    message += f"&timestamp={headers['X-TIMESTAMP']}&window={signer.window}"
+    signer.verifying_key.verify(base64.b64decode(headers['X-SIGNATURE']), message.encode())
+
+
+def test_headers_are_not_shared(signer):
+    first = signer.sign('orderExecute', {'symbol': 'SOL_USDC'})
+    first['X-SIGNATURE'] = ''
+    assert signer.sign('orderExecute', {'symbol': 'SOL_USDC'})['X-SIGNATURE']
+    assert signer.header_template['X-SIGNATURE'] == ''
+
+
+def test_ws_signature(signer):
+    key, signature, timestamp, window = signer.ws_signature()
+    assert key == signer.verifying_key_b64 and window == '5000'
+    message = f'instruction=subscribe&timestamp={timestamp}&window={window}'
+    signer.verifying_key.verify(base64.b64decode(signature), message.encode())